@@ -1,10 +1,10 @@
 # agent/pipelines/scoring_pipeline.py
-import os, json, yaml
+import os, json
 from domestic.analyze_results_domestic import calculate_scores  # 先直接复用你现成的
-from domestic.sentiment.sentiment_analyzer import SentimentAnalyzer
-
-# ✅ 全局只初始化一次（进程级）
-_SENTIMENT_ANALYZER = SentimentAnalyzer.get_instance()
+from domestic.matching.brand_index import load_brand_index
+from domestic.matching.brand_matcher import resolve_match_options
+from domestic.matching.sentence_index import resolve_attribution, resolve_context_window
+from domestic.sentiment.sentiment_analyzer import get_sentiment_analyzer
 
 
 def run_scoring_pipeline(category: str, results_path: str) -> str:
@@ -20,11 +20,12 @@ def run_scoring_pipeline(category: str, results_path: str) -> str:
     with open(results_path, "r", encoding="utf-8") as f:
         data_list = json.load(f)
 
-    with open(brand_cfg_path, "r", encoding="utf-8") as f:
-        cfg = yaml.safe_load(f)
+    # 编译后的品牌索引：词典未修改时直接复用（进程内 + 磁盘缓存）
+    brand_index = load_brand_index(brand_cfg_path)
+    cfg = brand_index.config
 
     brand_dictionary = cfg["brand_dictionary"]
-    whitelist = set(cfg.get("brands_whitelist", []))
+    whitelist = brand_index.whitelist
     weights = cfg.get("weights", {})
 
     # 3) score
@@ -33,8 +34,13 @@ def run_scoring_pipeline(category: str, results_path: str) -> str:
         brand_dictionary,
         whitelist,
         weights,
-        analyzer=_SENTIMENT_ANALYZER,  # ✅ 核心改动
-        return_question_level=True
+        # ✅ 进程级单例：常驻情感分析服务可用时用其客户端，否则本地模型（第一次 predict() 时才加载）
+        analyzer=get_sentiment_analyzer(),
+        return_question_level=True,
+        brand_index=brand_index,
+        context_window=resolve_context_window(cfg.get("sentiment")),  # 品牌词典中的 sentiment 段，未配置时为整句
+        attribution=resolve_attribution(cfg.get("sentiment")),  # 未配置时按品牌标准名称归属句子
+        **resolve_match_options(cfg.get("matching"))  # 品牌词典中的 matching 段，未配置时为 legacy
     )
 
     out = {
@@ -1,9 +1,12 @@
 import _thread as thread
+import asyncio
 import base64
+import concurrent.futures
 import datetime
 import hashlib
 import hmac
 import json
+import threading
 import time
 from urllib.parse import urlparse
 import ssl
@@ -14,6 +17,17 @@ from wsgiref.handlers import format_date_time
 
 import websocket  # 使用websocket_client
 
+try:
+    import websockets  # asyncio 版客户端（SparkAsyncClient）使用，pip install websockets
+except ImportError:
+    websockets = None
+
+from collection.rate_limiter import RateLimitExceeded
+from collection.telemetry import mark_first_token, record_usage
+
+# 星火秒级流控 / 并发流控超限的错误码，按 429 处理，交给限流器退避重试
+SPARK_RATE_LIMIT_CODES = {11202, 11203}
+
 
 class Ws_Param(object):
     # 初始化
@@ -75,10 +89,15 @@ class SparkSyncClient:
         choices = data["payload"]["choices"]
         status = choices["status"]
         content = choices["text"][0]["content"]
+        if content and not self.answer:
+            mark_first_token()  # run_forever 在调用线程中回调，遥测记录可以直接写入
         self.answer += content
 
         # status == 2 表示最后一条消息
         if status == 2:
+            usage = data["payload"].get("usage", {}).get("text")
+            if usage:
+                record_usage({"usage": usage})
             ws.close()
 
     def chat(self, appid, api_key, api_secret, Spark_url, domain, question):
@@ -164,3 +183,136 @@ def gen_params(appid, domain, question):
         }
     }
     return data
+
+
+# ============================================================
+# asyncio 版客户端：多个会话同时在途，每个请求独立状态
+# ============================================================
+class SparkApiError(Exception):
+    def __init__(self, code, message, sid=""):
+        super().__init__(f"Spark error {code}: {message} (sid={sid})")
+        self.code = code
+        self.sid = sid
+
+
+class SparkAsyncClient:
+    """
+    基于 asyncio + websockets 的星火客户端
+    - 星火协议一个 websocket 连接只承载一轮会话，因此每个请求单独签名、单独建连，
+      并发由信号量控制（max_connections 即同时打开的连接数上限）
+    - 回答、usage、首 token 时间都保存在请求自己的局部变量中，多个线程可以共享同一个客户端
+    - 事件循环运行在后台线程中，同步代码通过 chat() 提交请求并等待结果
+    """
+
+    def __init__(self, appid, api_key, api_secret, spark_url, domain, max_connections=4, timeout=120):
+        if websockets is None:
+            raise ImportError("SparkAsyncClient requires the 'websockets' package (pip install websockets)")
+        self.appid = appid
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.spark_url = spark_url
+        self.domain = domain
+        self.max_connections = max(1, int(max_connections))
+        self.timeout = timeout
+
+        self._loop = asyncio.new_event_loop()
+        self._semaphore = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="spark-async", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self.max_connections)
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def achat(self, question):
+        """
+        发起一轮会话，返回 {"answer", "usage", "sid", "first_token_at"}
+        first_token_at 为收到首个非空增量时的 time.perf_counter()，没有内容时为 None
+        """
+        ssl_context = None
+        if self.spark_url.startswith("wss://"):
+            ssl_context = ssl.create_default_context()
+
+        answer_parts = []
+        usage = None
+        sid = ""
+        first_token_at = None
+
+        async with self._semaphore:
+            # 鉴权 URL 中带有时间戳，必须在建连前即时签名
+            url = Ws_Param(self.appid, self.api_key, self.api_secret, self.spark_url).create_url()
+            async with websockets.connect(url, ssl=ssl_context, open_timeout=self.timeout) as ws:
+                await ws.send(json.dumps(gen_params(appid=self.appid, domain=self.domain, question=question)))
+                while True:
+                    message = await asyncio.wait_for(ws.recv(), timeout=self.timeout)
+                    data = json.loads(message)
+                    header = data['header']
+                    sid = header.get('sid', sid)
+                    if header['code'] != 0:
+                        if header['code'] in SPARK_RATE_LIMIT_CODES:
+                            raise RateLimitExceeded(f"Spark error {header['code']}: {header.get('message')}")
+                        raise SparkApiError(header['code'], header.get('message'), sid)
+
+                    choices = data["payload"]["choices"]
+                    content = choices["text"][0]["content"]
+                    if content and first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    answer_parts.append(content)
+
+                    # status == 2 表示最后一条消息
+                    if choices["status"] == 2:
+                        usage = data["payload"].get("usage", {}).get("text")
+                        break
+
+        return {"answer": "".join(answer_parts), "usage": usage, "sid": sid, "first_token_at": first_token_at}
+
+    def chat(self, question, timeout=None):
+        """
+        同步桥接：在后台事件循环中执行 achat()，阻塞当前线程直到拿到结果
+        最多等待 timeout 秒（默认 self.timeout，含排队等待连接的时间）：websocket 卡住或后台事件循环退出时
+        取消请求并抛出 TimeoutError，采集线程不会永远阻塞
+        """
+        if not self._loop.is_running():
+            raise RuntimeError("Spark event loop is not running")
+        timeout = timeout if timeout is not None else self.timeout
+        future = asyncio.run_coroutine_threadsafe(self.achat(question), self._loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Spark request timed out after {timeout:g} seconds")
+
+    def close(self):
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+        self._loop.close()
+
+
+_ASYNC_CLIENTS = {}
+_ASYNC_CLIENTS_LOCK = threading.Lock()
+
+
+def get_spark_client(appid, api_key, api_secret, spark_url, domain, max_connections=4, timeout=120):
+    """获取（或首次创建）某个星火模型共享的异步客户端；未安装 websockets 时返回 None"""
+    if websockets is None:
+        return None
+    key = (spark_url, domain, appid, api_key)
+    with _ASYNC_CLIENTS_LOCK:
+        client = _ASYNC_CLIENTS.get(key)
+        if client is None:
+            client = SparkAsyncClient(appid, api_key, api_secret, spark_url, domain, max_connections=max_connections,
+                                      timeout=timeout)
+            _ASYNC_CLIENTS[key] = client
+        return client
+
+
+def close_spark_clients():
+    with _ASYNC_CLIENTS_LOCK:
+        for client in _ASYNC_CLIENTS.values():
+            client.close()
+        _ASYNC_CLIENTS.clear()
@@ -1,9 +1,10 @@
 import json
 import re
-import yaml
 import argparse
 import time
 import math
+import os
+import sys
 from collections import defaultdict
 
 # ==============================================================================
@@ -13,22 +14,36 @@ from collections import defaultdict
 # 在控制台输入以下命令，可根据具体任务来更换参数：
 # python analyze_results_domestic.py --task snack --results weekly_results/results_snack_weekly_2026-W04.json --brands config/brand_dictionary_snack.yaml
 # python analyze_results_domestic.py --task luxury --results weekly_results/results_luxury_weekly_2026-W04.json --brands config/brand_dictionary_luxury.yaml
+# 别名匹配方式（默认 legacy，与历史榜单口径一致）：--match-mode leftmost_longest 嵌套别名只计一次，
+# --word-boundary 英文别名要求单词边界；也可以在品牌词典 yaml 中配置 matching: {mode: ..., word_boundary: ...}
+# 情感分析窗口（默认 0，整句送入模型）：--context-window 64 只取每个品牌提及前后 64 个 token，
+# 也可以在品牌词典 yaml 中配置 sentiment: {context_window: 64}
+# 情感句子与强推荐的品牌归属（默认 name：句子中出现品牌标准名称，与历史榜单口径一致）：
+# --attribution alias 改为按别名匹配位置归属，也可以在品牌词典 yaml 中配置 sentiment: {attribution: alias}
 #
 # ==============================================================================
 
 
-# 导入BERT情感分析模块
-try:
-    from sentiment.sentiment_analyzer import get_sentiment_analyzer
+# 以包的形式导入（例如 agent/pipelines/scoring_pipeline.py）时，确保 domestic 目录下的模块可以导入
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
 
-    USE_BERT_SENTIMENT = True
-    print("✅ BERT情感分析模块已启用")
-except ImportError as e:
-    USE_BERT_SENTIMENT = False
-    print(f"⚠️  BERT情感分析模块未找到，将使用规则匹配方式: {e}")
+from matching.brand_index import load_brand_index
+from matching.brand_matcher import MATCH_MODES, BrandMatcher, resolve_match_options
+from matching.sentence_index import (ATTRIBUTION_MODES, context_windows_by_brand, name_mentions,
+                                     resolve_attribution, resolve_context_window, sentences_by_brand,
+                                     split_sentences)
+from sentiment.batch_scoring import score_brand_sentences
+from sentiment.rule_classifier import get_rule_classifier
 
+# BERT情感分析模块（sentiment/sentiment_analyzer.py）在 calculate_scores 中第一次需要时才导入，
+# torch / transformers 在第一次 predict() 时才加载：--help 与纯规则匹配的运行不付出这部分开销
+USE_BERT_SENTIMENT = True
 
-def analyze_single_answer(answer_text: str, references: list, brand_map: dict):
+
+def analyze_single_answer(answer_text: str, references: list, brand_map: dict, matcher: BrandMatcher = None,
+                          context_window: int = 0, attribution: str = "name"):
     """分析单个回答，提取品牌相关指标"""
     raw_metrics = defaultdict(
         lambda: {"mentioned": 0, "first_pos": float('inf'), "is_strong": 0, "ref_count": 0, "mention_count": 0,
@@ -37,23 +52,22 @@ def analyze_single_answer(answer_text: str, references: list, brand_map: dict):
 
     # --- 1. 检测品牌提及并计算 first_pos ---
     brand_mentions_with_pos = []
-    for std_brand, aliases in brand_map.items():
-        for alias in aliases:
-            alias_lower = alias.lower()
-            # Find all occurrences of the alias
-            for match in re.finditer(re.escape(alias_lower), answer_lower):
-                raw_metrics[std_brand]["mentioned"] = 1
-                raw_metrics[std_brand]["mention_count"] += 1  # 每次匹配都算一次提及
-
-                pos = match.start()
-                if pos < raw_metrics[std_brand]["first_pos"]:
-                    raw_metrics[std_brand]["first_pos"] = pos
-
-                # 收集所有首次提及的位置，用于计算 Top 10 积分
-                brand_mentions_with_pos.append({
-                    "brand": std_brand,
-                    "pos": pos
-                })
+    if matcher is None:
+        matcher = BrandMatcher(brand_map)
+    # 自动机一遍扫描回答，得到与逐别名 re.finditer 相同的 (品牌, 位置) 序列
+    mentions = matcher.find_mentions(answer_lower)
+    for std_brand, pos in mentions:
+        raw_metrics[std_brand]["mentioned"] = 1
+        raw_metrics[std_brand]["mention_count"] += 1  # 每次匹配都算一次提及
+
+        if pos < raw_metrics[std_brand]["first_pos"]:
+            raw_metrics[std_brand]["first_pos"] = pos
+
+        # 收集所有首次提及的位置，用于计算 Top 10 积分
+        brand_mentions_with_pos.append({
+            "brand": std_brand,
+            "pos": pos
+        })
 
     # --- 2. 计算 Top 10 积分 (前10可见度) ---
     # 找到每个品牌的首次出现位置
@@ -76,38 +90,40 @@ def analyze_single_answer(answer_text: str, references: list, brand_map: dict):
             break  # 超过 10 个品牌后停止计分
 
     # --- 3. 提取包含品牌的句子（用于BERT情感分析）---
-    sentences = re.split(r'[。\n.!?]', answer_text)  # 按句子分割
-
-    for sentence in sentences:
-        sentence_lower = sentence.lower().strip()
-        if not sentence_lower:
-            continue
-
-        for brand, metrics in raw_metrics.items():
-            if not metrics["mentioned"]:
-                continue
-            # 检查句子中是否包含该品牌
-            if brand.lower() in sentence_lower:
-                # 将包含品牌的句子存储起来
-                raw_metrics[brand]["sentiment_sentences"].append(sentence)
+    # 句子起始位置只算一次，每个提及按位置二分查找所在的句子
+    sentences, sentence_starts = split_sentences(answer_text, r'[。\n.!?]')  # 按句子分割
+    if attribution == "alias":
+        sentence_mentions = mentions
+    else:
+        # 默认口径：句子中出现品牌标准名称才归属（只查找已被提及的品牌）
+        sentence_mentions = name_mentions(answer_lower, list(raw_metrics), sentences, sentence_starts)
+    brand_sentence_ids = sentences_by_brand(sentence_mentions, sentence_starts)
+
+    if context_window > 0:
+        # 情感分析只取每个提及前后 context_window 个 token 的窗口（同一句中重叠的窗口合并）
+        windows_by_brand = context_windows_by_brand(sentence_mentions, sentences, sentence_starts, context_window)
+        for brand, windows in windows_by_brand.items():
+            raw_metrics[brand]["sentiment_sentences"].extend(w for w in windows if w.strip())
+    else:
+        for brand, sentence_ids in brand_sentence_ids.items():
+            for sentence_id in sentence_ids:
+                if sentences[sentence_id].strip():
+                    # 将包含品牌的句子存储起来
+                    raw_metrics[brand]["sentiment_sentences"].append(sentences[sentence_id])
 
     # --- 4. 检测强推荐 (is_strong) - 保留作为备用 ---
-    strong_patterns = [
-        r"(强烈)?推荐", r"首选", r"最佳", r"值得.*?(尝试|购买|选择)",
-        r"性价比.*?(高|很高)", r"(是|属)?(top|best)[^。]*?(品牌|选择|之一)",
-        r"(我|我们)?(最|很)?常买", r"(个人|我)?觉得.*?(最好|最推荐)"
-    ]
-    negation_keywords = ["不推荐", "不太", "不喜欢", "不值得", "踩雷", "避坑", "最差", "不合适", "不如"]
-
-    for sentence in sentences:
-        sentence_lower = sentence.lower()
-        for brand, metrics in raw_metrics.items():
-            if not metrics["mentioned"]:
-                continue
-            if brand.lower() in sentence_lower:
-                if any(re.search(p, sentence_lower) for p in strong_patterns):
-                    if not any(neg in sentence_lower for neg in negation_keywords):
-                        raw_metrics[brand]["is_strong"] = 1
+    # 规则分类器每种语言只构建一次（合并正则 + 否定关键词自动机），见 sentiment/rule_classifier.py
+    classifier = get_rule_classifier("zh")
+
+    # 每个句子最多判断一次，多个品牌共用结果
+    strong_sentences = {}
+    for brand, sentence_ids in brand_sentence_ids.items():
+        for sentence_id in sentence_ids:
+            if sentence_id not in strong_sentences:
+                strong_sentences[sentence_id] = classifier.is_strong(sentences[sentence_id])
+            if strong_sentences[sentence_id]:
+                raw_metrics[brand]["is_strong"] = 1
+                break
 
     return raw_metrics
 
@@ -122,7 +138,12 @@ def calculate_scores(data_list,
                      whitelist,
                      weights,
                      return_question_level: bool = False,
-                     analyzer=None) -> dict:
+                     analyzer=None,
+                     match_mode: str = "legacy",
+                     word_boundary: bool = False,
+                     brand_index=None,
+                     context_window: int = 0,
+                     attribution: str = "name") -> dict:
     question_level_details = []
 
     """计算所有品牌的得分（集成BERT情感分析）"""
@@ -131,6 +152,15 @@ def calculate_scores(data_list,
                  "total_ref_count": 0, "mention_in_answers": 0, "sentiment_sentences": []})  # 新增
     total_brand_mentions_across_all = 0
 
+    # 品牌词典只编译一次自动机，所有回答共用
+    # 传入 brand_index（matching/brand_index.py）时直接复用缓存中已编译的自动机与白名单位图
+    if brand_index is not None:
+        matcher = brand_index.get_matcher(match_mode, word_boundary)
+        in_whitelist = brand_index.is_whitelisted
+    else:
+        matcher = BrandMatcher(brand_dictionary, mode=match_mode, word_boundary=word_boundary)
+        in_whitelist = whitelist.__contains__
+
     # 收集所有原始指标
     for item in data_list:
         answer = item.get("response", {}).get("answer", "")
@@ -138,10 +168,11 @@ def calculate_scores(data_list,
         if not answer:
             continue
 
-        answer_metrics = analyze_single_answer(answer, references, brand_dictionary)
+        answer_metrics = analyze_single_answer(answer, references, brand_dictionary, matcher, context_window,
+                                               attribution)
 
         for brand, metrics in answer_metrics.items():
-            if brand in whitelist:
+            if in_whitelist(brand):
                 brand_global_metrics = all_brands_raw_metrics[brand]
                 brand_global_metrics["total_mentions"] += metrics["mention_count"]
                 if metrics["first_pos"] != float('inf'):
@@ -164,12 +195,25 @@ def calculate_scores(data_list,
     # 如果外部没传，再按你原来的逻辑初始化（保持兼容）
     if sentiment_analyzer is None and USE_BERT_SENTIMENT:
         try:
+            from sentiment.sentiment_analyzer import get_sentiment_analyzer
+
             sentiment_analyzer = get_sentiment_analyzer()
             print("🤖 使用BERT模型进行情感分析...")
         except Exception as e:
             print(f"⚠️  BERT模型加载失败，回退到规则匹配: {e}")
             sentiment_analyzer = None
 
+    # 所有品牌的句子去重后一次批量推理，再按品牌汇总
+    brand_sentiment_scores = {}
+    if sentiment_analyzer:
+        try:
+            brand_sentiment_scores = score_brand_sentences(
+                sentiment_analyzer, {brand: m["sentiment_sentences"] for brand, m in all_brands_raw_metrics.items()})
+        except Exception as e:
+            # 模型在第一次 predict() 时才加载，加载失败（如未安装 torch）在这里回退
+            print(f"⚠️  BERT模型加载失败，回退到规则匹配: {e}")
+            brand_sentiment_scores = {}
+
     # 计算归一化参数
     max_mentions = max((m["total_mentions"] for m in all_brands_raw_metrics.values()), default=1)
     max_strong = max((m["strong_recommend_count"] for m in all_brands_raw_metrics.values()), default=1)
@@ -207,12 +251,9 @@ def calculate_scores(data_list,
         competitiveness = (metrics["total_mentions"] / max_mentions) * 100 if max_mentions > 0 else 0
 
         # 5. 情感分析 (BERT模型 or 规则匹配)
-        if sentiment_analyzer and metrics["sentiment_sentences"]:
-            # 使用BERT模型分析（限制最多50个句子以提高性能）
-            sentences_to_analyze = metrics["sentiment_sentences"][:50]
-            results = sentiment_analyzer.predict(sentences_to_analyze)
-            sentiment_scores = [r["score"] for r in results]
-            sentiment_analysis = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 50.0
+        if brand in brand_sentiment_scores:
+            # 使用BERT模型分析（每个品牌最多50个句子，已在上面统一批量推理）
+            sentiment_analysis = brand_sentiment_scores[brand]
         else:
             # 使用规则匹配方式（原有逻辑）
             normalized_strong = (metrics["strong_recommend_count"] + 1) / (max_strong + 1)
@@ -316,6 +357,18 @@ def main():
     parser.add_argument("--results", required=True, help="结果文件路径 (例如: results_nev_merged.json)")
     parser.add_argument("--brands", required=True, help="品牌词典文件路径 (例如: brand_dictionary_scenic.yaml)")
     parser.add_argument("--output", default=None, help="输出报告文件路径 (默认: ranking_report_{task}.md)")
+    parser.add_argument("--match-mode", choices=MATCH_MODES, default=None,
+                        help="品牌别名匹配方式，覆盖品牌词典中的 matching.mode (默认: legacy)")
+    parser.add_argument("--word-boundary", action="store_true", default=None,
+                        help="英文别名要求单词边界，覆盖品牌词典中的 matching.word_boundary")
+    parser.add_argument("--context-window", type=int, default=None,
+                        help="情感分析只取每个品牌提及前后 N 个 token 的窗口，覆盖配置中的 sentiment.context_window"
+                             "（默认 0：整句，推荐 64）")
+    parser.add_argument("--attribution", choices=ATTRIBUTION_MODES, default=None,
+                        help="情感句子与强推荐的品牌归属方式，覆盖品牌词典中的 sentiment.attribution"
+                             "（默认 name：句子中出现品牌标准名称；alias：按别名匹配位置）")
+    parser.add_argument("--no-index-cache", action="store_true",
+                        help="不读写编译后的品牌索引缓存（cache/brand_index/），每次重新解析品牌词典")
     args = parser.parse_args()
 
     # 设置输出文件名
@@ -337,14 +390,21 @@ def main():
     print(f"📖 品牌词典: {args.brands}")
     print(f"📄 输出报告: {args.output}\n")
 
-    # 加载品牌词典
+    # 加载品牌词典（编译后的品牌索引按文件内容哈希缓存，词典未修改时不再重新解析、构建自动机）
     print("正在加载品牌词典...")
     try:
-        with open(args.brands, 'r', encoding='utf-8') as f:
-            brands_config = yaml.safe_load(f)
+        brand_index = load_brand_index(args.brands, use_cache=not args.no_index_cache)
+        brands_config = brand_index.config
         brand_dictionary = brands_config['brand_dictionary']
-        brands_whitelist = set(brands_config['brands_whitelist'])
-        print(f"✅ 成功加载 {len(brand_dictionary)} 个品牌，白名单包含 {len(brands_whitelist)} 个品牌\n")
+        brands_whitelist = brand_index.whitelist
+        match_options = resolve_match_options(brands_config.get('matching'), args.match_mode, args.word_boundary)
+        match_options["context_window"] = resolve_context_window(brands_config.get('sentiment'), args.context_window)
+        match_options["attribution"] = resolve_attribution(brands_config.get('sentiment'), args.attribution)
+        print(f"✅ 成功加载 {len(brand_dictionary)} 个品牌，白名单包含 {len(brands_whitelist)} 个品牌")
+        print(f"🔎 别名匹配: {match_options['match_mode']} (单词边界: {'开启' if match_options['word_boundary'] else '关闭'})")
+        context_window = match_options["context_window"]
+        print(f"💬 情感分析输入: {f'品牌提及前后 {context_window} 个 token 的窗口' if context_window else '整句'}"
+              f" (品牌归属: {match_options['attribution']})\n")
     except FileNotFoundError:
         print(f"❌ 错误: 品牌词典文件 '{args.brands}' 未找到。")
         return
@@ -376,7 +436,7 @@ def main():
 
     # 计算得分
     print("正在计算品牌得分...")
-    scores = calculate_scores(data_list, brand_dictionary, brands_whitelist, weights)
+    scores = calculate_scores(data_list, brand_dictionary, brands_whitelist, weights, brand_index=brand_index, **match_options)
     print(f"✅ 成功计算 {len(scores)} 个品牌的得分\n")
 
     # 生成报告
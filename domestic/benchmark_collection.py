@@ -0,0 +1,185 @@
+import os
+import io
+import json
+import time
+import argparse
+import contextlib
+from collections import defaultdict
+
+import dashscope
+
+import run_analysis_domestic as engine
+from SparkApi import close_spark_clients
+from collection.client_registry import close_all_clients, configure_http_defaults
+from collection.mock_server import MockProviderServer, MockSettings
+from collection.response_cache import configure_response_cache
+from collection.telemetry import percentile
+
+# ==============================================================================
+# 采集引擎压测：在本地模拟服务（collection/mock_server.py）上运行并发采集引擎，
+# 按适配器统计吞吐（requests/s）与 p50/p95/p99 延迟，不会调用任何真实 API、不产生费用
+# 使用示例（在 domestic 目录下运行）：
+# python benchmark_collection.py
+# python benchmark_collection.py --questions 200 --concurrency 8 --latency-ms 500 --rate-limit-rate 0.05
+# python benchmark_collection.py --adapters dashscope,doubao --error-rate 0.02 --output benchmark.json
+# ==============================================================================
+
+MOCK_API_KEY_ENV = "GEO_MOCK_API_KEY"
+
+ALL_ADAPTERS = ["dashscope", "doubao", "zhinao", "hunyuan", "openai", "zhipu", "spark"]
+
+
+def build_mock_models(server, adapters, concurrency):
+    """为每种 api_type 生成一个指向本地模拟服务的模型配置（结构与 config_domestic.yaml 一致）"""
+    base_url = server.base_url
+    templates = {
+        "dashscope": {"name": "Mock DashScope", "model": "qwen-mock", "api_type": "dashscope",
+                      "enable_search": True},
+        "doubao": {"name": "Mock 豆包", "model": "doubao-mock", "api_type": "doubao",
+                   "base_url": f"{base_url}/doubao/api/v3", "enable_search": True},
+        "zhinao": {"name": "Mock 360智脑", "model": "360gpt-mock", "api_type": "zhinao",
+                   "base_url": f"{base_url}/zhinao/v1", "enable_search": True},
+        "hunyuan": {"name": "Mock 腾讯混元", "model": "hunyuan-mock", "api_type": "hunyuan",
+                    "base_url": f"{base_url}/hunyuan/v1", "enable_search": True},
+        "openai": {"name": "Mock OpenRouter", "model": "openai/mock", "api_type": "openai",
+                   "base_url": f"{base_url}/openrouter/api/v1"},
+        "zhipu": {"name": "Mock 智谱 GLM", "model": "glm-mock", "api_type": "zhipu",
+                  "base_url": f"{base_url}/compatible-mode/v1", "stream": True},
+        "spark": {"name": "Mock 讯飞星火", "model": "generalv3.5", "api_type": "spark",
+                  "base_url": f"{server.ws_url}/spark/v1.1/chat",
+                  "secret_key_env": MOCK_API_KEY_ENV, "app_id_env": MOCK_API_KEY_ENV},
+    }
+
+    models = {}
+    for adapter in adapters:
+        model_config = dict(templates[adapter])
+        model_config["api_key_env"] = MOCK_API_KEY_ENV
+        model_config["concurrency"] = concurrency
+        models[adapter] = model_config
+    return models
+
+
+def build_questions(count):
+    return [
+        {"id": f"bench_{i:04d}", "category": "benchmark", "prompt": f"请推荐几个值得购买的手机品牌（压测问题 {i}）"}
+        for i in range(count)
+    ]
+
+
+def benchmark_adapter(model_key, model_config, questions, concurrency, verbose=False):
+    """用采集引擎跑完一个适配器的全部问题，返回 (成功数, 每次调用耗时列表, 总耗时)"""
+    latencies = []
+    original_call_model = engine.call_model
+
+    def timed_call_model(key, config, question):
+        start = time.perf_counter()
+        try:
+            return original_call_model(key, config, question)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    engine.call_model = timed_call_model
+    log = io.StringIO()
+    redirect = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(log)
+    try:
+        with redirect:
+            start = time.perf_counter()
+            results = engine.collect_model_results(model_key, model_config, questions, concurrency)
+            wall = time.perf_counter() - start
+    finally:
+        engine.call_model = original_call_model
+
+    return len(results), sorted(latencies), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在本地模拟服务上压测采集引擎")
+    parser.add_argument("--adapters", type=str, default=",".join(ALL_ADAPTERS),
+                        help=f"逗号分隔的 api_type 列表，可选: {', '.join(ALL_ADAPTERS)}")
+    parser.add_argument("--questions", type=int, default=100, help="每个适配器的问题数")
+    parser.add_argument("--concurrency", type=int, default=4, help="每个模型的并发上限")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="模拟服务平均响应延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="延迟随机抖动范围（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=str, default=None, help="把压测报告另存为 JSON 文件")
+    parser.add_argument("--verbose", action="store_true", help="打印采集引擎的逐条调用日志")
+    args = parser.parse_args()
+
+    adapters = [a.strip() for a in args.adapters.split(",") if a.strip()]
+    unknown = [a for a in adapters if a not in ALL_ADAPTERS]
+    if unknown:
+        parser.error(f"未知的适配器: {', '.join(unknown)}")
+
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, seed=args.seed)
+    server = MockProviderServer(settings=settings).start_in_background()
+    print(f"🧪 Mock provider server: {server.base_url}")
+
+    # 所有适配器都指向本地模拟服务；压测不读写回答缓存，429 退避缩短到亚秒级
+    os.environ[MOCK_API_KEY_ENV] = "mock-key"
+    dashscope.base_http_api_url = f"{server.base_url}/api/v1"
+    configure_response_cache("", enabled=False)
+    configure_http_defaults(max_connections=args.concurrency, timeout=30)
+    models = build_mock_models(server, adapters, args.concurrency)
+    engine.configure_rate_limiters(models, {
+        "rate_limit": {"max_retries": 5, "base_backoff": 0.2, "max_backoff": 2.0},
+    })
+    questions = build_questions(args.questions)
+
+    report = {}
+    try:
+        for model_key, model_config in models.items():
+            print(f"-> Benchmarking {model_key} ({args.questions} questions, concurrency {args.concurrency})...")
+            ok, latencies, wall = benchmark_adapter(model_key, model_config, questions, args.concurrency,
+                                                    verbose=args.verbose)
+            report[model_key] = {
+                "requests": len(latencies),
+                "succeeded": ok,
+                "failed": len(latencies) - ok,
+                "wall_seconds": round(wall, 3),
+                "requests_per_second": round(len(latencies) / wall, 2) if wall else 0.0,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+            }
+    finally:
+        close_all_clients()
+        close_spark_clients()
+        server_stats = server.snapshot_stats()
+        server.stop()
+
+    # 服务端视角：实际收到的 HTTP/websocket 请求数与注入的 429 / 500 次数（含限流器重试）
+    route_of = {"dashscope": "dashscope", "doubao": "doubao_responses", "zhinao": "zhinao",
+                "hunyuan": "hunyuan", "openai": "openrouter", "zhipu": "compatible-mode", "spark": "spark"}
+    server_totals = defaultdict(int)
+    for model_key, row in report.items():
+        counts = server_stats.get(route_of[model_key], {})
+        row["server_rate_limited"] = counts.get("rate_limited", 0)
+        row["server_errors"] = counts.get("error", 0)
+        for key, value in counts.items():
+            server_totals[key] += value
+
+    print("\n" + "=" * 100)
+    print("📊 Collection benchmark (mock provider)")
+    print(f"   latency={args.latency_ms}±{args.jitter_ms}ms  error_rate={args.error_rate}  "
+          f"rate_limit_rate={args.rate_limit_rate}  concurrency={args.concurrency}")
+    print("=" * 100)
+    print(f"{'adapter':<10} {'req':>6} {'ok':>6} {'fail':>6} {'429':>6} {'500':>6} "
+          f"{'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'wall s':>8}")
+    for model_key, row in report.items():
+        print(f"{model_key:<10} {row['requests']:>6} {row['succeeded']:>6} {row['failed']:>6} "
+              f"{row['server_rate_limited']:>6} {row['server_errors']:>6} {row['requests_per_second']:>8} "
+              f"{row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} {row['wall_seconds']:>8}")
+    print("=" * 100)
+    print(f"Server totals: {dict(server_totals)}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"settings": vars(args), "adapters": report, "server": server_stats}, f,
+                      ensure_ascii=False, indent=2)
+        print(f"✅ 压测报告已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import statistics
+from pathlib import Path
+
+# ==============================================================================
+# 启动耗时基准：在全新的解释器中计时导入各分析入口模块（以及 analyze_results_domestic.py --help），
+# 并记录导入后 torch / transformers / peft 是否已进入 sys.modules，用于确认模型依赖只在第一次 predict() 时加载
+# 使用示例（在 domestic 目录下运行）：
+# python benchmark_startup.py
+# python benchmark_startup.py --repeat 10 --output startup.json
+# 对比改动前后：先用 git worktree 检出旧版本，再作为 --baseline 传入
+# git worktree add /tmp/geo-before <旧的提交>
+# python benchmark_startup.py --baseline /tmp/geo-before
+# ==============================================================================
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ["torch", "transformers", "peft", "onnxruntime"]
+
+# (名称, 相对仓库根目录的工作目录, 要导入的模块 或 要运行的脚本参数)
+TARGETS = [
+    ("import analyze_results_domestic", "domestic", "analyze_results_domestic"),
+    ("import analyze_results_oversea", "oversea", "analyze_results_oversea"),
+    ("import sentiment.sentiment_analyzer", "domestic", "sentiment.sentiment_analyzer"),
+    ("import agent.pipelines.scoring_pipeline", ".", "agent.pipelines.scoring_pipeline"),
+    ("analyze_results_domestic.py --help", "domestic", ["analyze_results_domestic.py", "--help"]),
+]
+
+# 子进程中执行：计时导入（或运行脚本），最后一行输出 JSON 结果
+CHILD_CODE = """
+import json, runpy, sys, time
+target, heavy = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+sys.path.insert(0, ".")
+error = None
+start = time.perf_counter()
+try:
+    if isinstance(target, list):
+        sys.argv = target
+        try:
+            runpy.run_path(target[0], run_name="__main__")
+        except SystemExit:
+            pass
+    else:
+        __import__(target)
+except Exception as e:
+    error = f"{type(e).__name__}: {e}"
+elapsed = time.perf_counter() - start
+print("\\n" + json.dumps({"seconds": elapsed, "error": error, "loaded": [m for m in heavy if m in sys.modules]}))
+"""
+
+
+def run_once(root: Path, cwd: str, target) -> dict:
+    env = dict(os.environ)
+    env["GEO_SENTIMENT_SERVER"] = "off"  # 不探测常驻情感分析服务，避免网络等待计入耗时
+    proc = subprocess.run([sys.executable, "-c", CHILD_CODE, json.dumps(target), json.dumps(HEAVY_MODULES)],
+                          cwd=str(root / cwd), env=env, capture_output=True, text=True)
+    lines = proc.stdout.strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {"seconds": None, "error": (proc.stderr.strip().splitlines() or ["no output"])[-1], "loaded": []}
+
+
+def benchmark_tree(root: Path, repeat: int) -> dict:
+    report = {}
+    for name, cwd, target in TARGETS:
+        runs = [run_once(root, cwd, target) for _ in range(repeat)]
+        seconds = [r["seconds"] for r in runs if r["seconds"] is not None and not r["error"]]
+        report[name] = {
+            "median_ms": round(statistics.median(seconds) * 1000, 1) if seconds else None,
+            "min_ms": round(min(seconds) * 1000, 1) if seconds else None,
+            "heavy_modules_loaded": runs[-1]["loaded"],
+            "error": runs[-1]["error"],
+        }
+    return report
+
+
+def format_ms(value) -> str:
+    return f"{value:.1f}" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="测量分析入口模块的导入耗时")
+    parser.add_argument("--repeat", type=int, default=5, help="每个目标运行的次数（取中位数）")
+    parser.add_argument("--baseline", type=str, default=None, help="用于对比的另一份仓库检出（例如改动前的 git worktree）")
+    parser.add_argument("--output", type=str, default=None, help="把基准结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    print(f"🧪 Python {sys.version.split()[0]}，每个目标运行 {args.repeat} 次")
+    report = {"current": benchmark_tree(REPO_ROOT, args.repeat)}
+    if args.baseline:
+        report["baseline"] = benchmark_tree(Path(args.baseline).resolve(), args.repeat)
+
+    print("\n| 目标 | 耗时 ms (中位数) | 对比前 ms | 已加载的模型依赖 |")
+    print("|------|------------------|-----------|------------------|")
+    for name, _, _ in TARGETS:
+        current = report["current"][name]
+        before = report.get("baseline", {}).get(name, {})
+        loaded = ", ".join(current["heavy_modules_loaded"]) or "无"
+        print(f"| {name} | {format_ms(current['median_ms'])} | {format_ms(before.get('median_ms'))} | {loaded} |")
+    for label, tree in report.items():
+        for name, row in tree.items():
+            if row["error"]:
+                print(f"⚠️  [{label}] {name}: {row['error']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"✅ 基准结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
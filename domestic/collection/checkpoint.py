@@ -0,0 +1,87 @@
+# domestic/collection/checkpoint.py
+"""
+追加写（append-only）JSONL 断点日志
+- 每采集到一条结果追加一行 JSON，写入量与结果数成正比（不再每条都重写整个 JSON 数组）
+- 断点续传时重放日志即可恢复已完成的记录；进程在写某一行时崩溃，只会丢失这一行
+- 采集结束后 compact() 生成下游工具需要的 JSON 数组文件
+"""
+import json
+import os
+import threading
+
+
+class JsonlCheckpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def replay(self) -> list:
+        """按写入顺序读回日志中的所有记录，跳过崩溃时写了一半的行"""
+        records = []
+        if not self.exists():
+            return records
+
+        skipped = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    skipped += 1
+
+        if skipped:
+            print(f"⚠️  断点日志 {self.path} 中有 {skipped} 行不完整，已跳过")
+        return records
+
+    def append(self, record: dict):
+        """追加一条记录并立即落盘（线程安全）"""
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                needs_newline = self._ends_with_partial_line()
+                self._file = open(self.path, 'a', encoding='utf-8')
+                if needs_newline:
+                    # 上次崩溃留下了不完整的一行，先换行，避免新记录拼接到坏行上
+                    self._file.write("\n")
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def _ends_with_partial_line(self) -> bool:
+        if not self.exists() or os.path.getsize(self.path) == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) != b"\n"
+
+    def extend(self, records: list):
+        for record in records:
+            self.append(record)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    @staticmethod
+    def compact(records: list, output_path: str, indent: int = 2):
+        """把记录写成 JSON 数组：先写临时文件再原子替换，避免下游读到半个文件"""
+        tmp_path = f"{output_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=indent)
+        os.replace(tmp_path, output_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
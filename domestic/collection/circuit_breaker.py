@@ -0,0 +1,146 @@
+# domestic/collection/circuit_breaker.py
+"""
+按模型（provider）隔离的熔断器
+- closed（正常）：记录每次调用的成败；连续失败达到 failure_threshold，
+  或最近 window_size 次调用的失败率达到 error_rate_threshold（至少 min_calls 次）时熔断
+- open（熔断）：直接拒绝调用（不发请求、不等超时），被跳过的问题记为待补采，下次运行断点续传
+- half_open（半开）：熔断 recovery_timeout 秒后放行 half_open_max_calls 个探测请求，
+  探测成功则恢复 closed，失败则重新熔断
+某个模型挂掉时只影响它自己，其他模型的采集照常进行。
+
+国内 (run_analysis_domestic.py) 与海外 (run_analysis_oversea.py) 采集引擎共用本模块。
+"""
+import threading
+import time
+from collections import deque
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，本次调用被跳过"""
+
+    def __init__(self, name: str):
+        super().__init__(f"Circuit open for {name}, call skipped")
+        self.name = name
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, error_rate_threshold: float = 0.5,
+                 window_size: int = 20, min_calls: int = 10, recovery_timeout: float = 60.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._window = deque(maxlen=window_size)
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self.skipped = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow_request(self) -> bool:
+        """是否放行本次调用；熔断期间返回 False，恢复期到达后放行有限个探测请求"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+                self._state = self.HALF_OPEN
+                self._probes_in_flight = 0
+                print(f"  -> Circuit half-open for {self.name}, sending a probe request...")
+
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                return True
+            self.skipped += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._window.append(True)
+            self._consecutive_failures = 0
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._window.clear()
+                print(f"  -> Circuit closed for {self.name}, provider recovered.")
+
+    def record_failure(self):
+        with self._lock:
+            self._window.append(False)
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN:
+                self._trip("probe failed")
+                return
+            if self._state != self.CLOSED:
+                return
+
+            failures = self._window.count(False)
+            if self._consecutive_failures >= self.failure_threshold:
+                self._trip(f"{self._consecutive_failures} consecutive failures")
+            elif len(self._window) >= self.min_calls and failures / len(self._window) >= self.error_rate_threshold:
+                self._trip(f"error rate {failures}/{len(self._window)}")
+
+    def _trip(self, reason: str):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probes_in_flight = 0
+        print(f"  -> Circuit OPEN for {self.name} ({reason}). "
+              f"Skipping calls for {self.recovery_timeout:.0f} seconds; skipped questions stay pending for resume.")
+
+
+# ============================================================
+# 全局注册表（进程内每个模型一个熔断器，所有线程共享）
+# ============================================================
+_BREAKERS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def configure_circuit_breaker(name: str, **options) -> CircuitBreaker:
+    """按配置创建（或替换）某个模型的熔断器，options 对应 CircuitBreaker 的参数"""
+    breaker = CircuitBreaker(name, **options)
+    with _REGISTRY_LOCK:
+        _BREAKERS[name] = breaker
+    return breaker
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """获取某个模型的熔断器；未配置过的模型使用默认参数"""
+    with _REGISTRY_LOCK:
+        breaker = _BREAKERS.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name)
+            _BREAKERS[name] = breaker
+        return breaker
+
+
+def guarded_call(name: str, call, is_success=bool):
+    """
+    在熔断器保护下执行 call()
+    - 熔断中：抛出 CircuitOpenError，不调用 API
+    - 否则执行 call()，按 is_success(结果) 记录成败（抛出异常也记为失败）
+    """
+    breaker = get_circuit_breaker(name)
+    if not breaker.allow_request():
+        raise CircuitOpenError(name)
+    try:
+        result = call()
+    except Exception:
+        breaker.record_failure()
+        raise
+    if is_success(result):
+        breaker.record_success()
+    else:
+        breaker.record_failure()
+    return result
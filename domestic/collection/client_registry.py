@@ -0,0 +1,90 @@
+# domestic/collection/client_registry.py
+"""
+模型 HTTP 客户端注册表
+每个模型只创建一个长连接（keep-alive）的 OpenAI 客户端，所有问题、所有线程共享同一个连接池，
+避免每个问题都重新建连、重新做 TLS 握手。可选开启 HTTP/2（需要安装 h2: pip install "httpx[http2]"）。
+
+国内 (run_analysis_domestic.py) 与海外 (run_analysis_oversea.py) 采集引擎共用本模块。
+"""
+import importlib.util
+import threading
+
+import httpx
+from openai import OpenAI
+
+# 全局默认值，可通过 configure_http_defaults() 按配置文件覆盖
+_DEFAULTS = {
+    "http2": False,
+    "max_connections": 20,
+    "keepalive_expiry": 60.0,
+    "timeout": 120.0,
+}
+
+_CLIENTS = {}
+_REGISTRY_LOCK = threading.Lock()
+_HTTP2_WARNED = False
+
+
+def configure_http_defaults(**options):
+    """覆盖客户端默认参数：http2 / max_connections / keepalive_expiry / timeout"""
+    unknown = set(options) - set(_DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown http client options: {', '.join(sorted(unknown))}")
+    _DEFAULTS.update(options)
+
+
+def get_request_timeout() -> float:
+    """当前配置的单次请求超时（秒），非 HTTP 的客户端（如星火 websocket）也按此等待"""
+    return _DEFAULTS["timeout"]
+
+
+def _http2_supported() -> bool:
+    """httpx 的 HTTP/2 支持依赖 h2 包，未安装时回退到 HTTP/1.1"""
+    global _HTTP2_WARNED
+    if importlib.util.find_spec("h2") is not None:
+        return True
+    if not _HTTP2_WARNED:
+        print("⚠️  未安装 h2，HTTP/2 不可用，回退到 HTTP/1.1（pip install \"httpx[http2]\"）")
+        _HTTP2_WARNED = True
+    return False
+
+
+def get_openai_client(name: str, api_key: str, base_url: str, http2: bool = None,
+                      max_connections: int = None) -> OpenAI:
+    """
+    获取（或首次创建）某个模型共享的 OpenAI 客户端
+    以 (name, base_url, api_key) 为键，同一模型的所有调用复用同一个连接池
+    """
+    key = (name, base_url, api_key)
+    with _REGISTRY_LOCK:
+        client = _CLIENTS.get(key)
+        if client is not None:
+            return client
+
+        use_http2 = _DEFAULTS["http2"] if http2 is None else http2
+        if use_http2 and not _http2_supported():
+            use_http2 = False
+        pool_size = max_connections or _DEFAULTS["max_connections"]
+
+        http_client = httpx.Client(
+            http2=use_http2,
+            timeout=_DEFAULTS["timeout"],
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=_DEFAULTS["keepalive_expiry"],
+            ),
+        )
+        # 关闭 SDK 自带的重试（默认 2 次，且自行按 Retry-After 休眠）：429 / 5xx 只由 ProviderRateLimiter
+        # 处理，自适应并发、共享冷却与 rate_limit.max_retries 才能生效
+        client = OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        _CLIENTS[key] = client
+        return client
+
+
+def close_all_clients():
+    """关闭所有共享客户端（采集结束时调用）"""
+    with _REGISTRY_LOCK:
+        for client in _CLIENTS.values():
+            client.close()
+        _CLIENTS.clear()
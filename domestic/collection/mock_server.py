@@ -0,0 +1,453 @@
+# domestic/collection/mock_server.py
+"""
+本地模拟大模型服务（仅用于压测/基准测试，不依赖第三方库）
+按各采集适配器实际解析的响应结构返回数据：
+- DashScope 原生接口   POST /api/v1/services/aigc/text-generation/generation   (output.choices + output.search_info)
+- 火山引擎 responses    POST /doubao/api/v3/responses                            (message + web_search_call 输出项)
+- OpenAI 兼容 chat     POST /{flavor}/.../chat/completions                      (支持 stream=true 的 SSE 增量)
+    flavor = hunyuan  额外返回 search_info.search_results
+    flavor = zhinao   额外返回 web_search
+    其余（compatible-mode / openrouter / openai）为标准 chat.completion
+- 讯飞星火 websocket   GET  /spark/v1.1/chat                                    (header/payload 帧，status=2 结束)
+
+可配置延迟、随机错误率与 429 注入率。
+用法:
+python collection/mock_server.py --port 8900 --latency-ms 300 --jitter-ms 100 --error-rate 0.01 --rate-limit-rate 0.05
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import uuid
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+MOCK_ANSWER = (
+    "根据近期的市场表现和用户口碑，以下品牌值得重点关注。\n"
+    "1. 华为：综合实力强，强烈推荐，是高端市场的首选之一。\n"
+    "2. 小米：性价比很高，产品线丰富。\n"
+    "3. 苹果：生态完善，品牌溢价明显。\n"
+    "4. OPPO 与 vivo：影像能力突出，线下渠道覆盖广。\n"
+    "5. 荣耀：近年增长迅速，但部分机型不如竞品稳定。\n"
+    "总体来看，建议结合预算与使用场景进行选择。"
+)
+
+MOCK_REFERENCES = [
+    {"index": 1, "title": "2025年品牌口碑报告", "url": "https://example.com/report/2025", "snippet": "品牌口碑排行"},
+    {"index": 2, "title": "消费者调研", "url": "https://example.com/survey", "snippet": "用户满意度调研"},
+]
+
+
+class MockSettings:
+    def __init__(self, latency_ms: float = 200.0, jitter_ms: float = 50.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, stream_chunks: int = 8, seed: int = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stream_chunks = max(1, stream_chunks)
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def latency(self) -> float:
+        with self._lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def roll(self) -> str:
+        """决定本次请求的结果：ok / rate_limited / error"""
+        with self._lock:
+            value = self.random.random()
+        if value < self.rate_limit_rate:
+            return "rate_limited"
+        if value < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+
+def _usage(prompt: str, answer: str) -> dict:
+    prompt_tokens, completion_tokens = len(prompt), len(answer)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "input_tokens": prompt_tokens,
+        "output_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _prompt_text(messages) -> str:
+    if isinstance(messages, str):
+        return messages
+    return "".join(str(m.get("content", "")) for m in messages or [])
+
+
+class MockProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "GeoMockProvider/1.0"
+
+    def log_message(self, format, *args):
+        pass  # 压测时不打印访问日志
+
+    # ------------------------------------------------------------
+    # 通用工具
+    # ------------------------------------------------------------
+    @property
+    def settings(self) -> MockSettings:
+        return self.server.settings
+
+    def _record(self, route: str, outcome: str):
+        with self.server.stats_lock:
+            self.server.stats[route][outcome] += 1
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length) if length else b"{}"
+        return json.loads(raw or b"{}")
+
+    def _inject_failure(self, route: str, outcome: str) -> bool:
+        """按配置注入 429 / 500，返回 True 表示已经写回了错误响应"""
+        if outcome == "rate_limited":
+            self._record(route, "rate_limited")
+            self._send_json(429, {"code": "Throttling", "message": "Requests rate limit exceeded (mock)",
+                                  "error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit"}},
+                            headers={"Retry-After": "1"})
+            return True
+        if outcome == "error":
+            self._record(route, "error")
+            self._send_json(500, {"code": "InternalError", "message": "Injected failure (mock)",
+                                  "error": {"message": "Injected failure (mock)", "type": "server_error"}})
+            return True
+        return False
+
+    # ------------------------------------------------------------
+    # 路由
+    # ------------------------------------------------------------
+    def do_POST(self):
+        path = self.path.split("?", 1)[0]
+        request = self._read_json()
+
+        if path.endswith("/services/aigc/text-generation/generation"):
+            route = "dashscope"
+        elif path.endswith("/responses"):
+            route = "doubao_responses"
+        elif path.endswith("/chat/completions"):
+            route = path.strip("/").split("/", 1)[0] or "openai"
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown mock route {path}"}})
+            return
+
+        outcome = self.settings.roll()
+        if self._inject_failure(route, outcome):
+            return
+
+        if route == "dashscope":
+            self._handle_dashscope(request)
+        elif route == "doubao_responses":
+            self._handle_responses(request)
+        elif request.get("stream"):
+            self._handle_chat_stream(route, request)
+        else:
+            self._handle_chat(route, request)
+        self._record(route, "ok")
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/health":
+            self._send_json(200, {"status": "ok"})
+            return
+        if path.startswith("/spark") and self.headers.get("Upgrade", "").lower() == "websocket":
+            self._handle_spark_websocket()
+            return
+        self._send_json(404, {"error": {"message": f"Unknown mock route {path}"}})
+
+    # ------------------------------------------------------------
+    # DashScope 原生接口
+    # ------------------------------------------------------------
+    def _handle_dashscope(self, request: dict):
+        time.sleep(self.settings.latency())
+        payload_input = request.get("input", {})
+        prompt = _prompt_text(payload_input.get("messages", []))
+        output = {
+            "choices": [{"finish_reason": "stop", "message": {"role": "assistant", "content": MOCK_ANSWER}}],
+        }
+        if request.get("parameters", {}).get("enable_search"):
+            output["search_info"] = {"search_results": MOCK_REFERENCES}
+        self._send_json(200, {
+            "request_id": uuid.uuid4().hex,
+            "output": output,
+            "usage": _usage(prompt, MOCK_ANSWER),
+        })
+
+    # ------------------------------------------------------------
+    # 火山引擎 responses.create()
+    # ------------------------------------------------------------
+    def _handle_responses(self, request: dict):
+        time.sleep(self.settings.latency())
+        prompt = _prompt_text(request.get("input", []))
+        output = []
+        if request.get("tools"):
+            output.append({
+                "type": "web_search_call",
+                "id": f"ws_{uuid.uuid4().hex[:12]}",
+                "status": "completed",
+                "search_results": MOCK_REFERENCES,
+            })
+        output.append({
+            "type": "message",
+            "id": f"msg_{uuid.uuid4().hex[:12]}",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "text", "text": MOCK_ANSWER}],
+        })
+        self._send_json(200, {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": request.get("model", "mock"),
+            "status": "completed",
+            "output": output,
+            "usage": _usage(prompt, MOCK_ANSWER),
+        })
+
+    # ------------------------------------------------------------
+    # OpenAI 兼容 chat.completions
+    # ------------------------------------------------------------
+    def _handle_chat(self, route: str, request: dict):
+        time.sleep(self.settings.latency())
+        prompt = _prompt_text(request.get("messages", []))
+        payload = {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "mock"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": MOCK_ANSWER},
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(prompt, MOCK_ANSWER),
+        }
+        if route == "hunyuan":
+            payload["search_info"] = {"search_results": MOCK_REFERENCES}
+        elif route == "zhinao":
+            payload["web_search"] = MOCK_REFERENCES
+        self._send_json(200, payload)
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _handle_chat_stream(self, route: str, request: dict):
+        """SSE 流式返回：首个增量在 latency 的 30% 后到达，其余增量均匀分布在剩余时间内"""
+        total_latency = self.settings.latency()
+        chunks = self.settings.stream_chunks
+        step = max(1, len(MOCK_ANSWER) // chunks)
+        pieces = [MOCK_ANSWER[i:i + step] for i in range(0, len(MOCK_ANSWER), step)]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        time.sleep(total_latency * 0.3)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(total_latency * 0.7 / max(1, len(pieces) - 1))
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        if (request.get("stream_options") or {}).get("include_usage"):
+            usage_event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model", "mock"),
+                "choices": [],
+                "usage": _usage(_prompt_text(request.get("messages", [])), MOCK_ANSWER),
+            }
+            self._write_chunk(f"data: {json.dumps(usage_event, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._write_chunk(b"")
+
+    # ------------------------------------------------------------
+    # 讯飞星火 websocket
+    # ------------------------------------------------------------
+    def _ws_send(self, opcode: int, payload: bytes):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([length])
+        elif length < 65536:
+            header += bytes([126]) + struct.pack("!H", length)
+        else:
+            header += bytes([127]) + struct.pack("!Q", length)
+        self.wfile.write(header + payload)
+        self.wfile.flush()
+
+    def _ws_recv(self):
+        """读取一个客户端帧，返回 (opcode, payload)；连接断开时返回 (None, b"")"""
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None, b""
+        opcode = head[0] & 0x0F
+        masked = head[1] & 0x80
+        length = head[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if masked else b""
+        payload = self.rfile.read(length)
+        if masked:
+            payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+        return opcode, payload
+
+    def _handle_spark_websocket(self):
+        route = "spark"
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.close_connection = True
+
+        opcode, payload = self._ws_recv()
+        if opcode != 0x1:
+            return
+        request = json.loads(payload.decode("utf-8"))
+        sid = f"mock{uuid.uuid4().hex[:16]}"
+        outcome = self.settings.roll()
+
+        if outcome != "ok":
+            # 星火在 header.code 中返回错误码：11202 秒级流控超限，10000+ 为服务错误
+            self._record(route, outcome)
+            code = 11202 if outcome == "rate_limited" else 10013
+            frame = {"header": {"code": code, "message": f"{outcome} (mock)", "sid": sid, "status": 2}}
+            self._ws_send(0x1, json.dumps(frame, ensure_ascii=False).encode("utf-8"))
+            self._ws_send(0x8, struct.pack("!H", 1000))
+            return
+
+        total_latency = self.settings.latency()
+        chunks = self.settings.stream_chunks
+        step = max(1, len(MOCK_ANSWER) // chunks)
+        pieces = [MOCK_ANSWER[i:i + step] for i in range(0, len(MOCK_ANSWER), step)]
+        prompt = _prompt_text(request.get("payload", {}).get("message", {}).get("text", []))
+
+        time.sleep(total_latency * 0.3)
+        for i, piece in enumerate(pieces):
+            if i:
+                time.sleep(total_latency * 0.7 / max(1, len(pieces) - 1))
+            last = i == len(pieces) - 1
+            frame = {
+                "header": {"code": 0, "message": "Success", "sid": sid, "status": 2 if last else 1},
+                "payload": {
+                    "choices": {
+                        "status": 2 if last else 1,
+                        "seq": i,
+                        "text": [{"content": piece, "role": "assistant", "index": 0}],
+                    }
+                },
+            }
+            if last:
+                usage = _usage(prompt, MOCK_ANSWER)
+                frame["payload"]["usage"] = {"text": {
+                    "question_tokens": usage["prompt_tokens"],
+                    "prompt_tokens": usage["prompt_tokens"],
+                    "completion_tokens": usage["completion_tokens"],
+                    "total_tokens": usage["total_tokens"],
+                }}
+            self._ws_send(0x1, json.dumps(frame, ensure_ascii=False).encode("utf-8"))
+
+        self._record(route, "ok")
+        self._ws_send(0x8, struct.pack("!H", 1000))
+        # 等待客户端的关闭帧（或直接断开）
+        self._ws_recv()
+
+
+class MockProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, settings: MockSettings = None):
+        super().__init__((host, port), MockProviderHandler)
+        self.settings = settings or MockSettings()
+        self.stats = defaultdict(lambda: defaultdict(int))
+        self.stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def ws_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"ws://{host}:{port}"
+
+    def start_in_background(self) -> "MockProviderServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-provider", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def snapshot_stats(self) -> dict:
+        with self.stats_lock:
+            return {route: dict(counts) for route, counts in self.stats.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟大模型服务（压测用）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="平均响应延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=50.0, help="延迟随机抖动范围（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="随机返回 429 的概率")
+    parser.add_argument("--stream-chunks", type=int, default=8, help="流式响应的增量块数")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    settings = MockSettings(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                            args.stream_chunks, args.seed)
+    server = MockProviderServer(args.host, args.port, settings)
+    print(f"🧪 Mock provider server listening on {server.base_url} (websocket: {server.ws_url}/spark/v1.1/chat)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
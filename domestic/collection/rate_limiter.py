@@ -0,0 +1,283 @@
+# domestic/collection/rate_limiter.py
+"""
+按模型（provider）隔离的速率限制器
+- 每个模型一对令牌桶：requests/minute 与 tokens/minute
+- AIMD 自适应并发：收到 429 时并发上限减半，调用成功后逐步加回
+- 429 后的退避对该模型的所有线程生效，避免各线程各自重试、互相踩踏
+
+国内 (run_analysis_domestic.py) 与海外 (run_analysis_oversea.py) 采集引擎共用本模块。
+"""
+import threading
+import time
+from typing import Callable, Optional
+
+from collection.telemetry import record_retry, record_usage
+
+
+class RateLimitExceeded(Exception):
+    """服务端返回 429 / 配额限制，但 SDK 没有抛出异常时，由调用方主动抛出"""
+
+    def __init__(self, message: str = "Rate limit exceeded", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """判断异常是否为速率限制（兼容 openai SDK、httpx 以及仅在错误信息中带 429 的情况）"""
+    if isinstance(error, RateLimitExceeded):
+        return True
+    if getattr(error, 'status_code', None) == 429:
+        return True
+    response = getattr(error, 'response', None)
+    if getattr(response, 'status_code', None) == 429:
+        return True
+    message = str(error)
+    return "429" in message or "RESOURCE_EXHAUSTED" in message or "Throttling" in message
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """从异常中读取服务端建议的等待秒数（Retry-After 头）"""
+    retry_after = getattr(error, 'retry_after', None)
+    if retry_after is not None:
+        return float(retry_after)
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if headers:
+        value = headers.get('retry-after')
+        try:
+            return float(value) if value is not None else None
+        except (TypeError, ValueError):
+            return None
+    return None
+
+
+def estimate_tokens(messages: list, max_tokens: int = 0) -> int:
+    """
+    预估一次调用消耗的 token 数，用于 tokens/minute 令牌桶的预扣
+    中文约 1 字 1 token，这里按字符数保守估计，并预留 max_tokens 的输出额度
+    """
+    prompt_chars = sum(len(str(m.get('content', ''))) for m in messages)
+    return prompt_chars + max_tokens
+
+
+def extract_total_tokens(response) -> Optional[int]:
+    """从各家 SDK 的响应中读取实际消耗的 token 总数，读不到时返回 None"""
+    usage = getattr(response, 'usage', None)
+    if usage is None and isinstance(response, dict):
+        usage = response.get('usage')
+    if usage is None:
+        return None
+
+    def field(name):
+        if isinstance(usage, dict):
+            return usage.get(name)
+        return getattr(usage, name, None)
+
+    total = field('total_tokens')
+    if total is not None:
+        return int(total)
+    for prompt_key, completion_key in (('input_tokens', 'output_tokens'), ('prompt_tokens', 'completion_tokens')):
+        prompt, completion = field(prompt_key), field(completion_key)
+        if prompt is not None or completion is not None:
+            return int(prompt or 0) + int(completion or 0)
+    return None
+
+
+# ============================================================
+# 令牌桶
+# ============================================================
+class TokenBucket:
+    """线程安全的令牌桶，rate_per_minute 为每分钟补充的令牌数"""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else rate_per_minute)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate_per_second)
+        self._updated = now
+
+    def acquire(self, amount: float = 1):
+        """阻塞直到取得 amount 个令牌（超过桶容量的请求按桶容量计，避免永远等待）"""
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate_per_second
+            time.sleep(min(wait, 1.0))
+
+    def refund(self, amount: float):
+        """归还预扣多出的令牌（amount 为负数时表示补扣）"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+# ============================================================
+# AIMD 自适应并发
+# ============================================================
+class AdaptiveConcurrencyLimiter:
+    """
+    加性增、乘性减（AIMD）的并发闸门
+    - 每次成功：limit += increase_step / limit（约每一轮满并发 +increase_step）
+    - 每次 429：limit *= decrease_factor，但不低于 min_limit
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, increase_step: float = 1.0,
+                 decrease_factor: float = 0.5):
+        self.max_limit = max(1, int(max_limit))
+        self.min_limit = max(1, min(int(min_limit), self.max_limit))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self._limit = float(self.max_limit)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self):
+        with self._cond:
+            if self._limit < self.max_limit:
+                self._limit = min(float(self.max_limit), self._limit + self.increase_step / self._limit)
+                self._cond.notify_all()
+
+    def on_rate_limited(self):
+        with self._cond:
+            self._limit = max(float(self.min_limit), self._limit * self.decrease_factor)
+
+
+# ============================================================
+# 单个模型的限流器
+# ============================================================
+class ProviderRateLimiter:
+    """
+    组合 RPM 令牌桶、TPM 令牌桶、AIMD 并发闸门和全局退避
+    用法：
+        limiter = get_rate_limiter("豆包")
+        response = limiter.call(lambda: client.chat.completions.create(...), estimated_tokens=...)
+    """
+
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_concurrency: int = 4, min_concurrency: int = 1, max_retries: int = 5,
+                 base_backoff: float = 2.0, max_backoff: float = 60.0):
+        self.name = name
+        self.requests_bucket = TokenBucket(rpm) if rpm else None
+        self.tokens_bucket = TokenBucket(tpm) if tpm else None
+        self.concurrency = AdaptiveConcurrencyLimiter(max_concurrency, min_limit=min_concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._blocked_until = 0.0
+        self._consecutive_rate_limits = 0
+
+    def _wait_for_cooldown(self):
+        while True:
+            with self._lock:
+                wait = self._blocked_until - time.monotonic()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _on_rate_limited(self, retry_after: Optional[float]) -> float:
+        self.concurrency.on_rate_limited()
+        with self._lock:
+            self._consecutive_rate_limits += 1
+            backoff = retry_after if retry_after is not None else min(
+                self.max_backoff, self.base_backoff * (2 ** (self._consecutive_rate_limits - 1)))
+            self._blocked_until = max(self._blocked_until, time.monotonic() + backoff)
+        return backoff
+
+    def _on_success(self):
+        self.concurrency.on_success()
+        with self._lock:
+            self._consecutive_rate_limits = 0
+
+    def call(self, request: Callable, estimated_tokens: int = 0,
+             usage_getter: Callable = extract_total_tokens):
+        """
+        在限流保护下执行 request()
+        - 429 时收缩并发、整体退避后重试，最多 max_retries 次，用尽后抛出最后一次的异常
+        - 其他异常直接抛出，由调用方按原有逻辑处理
+        - 成功后根据 usage 归还 tokens/minute 预扣多出的部分；请求失败（含 429 重试）时全额归还预扣
+        """
+        attempt = 0
+        while True:
+            self._wait_for_cooldown()
+            if self.requests_bucket:
+                self.requests_bucket.acquire(1)
+            if self.tokens_bucket and estimated_tokens:
+                self.tokens_bucket.acquire(estimated_tokens)
+
+            self.concurrency.acquire()
+            try:
+                response = request()
+            except Exception as e:
+                # 失败的请求没有消耗 tokens，归还本次预扣，避免持续 429 时 TPM 桶被重复扣空
+                if self.tokens_bucket and estimated_tokens:
+                    self.tokens_bucket.refund(estimated_tokens)
+                if not is_rate_limit_error(e):
+                    raise
+                backoff = self._on_rate_limited(get_retry_after(e))
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                record_retry()
+                print(f"  -> Rate limit hit for {self.name}. "
+                      f"Concurrency -> {self.concurrency.limit}, retrying in {backoff:.1f} seconds "
+                      f"({attempt}/{self.max_retries})...")
+                continue
+            finally:
+                self.concurrency.release()
+
+            self._on_success()
+            record_usage(response)
+            if self.tokens_bucket and estimated_tokens and usage_getter:
+                actual_tokens = usage_getter(response)
+                if actual_tokens is not None:
+                    self.tokens_bucket.refund(estimated_tokens - actual_tokens)
+            return response
+
+
+# ============================================================
+# 全局注册表（进程内每个模型一个限流器，所有线程共享）
+# ============================================================
+_LIMITERS = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def configure_rate_limiter(name: str, **options) -> ProviderRateLimiter:
+    """按配置创建（或替换）某个模型的限流器，options 对应 ProviderRateLimiter 的参数"""
+    limiter = ProviderRateLimiter(name, **options)
+    with _REGISTRY_LOCK:
+        _LIMITERS[name] = limiter
+    return limiter
+
+
+def get_rate_limiter(name: str) -> ProviderRateLimiter:
+    """获取某个模型的限流器；未配置过的模型使用默认参数（不限 RPM/TPM，仅 AIMD + 退避）"""
+    with _REGISTRY_LOCK:
+        limiter = _LIMITERS.get(name)
+        if limiter is None:
+            limiter = ProviderRateLimiter(name)
+            _LIMITERS[name] = limiter
+        return limiter
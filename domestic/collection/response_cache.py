@@ -0,0 +1,157 @@
+# domestic/collection/response_cache.py
+"""
+LLM 回答的本地缓存（内容寻址，SQLite 存储）
+- 键：请求参数 (provider, model, messages, temperature, max_tokens, 联网搜索开关) 的 SHA-256
+- 值：回答的 response 字段 {"answer": ..., "references": [...]}
+- ttl：正常采集时超过 ttl 的缓存视为未命中并重新调用 API
+- collection_date：正常采集时只命中当天（采集日 00:00 之后）写入的缓存，不会把前一天的回答当作当天的采样
+- max_entries：超过上限时按最近访问时间淘汰最旧的条目
+- replay 模式：只从缓存读取（忽略 ttl），未命中直接跳过，不调用任何 API
+
+国内 (run_analysis_domestic.py) 与海外 (run_analysis_oversea.py) 采集引擎共用本模块。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+
+def make_cache_key(request_signature: dict) -> str:
+    """把请求参数规范化为 JSON 后取 SHA-256，作为内容寻址的缓存键"""
+    canonical = json.dumps(request_signature, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str, ttl_seconds: Optional[float] = None, max_entries: Optional[int] = None,
+                 replay: bool = False, read: bool = True, collection_date: Optional[str] = None):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.collection_date = collection_date
+        self.max_entries = max_entries
+        self.replay = replay
+        self.read = read
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def day_start(self) -> float:
+        """采集日（YYYYMMDD，未指定时为今天）本地 00:00 的时间戳"""
+        collection_date = self.collection_date or time.strftime("%Y%m%d")
+        return datetime.strptime(collection_date, "%Y%m%d").timestamp()
+
+    def get(self, key: str) -> Optional[dict]:
+        if not self.read:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            # replay 模式忽略过期；正常采集时超过 ttl 或早于采集日的缓存都视为过期
+            expired = row is not None and not self.replay and (
+                (self.ttl_seconds is not None and now - row[1] > self.ttl_seconds)
+                or row[1] < self.day_start()
+            )
+            if row is None or expired:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# ============================================================
+# 进程级缓存实例
+# ============================================================
+_CACHE: Optional[ResponseCache] = None
+
+
+def configure_response_cache(path: str, enabled: bool = True, ttl_hours: Optional[float] = None,
+                             max_entries: Optional[int] = None, replay: bool = False,
+                             read: bool = True, collection_date: Optional[str] = None) -> Optional[ResponseCache]:
+    """
+    按配置初始化缓存；enabled=False 且不是 replay 模式时关闭缓存
+    read=False 时只写不读（例如 --refresh 有意重新采样时）
+    collection_date（YYYYMMDD）：本次采集的日期，跨过零点的采集仍按开始那天判断缓存是否有效
+    """
+    global _CACHE
+    if _CACHE is not None:
+        _CACHE.close()
+    if not enabled and not replay:
+        _CACHE = None
+        return None
+    ttl_seconds = ttl_hours * 3600 if ttl_hours else None
+    _CACHE = ResponseCache(path, ttl_seconds=ttl_seconds, max_entries=max_entries, replay=replay, read=read,
+                           collection_date=collection_date)
+    return _CACHE
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    return _CACHE
+
+
+def is_replay_mode() -> bool:
+    return _CACHE is not None and _CACHE.replay
+
+
+def cached_call(request_signature: dict, call: Callable[[], Optional[dict]],
+                should_cache: Callable[[dict], bool] = bool) -> Optional[dict]:
+    """
+    缓存前置的 API 调用
+    - 命中：直接返回缓存的 response
+    - 未命中且为 replay 模式：返回 None，不调用 API
+    - 未命中：调用 call()，结果满足 should_cache 时写入缓存
+    """
+    cache = _CACHE
+    if cache is None:
+        return call()
+
+    key = make_cache_key(request_signature)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    if cache.replay:
+        print(f"  -> Replay mode: cache miss for {request_signature.get('model')}, skipping.")
+        return None
+
+    response = call()
+    if response is not None and should_cache(response):
+        cache.put(key, response)
+    return response
@@ -0,0 +1,237 @@
+# domestic/collection/telemetry.py
+"""
+采集调用的结构化遥测
+每次 call_model 记录一行 JSON（metrics_*.jsonl，与结果文件放在同一目录）：
+- wall_time_s：整次调用耗时（含限流等待与重试）
+- ttft_s：流式调用的首 token 时间（非流式调用为 null）
+- prompt_tokens / completion_tokens：响应 usage 中的实际 token 数
+- retries：429 退避重试与其他错误重试的次数
+- cost：按配置的单价估算的费用（未配置单价时为 null）
+采集结束时 print_summary() 按模型打印汇总表，用于找出吞吐瓶颈、按数据调整 concurrency。
+
+记录通过线程局部变量传递：call_model 用 track_call() 开启一条记录，
+同一线程里的适配器、限流器调用 mark_first_token() / record_usage() / record_retry() 补充字段。
+
+国内 (run_analysis_domestic.py) 与海外 (run_analysis_oversea.py) 采集引擎共用本模块。
+"""
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+_LOCAL = threading.local()
+
+
+def percentile(values: list, pct: float) -> float:
+    """最近秩法百分位数（values 已排序）"""
+    if not values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def extract_token_usage(response):
+    """从各家 SDK 的响应（或带 usage 字段的 dict）中读取 (prompt_tokens, completion_tokens)，读不到时为 None"""
+    usage = getattr(response, 'usage', None)
+    if usage is None and isinstance(response, dict):
+        usage = response.get('usage')
+    if usage is None:
+        return None, None
+
+    def field(name):
+        if isinstance(usage, dict):
+            return usage.get(name)
+        return getattr(usage, name, None)
+
+    for prompt_key, completion_key in (('prompt_tokens', 'completion_tokens'), ('input_tokens', 'output_tokens')):
+        prompt, completion = field(prompt_key), field(completion_key)
+        if prompt is not None or completion is not None:
+            return (int(prompt) if prompt is not None else None,
+                    int(completion) if completion is not None else None)
+    return None, None
+
+
+# ============================================================
+# 记录器
+# ============================================================
+class TelemetryRecorder:
+    """
+    收集本次运行的所有调用记录，并逐行追加到 metrics 文件
+    pricing: {模型: {"input_per_1k": 单价, "output_per_1k": 单价}}，单位与配置文件一致
+    """
+
+    def __init__(self, path: Optional[str] = None, pricing: Optional[dict] = None):
+        self.path = path
+        self.pricing = pricing or {}
+        self.records = []
+        self._lock = threading.Lock()
+        self._file = None
+
+    def estimate_cost(self, provider: str, prompt_tokens, completion_tokens) -> Optional[float]:
+        price = self.pricing.get(provider)
+        if not price or (prompt_tokens is None and completion_tokens is None):
+            return None
+        return round((prompt_tokens or 0) / 1000.0 * price.get('input_per_1k', 0)
+                     + (completion_tokens or 0) / 1000.0 * price.get('output_per_1k', 0), 6)
+
+    def add(self, record: dict):
+        record['cost'] = self.estimate_cost(record['provider'], record['prompt_tokens'], record['completion_tokens'])
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self.records.append(record)
+            if self.path:
+                if self._file is None:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summarize(self) -> dict:
+        """按模型汇总：调用数、成功/缓存/失败数、重试数、耗时分位数、平均首 token 时间、token 与费用合计"""
+        with self._lock:
+            records = list(self.records)
+
+        grouped = defaultdict(list)
+        for record in records:
+            grouped[record['provider']].append(record)
+
+        summary = {}
+        for provider, rows in grouped.items():
+            api_rows = [r for r in rows if not r['cached'] and r['status'] not in ('skipped', 'circuit_open')]
+            wall_times = sorted(r['wall_time_s'] for r in api_rows)
+            ttfts = [r['ttft_s'] for r in api_rows if r['ttft_s'] is not None]
+            costs = [r['cost'] for r in rows if r['cost'] is not None]
+            summary[provider] = {
+                "calls": len(rows),
+                "ok": sum(1 for r in rows if r['status'] == 'ok'),
+                "cached": sum(1 for r in rows if r['cached']),
+                "failed": sum(1 for r in rows if r['status'] in ('error', 'empty')),
+                "skipped": sum(1 for r in rows if r['status'] in ('skipped', 'circuit_open')),
+                "retries": sum(r['retries'] for r in rows),
+                "busy_s": round(sum(wall_times), 3),
+                "p50_s": round(percentile(wall_times, 50), 3),
+                "p95_s": round(percentile(wall_times, 95), 3),
+                "avg_ttft_s": round(sum(ttfts) / len(ttfts), 3) if ttfts else None,
+                "prompt_tokens": sum(r['prompt_tokens'] or 0 for r in rows),
+                "completion_tokens": sum(r['completion_tokens'] or 0 for r in rows),
+                "cost": round(sum(costs), 4) if costs else None,
+            }
+        return summary
+
+    def print_summary(self):
+        summary = self.summarize()
+        if not summary:
+            return
+        print("\n" + "=" * 124)
+        print("📊 Collection telemetry (API calls only for latency columns; cached answers are excluded)")
+        print("=" * 124)
+        print(f"{'model':<20} {'calls':>6} {'ok':>5} {'cached':>6} {'failed':>6} {'skip':>5} {'retries':>7} "
+              f"{'busy s':>9} {'p50 s':>7} {'p95 s':>7} {'ttft s':>7} {'prompt tok':>11} {'compl tok':>10} {'cost':>9}")
+        for provider, row in summary.items():
+            ttft = f"{row['avg_ttft_s']:.3f}" if row['avg_ttft_s'] is not None else "-"
+            cost = f"{row['cost']:.4f}" if row['cost'] is not None else "-"
+            print(f"{provider:<20} {row['calls']:>6} {row['ok']:>5} {row['cached']:>6} {row['failed']:>6} "
+                  f"{row['skipped']:>5} {row['retries']:>7} {row['busy_s']:>9.1f} {row['p50_s']:>7.2f} {row['p95_s']:>7.2f} {ttft:>7} "
+                  f"{row['prompt_tokens']:>11} {row['completion_tokens']:>10} {cost:>9}")
+        print("=" * 124)
+        if self.path:
+            print(f"-> Per-call metrics: {self.path}")
+
+
+# ============================================================
+# 进程级记录器
+# ============================================================
+_RECORDER: Optional[TelemetryRecorder] = None
+
+
+def configure_telemetry(path: Optional[str] = None, pricing: Optional[dict] = None) -> TelemetryRecorder:
+    """初始化本次运行的记录器；path 为 None 时只在内存中汇总，不写 metrics 文件"""
+    global _RECORDER
+    if _RECORDER is not None:
+        _RECORDER.close()
+    _RECORDER = TelemetryRecorder(path, pricing)
+    return _RECORDER
+
+
+def get_telemetry() -> Optional[TelemetryRecorder]:
+    return _RECORDER
+
+
+# ============================================================
+# 线程局部的单次调用记录
+# ============================================================
+@contextmanager
+def track_call(provider: str, model: Optional[str] = None, question_id=None):
+    """
+    记录一次调用，with 块内同一线程的 mark_first_token() / record_usage() / record_retry() 都写入这条记录
+    调用方在 with 块内设置 record['status']（ok / empty / error / skipped / circuit_open）与 record['cached']
+    """
+    record = {
+        "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+        "provider": provider,
+        "model": model,
+        "question_id": question_id,
+        "status": "ok",
+        "cached": False,
+        "wall_time_s": None,
+        "ttft_s": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+        "retries": 0,
+    }
+    previous = getattr(_LOCAL, 'record', None), getattr(_LOCAL, 'start', None)
+    start = time.perf_counter()
+    _LOCAL.record, _LOCAL.start = record, start
+    try:
+        yield record
+    except Exception:
+        record['status'] = 'error'
+        raise
+    finally:
+        record['wall_time_s'] = round(time.perf_counter() - start, 4)
+        _LOCAL.record, _LOCAL.start = previous
+        recorder = _RECORDER
+        if recorder is not None:
+            recorder.add(record)
+
+
+def current_call() -> Optional[dict]:
+    return getattr(_LOCAL, 'record', None)
+
+
+def mark_first_token(at: Optional[float] = None):
+    """
+    流式调用收到第一个增量时调用（只记录第一次）
+    at: 增量到达时的 time.perf_counter()，增量在其他线程（如事件循环）中收到时由调用方传入
+    """
+    record = current_call()
+    if record is not None and record['ttft_s'] is None:
+        record['ttft_s'] = round((at if at is not None else time.perf_counter()) - _LOCAL.start, 4)
+
+
+def record_usage(response):
+    """记录响应中的 token 用量（重试时以最后一次成功的响应为准）"""
+    record = current_call()
+    if record is None:
+        return
+    prompt_tokens, completion_tokens = extract_token_usage(response)
+    if prompt_tokens is not None:
+        record['prompt_tokens'] = prompt_tokens
+    if completion_tokens is not None:
+        record['completion_tokens'] = completion_tokens
+
+
+def record_retry():
+    record = current_call()
+    if record is not None:
+        record['retries'] += 1
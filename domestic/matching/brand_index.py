@@ -0,0 +1,112 @@
+# domestic/matching/brand_index.py
+"""
+编译后的品牌索引（持久化缓存）
+把品牌词典 yaml 编译成一个索引对象并 pickle 到磁盘，以 yaml 文件内容的 SHA-256 为键：
+- matcher：别名自动机（BrandMatcher）
+- alias_to_brands：小写别名 -> 品牌列表
+- whitelist_mask：白名单位图（第 i 位对应 brands[i]）
+- config：yaml 的完整内容（weights、matching 等其他配置项照常读取）
+yaml 内容不变时，之后的运行直接加载缓存（毫秒级），不再 yaml.safe_load、不再重建自动机；
+yaml 有任何修改都会得到新的哈希，自动重新编译。
+
+国内/海外分析引擎与 agent/pipelines/scoring_pipeline.py 共用本模块。
+"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+import yaml
+
+from matching.brand_matcher import BrandMatcher, ahocorasick
+
+# 索引结构变化时递增，旧缓存自动失效
+INDEX_FORMAT_VERSION = 1
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / "cache" / "brand_index"
+
+# 进程内缓存（常驻进程如 scoring_pipeline 重复评分同一品类时连反序列化也省掉）
+_LOADED = {}
+
+
+class BrandIndex:
+    def __init__(self, config: dict, source_hash: str, dictionary_key: str = "brand_dictionary",
+                 whitelist_key: str = "brands_whitelist"):
+        self.config = config
+        self.source_hash = source_hash
+        self.brand_dictionary = config.get(dictionary_key) or {}
+        self.whitelist = set(config.get(whitelist_key) or [])
+
+        self.brands = list(self.brand_dictionary)
+        self.brand_ids = {brand: i for i, brand in enumerate(self.brands)}
+        self.whitelist_mask = 0
+        for brand in self.whitelist:
+            if brand in self.brand_ids:
+                self.whitelist_mask |= 1 << self.brand_ids[brand]
+
+        self.matcher = BrandMatcher(self.brand_dictionary)
+        self.alias_to_brands = {}
+        for brand, pattern_id in self.matcher.entries:
+            brands = self.alias_to_brands.setdefault(self.matcher.patterns[pattern_id], [])
+            if brand not in brands:
+                brands.append(brand)
+
+    def is_whitelisted(self, brand: str) -> bool:
+        brand_id = self.brand_ids.get(brand)
+        if brand_id is None:
+            return brand in self.whitelist
+        return bool(self.whitelist_mask >> brand_id & 1)
+
+    def get_matcher(self, match_mode: str = "legacy", word_boundary: bool = False) -> BrandMatcher:
+        """按匹配方式取匹配器，共享同一个已编译的自动机"""
+        return self.matcher.with_options(match_mode, word_boundary)
+
+
+def _cache_path(cache_dir: Path, source_hash: str, dictionary_key: str, whitelist_key: str) -> Path:
+    # 自动机的实现（pyahocorasick / 纯 Python）不同，pickle 的内容也不同，分开缓存
+    backend = "c" if ahocorasick is not None else "py"
+    key = hashlib.sha256(
+        f"{source_hash}:{dictionary_key}:{whitelist_key}:{INDEX_FORMAT_VERSION}:{backend}".encode("utf-8")
+    ).hexdigest()[:24]
+    return cache_dir / f"brand_index_{key}.pkl"
+
+
+def load_brand_index(yaml_path, cache_dir=None, dictionary_key: str = "brand_dictionary",
+                     whitelist_key: str = "brands_whitelist", use_cache: bool = True) -> BrandIndex:
+    """
+    加载品牌索引：缓存命中时直接反序列化，否则解析 yaml、编译索引并写入缓存
+    文件不存在时抛出 FileNotFoundError（与直接 open() yaml 的行为一致）
+    """
+    with open(yaml_path, "rb") as f:
+        raw = f.read()
+    source_hash = hashlib.sha256(raw).hexdigest()
+    cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+    cache_path = _cache_path(cache_dir, source_hash, dictionary_key, whitelist_key)
+
+    if use_cache and cache_path in _LOADED:
+        return _LOADED[cache_path]
+
+    if use_cache and cache_path.exists():
+        try:
+            with open(cache_path, "rb") as f:
+                index = pickle.load(f)
+            # 不用 isinstance：以 matching.brand_index 与 domestic.matching.brand_index 两种路径导入时类对象不同
+            if getattr(index, "source_hash", None) == source_hash:
+                _LOADED[cache_path] = index
+                return index
+        except Exception as e:
+            print(f"⚠️  品牌索引缓存 {cache_path} 读取失败，重新编译: {e}")
+
+    config = yaml.safe_load(raw.decode("utf-8")) or {}
+    index = BrandIndex(config, source_hash, dictionary_key, whitelist_key)
+
+    if use_cache:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path.with_suffix(".pkl.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"⚠️  品牌索引缓存写入失败（不影响本次分析）: {e}")
+        _LOADED[cache_path] = index
+    return index
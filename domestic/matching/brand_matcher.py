@@ -0,0 +1,230 @@
+# domestic/matching/brand_matcher.py
+"""
+品牌别名多模式匹配（Aho-Corasick 自动机）
+旧逻辑对每个品牌的每个别名各跑一遍 re.finditer，耗时 O(别名数 × 回答长度)；
+这里对整个 brand_dictionary 只构建一次自动机，一遍扫描回答就找出所有别名的出现位置。
+
+find_mentions() 返回与旧逻辑完全相同的 (品牌, 位置) 序列：
+- 每个别名各自按 re.finditer 的语义取不重叠的匹配（同一别名从上一次匹配结束处继续找）
+- 不同别名之间互不影响（"华为" 与 "华为手机" 各自计数）
+- 顺序为：品牌按词典顺序 → 别名按列表顺序 → 位置从小到大；同一别名重复出现在列表中时重复计数
+唯一的区别：空别名被忽略（旧逻辑中空串会在每个字符位置都"匹配"一次）
+
+可选的匹配方式（mode）：
+- legacy（默认）：即上面与旧逻辑一致的方式，嵌套别名会重复计数（"华为手机" 同时算 "华为" 与 "华为手机"）
+- leftmost_longest：所有别名一起取不重叠的最左最长匹配，"华为手机" 只算一次；
+  短别名也不会再命中其他品牌长名称的内部。同一别名被多个品牌使用时，每个品牌各计一次
+word_boundary=True 时，以拉丁字母/数字开头（结尾）的别名要求前（后）一个字符不是拉丁字母/数字，
+避免 "cat" 命中 "category"；与中文相邻不受影响（"用iphone拍照" 仍然命中 iphone）。
+
+安装了 pyahocorasick（C 扩展，pip install pyahocorasick）时使用它扫描，否则使用纯 Python 实现。
+
+国内 (analyze_results_domestic.py) 与海外 (analyze_results_oversea.py) 分析引擎共用本模块。
+"""
+import copy
+from collections import deque
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+MATCH_MODES = ("legacy", "leftmost_longest")
+
+
+def resolve_match_options(matching_config: dict = None, mode: str = None, word_boundary: bool = None) -> dict:
+    """
+    合并匹配方式配置：命令行参数优先，其次为配置文件中的 matching 段，最后为默认值（legacy、不检查单词边界）
+    返回可直接传给 BrandMatcher / calculate_scores 的 {"match_mode": ..., "word_boundary": ...}
+    """
+    matching_config = matching_config or {}
+    return {
+        "match_mode": mode or matching_config.get("mode", "legacy"),
+        "word_boundary": word_boundary if word_boundary is not None else bool(matching_config.get("word_boundary", False)),
+    }
+
+
+def _is_latin_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class BrandMatcher:
+    def __init__(self, brand_dictionary: dict, mode: str = "legacy", word_boundary: bool = False):
+        self.patterns = []  # 去重后的小写别名，下标即 pattern id
+        self.entries = []  # (品牌, pattern id)，按词典中品牌、别名的顺序排列
+        self._entries_by_pattern = []  # pattern id -> [entries 下标]
+        pattern_ids = {}
+
+        for brand, aliases in brand_dictionary.items():
+            for alias in aliases or []:
+                alias_lower = str(alias).lower()
+                if not alias_lower:
+                    continue
+                pattern_id = pattern_ids.get(alias_lower)
+                if pattern_id is None:
+                    pattern_id = pattern_ids[alias_lower] = len(self.patterns)
+                    self.patterns.append(alias_lower)
+                    self._entries_by_pattern.append([])
+                self._entries_by_pattern[pattern_id].append(len(self.entries))
+                self.entries.append((brand, pattern_id))
+
+        self._pattern_lengths = [len(p) for p in self.patterns]
+        # leftmost_longest 模式下每个别名对应的品牌（去重，保持词典顺序）
+        self._brands_by_pattern = [
+            list(dict.fromkeys(self.entries[index][0] for index in indices))
+            for indices in self._entries_by_pattern
+        ]
+        if ahocorasick is not None and self.patterns:
+            self._automaton = ahocorasick.Automaton()
+            for pattern_id, pattern in enumerate(self.patterns):
+                self._automaton.add_word(pattern, pattern_id)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            self._build_python_automaton()
+
+        self._set_options(mode, word_boundary)
+
+    def _set_options(self, mode: str, word_boundary: bool):
+        if mode not in MATCH_MODES:
+            raise ValueError(f"Unknown match mode '{mode}', expected one of: {', '.join(MATCH_MODES)}")
+        self.mode = mode
+        self.word_boundary = word_boundary
+        # 每个别名的首尾字符是否需要做单词边界检查
+        self._boundary_checks = [
+            (_is_latin_word_char(p[0]), _is_latin_word_char(p[-1])) if word_boundary else (False, False)
+            for p in self.patterns
+        ]
+
+    def with_options(self, mode: str = "legacy", word_boundary: bool = False) -> "BrandMatcher":
+        """返回使用另一种匹配方式的匹配器（共享已编译的自动机，不重新构建）"""
+        if mode == self.mode and word_boundary == self.word_boundary:
+            return self
+        matcher = copy.copy(self)
+        matcher._set_options(mode, word_boundary)
+        return matcher
+
+    # ------------------------------------------------------------
+    # 纯 Python 自动机
+    # ------------------------------------------------------------
+    def _build_python_automaton(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]  # 节点 -> 以该节点结尾的 pattern id（含 fail 链上的）
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                next_node = self._goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][ch] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                node = next_node
+            self._output[node].append(pattern_id)
+
+        # BFS 计算 fail 指针，并把 fail 节点的输出并入当前节点
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+        self._alphabet = frozenset(ch for pattern in self.patterns for ch in pattern)
+
+    def _iter_python(self, text: str):
+        """逐字符扫描，产出 (结束下标, pattern id)，包含相互重叠的匹配"""
+        goto, fail, output, alphabet = self._goto, self._fail, self._output, self._alphabet
+        state = 0
+        for i, ch in enumerate(text):
+            if ch not in alphabet:
+                # 没有任何别名包含该字符，直接回到根节点
+                state = 0
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern_id in output[state]:
+                yield i, pattern_id
+
+    # ------------------------------------------------------------
+    # 匹配
+    # ------------------------------------------------------------
+    def _iter_matches(self, text_lower: str):
+        """产出所有 (起始位置, 结束位置, pattern id)（含重叠），已按 word_boundary 过滤"""
+        matches = self._automaton.iter(text_lower) if self._automaton is not None else self._iter_python(text_lower)
+        lengths = self._pattern_lengths
+        checks = self._boundary_checks
+        text_length = len(text_lower)
+        for end_index, pattern_id in matches:
+            start, end = end_index - lengths[pattern_id] + 1, end_index + 1
+            if self.word_boundary:
+                check_start, check_end = checks[pattern_id]
+                if check_start and start > 0 and _is_latin_word_char(text_lower[start - 1]):
+                    continue
+                if check_end and end < text_length and _is_latin_word_char(text_lower[end]):
+                    continue
+            yield start, end, pattern_id
+
+    def contains_any(self, text_lower: str) -> bool:
+        """文本中是否出现任意一个别名（找到第一个匹配即返回）"""
+        if not self.patterns:
+            return False
+        return next(self._iter_matches(text_lower), None) is not None
+
+    def scan(self, text_lower: str) -> dict:
+        """
+        一遍扫描，返回 {pattern id: [起始位置, ...]}
+        每个别名独立地取不重叠匹配，与 re.finditer(re.escape(alias), text) 的结果一致
+        """
+        if not self.patterns:
+            return {}
+        hits = {}
+        last_end = {}
+        for start, end, pattern_id in self._iter_matches(text_lower):
+            if start >= last_end.get(pattern_id, 0):
+                hits.setdefault(pattern_id, []).append(start)
+                last_end[pattern_id] = end
+        return hits
+
+    def scan_leftmost_longest(self, text_lower: str) -> list:
+        """所有别名一起取不重叠的最左最长匹配，返回按位置排序的 [(起始位置, pattern id), ...]"""
+        if not self.patterns:
+            return []
+        candidates = sorted(self._iter_matches(text_lower), key=lambda m: (m[0], -m[1]))
+        selected = []
+        last_end = 0
+        for start, end, pattern_id in candidates:
+            if start >= last_end:
+                selected.append((start, pattern_id))
+                last_end = end
+        return selected
+
+    def find_mentions(self, text_lower: str) -> list:
+        """
+        返回 [(品牌, 位置), ...]
+        legacy 模式下顺序与逐别名 re.finditer 的旧逻辑相同；leftmost_longest 模式下按位置排序
+        """
+        if self.mode == "leftmost_longest":
+            return [
+                (brand, start)
+                for start, pattern_id in self.scan_leftmost_longest(text_lower)
+                for brand in self._brands_by_pattern[pattern_id]
+            ]
+
+        hits = self.scan(text_lower)
+        if not hits:
+            return []
+        entry_indices = sorted(index for pattern_id in hits for index in self._entries_by_pattern[pattern_id])
+        mentions = []
+        for index in entry_indices:
+            brand, pattern_id = self.entries[index]
+            mentions.extend((brand, pos) for pos in hits[pattern_id])
+        return mentions
@@ -0,0 +1,130 @@
+# domestic/matching/sentence_index.py
+"""
+按提及位置把品牌归属到句子
+旧逻辑对 每个句子 × 每个品牌（× 每个别名）做一次子串查找，情感句子收集和强推荐检测各做一遍；
+这里先用一次 re.finditer 得到所有句子的起始位置（有序数组），
+再对 BrandMatcher 给出的每个提及位置做二分查找，得到它所在的句子，
+总开销约为 O(提及数 × log 句子数)。
+
+context_windows_by_brand 进一步把情感分析的输入从整句缩短为提及位置前后的 token 窗口：
+按 。\n.!? 切分的“句子”可能是一整段，超过 MAX_LENGTH=256 后被截断，品牌甚至可能落在截断之外；
+窗口保证模型看到的是品牌附近的上下文，推理开销也随序列长度下降。
+
+国内 (analyze_results_domestic.py) 与海外 (analyze_results_oversea.py) 分析引擎共用本模块。
+"""
+import re
+from bisect import bisect_right
+
+# 情感分析窗口默认关闭（0：整句送入模型，与历史榜单口径一致）
+DEFAULT_CONTEXT_WINDOW = 0
+
+# 国内分析引擎把句子归属到品牌的方式：
+# name（默认，与历史榜单口径一致）：句子中出现品牌标准名称才归属；alias：按别名的匹配位置归属
+ATTRIBUTION_MODES = ("name", "alias")
+DEFAULT_ATTRIBUTION = "name"
+
+# 近似 BERT 的预切分：每个 CJK 字符、每个标点各算一个 token，连续的字母数字算一个 token
+# （WordPiece 可能把长单词再切开，实际 token 数不少于此）
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u9fff\uf900-\ufaff]|(?:(?![\u3400-\u9fff\uf900-\ufaff])[^\W_])+|[^\w\s]|_")
+
+
+def split_sentences(text: str, delimiter_pattern: str):
+    """
+    按分隔符切分句子，返回 (sentences, starts)
+    sentences 与 re.split(delimiter_pattern, text) 的结果相同，starts[i] 为 sentences[i] 在 text 中的起始位置
+    """
+    sentences = []
+    starts = [0]
+    last = 0
+    for match in re.finditer(delimiter_pattern, text):
+        sentences.append(text[last:match.start()])
+        last = match.end()
+        starts.append(last)
+    sentences.append(text[last:])
+    return sentences, starts
+
+
+def sentences_by_brand(mentions, starts: list) -> dict:
+    """
+    mentions: [(品牌, 位置), ...]（BrandMatcher.find_mentions 的结果）
+    返回 {品牌: [句子下标, ...]}，下标去重并按句子顺序排列
+    """
+    grouped = {}
+    for brand, pos in mentions:
+        grouped.setdefault(brand, set()).add(bisect_right(starts, pos) - 1)
+    return {brand: sorted(indices) for brand, indices in grouped.items()}
+
+
+def resolve_attribution(sentiment_config: dict = None, attribution: str = None) -> str:
+    """命令行参数优先，其次是配置文件中的 sentiment.attribution，默认 DEFAULT_ATTRIBUTION"""
+    if attribution is None:
+        attribution = (sentiment_config or {}).get("attribution", DEFAULT_ATTRIBUTION)
+    if attribution not in ATTRIBUTION_MODES:
+        raise ValueError(f"Unknown attribution '{attribution}', expected one of: {', '.join(ATTRIBUTION_MODES)}")
+    return attribution
+
+
+def name_mentions(text_lower: str, brands, sentences: list, starts: list) -> list:
+    """
+    返回 [(品牌, 位置), ...]：品牌标准名称（小写）在 text_lower 中完整落在某个句子内的每一处出现（含重叠）
+    与 sentences_by_brand 配合，得到与旧逻辑“brand.lower() in sentence.lower()”相同的句子归属
+    """
+    mentions = []
+    for brand in brands:
+        name = brand.lower()
+        if not name:
+            continue
+        pos = text_lower.find(name)
+        while pos != -1:
+            sentence_id = bisect_right(starts, pos) - 1
+            if pos + len(name) <= starts[sentence_id] + len(sentences[sentence_id]):
+                mentions.append((brand, pos))
+            pos = text_lower.find(name, pos + 1)
+    return mentions
+
+
+def resolve_context_window(sentiment_config: dict = None, context_window: int = None) -> int:
+    """命令行参数优先，其次是配置文件中的 sentiment.context_window，默认 DEFAULT_CONTEXT_WINDOW"""
+    if context_window is None:
+        context_window = (sentiment_config or {}).get("context_window", DEFAULT_CONTEXT_WINDOW)
+    context_window = int(context_window)
+    if context_window < 0:
+        raise ValueError(f"context_window must be >= 0, got {context_window}")
+    return context_window
+
+
+def context_windows_by_brand(mentions, sentences: list, starts: list, window: int) -> dict:
+    """
+    以每个提及位置为中心，在其所在句子内截取前后各 window 个 token 的片段
+    同一品牌在同一句子中相互重叠的片段合并为一个；
+    不超过 2 × window + 1 个 token 的句子整句保留（多个品牌共用同一个句子，批量打分时只推理一次）
+    返回 {品牌: [片段, ...]}，片段按位置排列
+    """
+    tokens_of = {}  # 句子下标 -> (token 起始位置, token 结束位置)，每个句子只切分一次
+    spans = {}
+    for brand, pos in mentions:
+        sentence_id = bisect_right(starts, pos) - 1
+        if sentence_id not in tokens_of:
+            matches = list(_TOKEN_PATTERN.finditer(sentences[sentence_id]))
+            tokens_of[sentence_id] = ([m.start() for m in matches], [m.end() for m in matches])
+        token_starts, token_ends = tokens_of[sentence_id]
+        if not token_starts:
+            continue
+        if len(token_starts) <= 2 * window + 1:
+            lo, hi = 0, len(sentences[sentence_id])
+        else:
+            center = max(bisect_right(token_starts, pos - starts[sentence_id]) - 1, 0)
+            lo = token_starts[max(center - window, 0)]
+            hi = token_ends[min(center + window, len(token_ends) - 1)]
+        spans.setdefault(brand, []).append((sentence_id, lo, hi))
+
+    windows = {}
+    for brand, items in spans.items():
+        merged = []
+        for sentence_id, lo, hi in sorted(items):
+            if merged and merged[-1][0] == sentence_id and lo <= merged[-1][2]:
+                merged[-1][2] = max(merged[-1][2], hi)
+            else:
+                merged.append([sentence_id, lo, hi])
+        windows[brand] = [sentences[sentence_id][lo:hi] for sentence_id, lo, hi in merged]
+    return windows
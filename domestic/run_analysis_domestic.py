@@ -5,12 +5,21 @@ import time
 import argparse
 from dotenv import load_dotenv
 from collections import defaultdict
-from SparkApi import SparkSyncClient
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-from openai import OpenAI, RateLimitError, APIError
-import dashscope
+from concurrent.futures import ThreadPoolExecutor
+from SparkApi import SparkSyncClient, close_spark_clients, get_spark_client
 from dashscope import Generation
 from http import HTTPStatus
+from collection.checkpoint import JsonlCheckpoint
+from collection.circuit_breaker import CircuitOpenError, configure_circuit_breaker, get_circuit_breaker, guarded_call
+from collection.client_registry import close_all_clients, configure_http_defaults, get_openai_client, get_request_timeout
+from collection.response_cache import cached_call, configure_response_cache, get_response_cache, is_replay_mode
+from collection.telemetry import configure_telemetry, mark_first_token, record_usage, track_call
+from collection.rate_limiter import (
+    RateLimitExceeded,
+    configure_rate_limiter,
+    estimate_tokens,
+    get_rate_limiter,
+)
 
 # ==============================================================================
 # 国内榜单数据采集引擎--生成文件保存在merged_results目录下，按品类与日期戳划分
@@ -20,11 +29,31 @@ from http import HTTPStatus
 # 运行特定品类数据采集，例如零食饮料（snack）或旅游城市（city）：
 # python run_analysis_domestic.py --task snack
 # python run_analysis_domestic.py --task city
+# 默认并发采集：所有模型同时进行，每个模型的并发上限由 config_domestic.yaml 中的 concurrency 控制
+# 如需回到逐个模型、逐个问题的串行采集：
+# python run_analysis_domestic.py --task snack --serial
+# 断点续传：同一天重复运行只会补采还没有结果的问题；如需当天重新采样全部问题：
+# python run_analysis_domestic.py --task snack --refresh
+# 回答缓存：相同请求参数的问题在 ttl 内直接复用缓存；只用缓存重放（不调用任何 API，用于复现下游评分/基准）：
+# python run_analysis_domestic.py --task snack --replay
+# 每次调用的耗时、首 token 时间、token 用量、重试次数与估算费用写入 results 目录下的 metrics_{task}_{日期}.jsonl，
+# 采集结束时按模型打印汇总表
 # ==============================================================================
 
 # 假设您的项目根目录是 GEO
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# 模型未配置 concurrency 且全局也未配置 default_concurrency 时使用的并发数
+DEFAULT_CONCURRENCY = 2
+
+# 各 API 调用统一使用的生成参数
+SYSTEM_PROMPT = "你是一个专业的市场分析师，请根据用户的问题提供详细、客观的分析和回答。"
+DEFAULT_TEMPERATURE = 0.7
+DEFAULT_MAX_TOKENS = 2048
+
+# 支持联网搜索开关的 api_type（其余接口不联网，enable_search 不影响请求）
+SEARCH_API_TYPES = {'dashscope', 'doubao', 'zhinao', 'hunyuan'}
+
 
 def load_config(config_path):
     """加载 YAML 配置文件"""
@@ -38,6 +67,28 @@ def load_questions(questions_path):
         return json.load(f)
 
 
+def build_messages(question):
+    """构造统一的对话消息（系统提示 + 用户问题）"""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": question['prompt']}
+    ]
+
+
+def get_model_client(model_config, api_key, base_url=None):
+    """
+    获取该模型共享的长连接 OpenAI 客户端（所有问题、所有线程复用同一个连接池）
+    连接池大小与该模型的并发上限一致，http2 可在模型配置中单独开关
+    """
+    return get_openai_client(
+        model_config['name'],
+        api_key,
+        base_url or model_config['base_url'],
+        http2=model_config.get('http2'),
+        max_connections=model_config.get('concurrency')
+    )
+
+
 # ============================================================
 # 1. DashScope 原生模式调用（阿里云百炼，支持联网搜索）
 # ============================================================
@@ -54,26 +105,23 @@ def call_dashscope_api(model_config, question):
             f"  -> Error: API Key for {model_config['name']} not found in environment variables ({model_config['api_key_env']}). Skipping.")
         return None
 
-    dashscope.api_key = api_key
-
     model_name = model_config['model']
     enable_search = model_config.get('enable_search', True)
 
-    messages = [
-        {"role": "system", "content": "你是一个专业的市场分析师，请根据用户的问题提供详细、客观的分析和回答。"},
-        {"role": "user", "content": question['prompt']}
-    ]
+    messages = build_messages(question)
 
     try:
         search_status = "开启" if enable_search else "关闭"
         print(f"  -> Calling {model_config['name']} ({model_name}) [联网搜索: {search_status}]...")
 
+        # api_key 随请求传入，而不是写到 dashscope.api_key 全局变量，避免并发时不同模型的 Key 互相覆盖
         call_params = {
+            "api_key": api_key,
             "model": model_name,
             "messages": messages,
             "result_format": "message",
-            "temperature": 0.7,
-            "max_tokens": 2048,
+            "temperature": DEFAULT_TEMPERATURE,
+            "max_tokens": DEFAULT_MAX_TOKENS,
         }
 
         if enable_search:
@@ -83,7 +131,17 @@ def call_dashscope_api(model_config, question):
                 "enable_source": True
             }
 
-        response = Generation.call(**call_params)
+        def request():
+            response = Generation.call(**call_params)
+            # DashScope 限流时不抛异常，而是返回 429 状态码，这里转成异常交给限流器处理
+            if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+                raise RateLimitExceeded(f"{response.code} - {response.message}")
+            return response
+
+        response = get_rate_limiter(model_config['name']).call(
+            request,
+            estimated_tokens=estimate_tokens(messages, DEFAULT_MAX_TOKENS)
+        )
 
         if response.status_code == HTTPStatus.OK:
             answer = response.output.choices[0].message.content
@@ -133,31 +191,29 @@ def call_doubao_api(model_config, question):
         print(f"  -> Error: API Key for {model_config['name']} not found. Skipping.")
         return None
 
-    client = OpenAI(
-        api_key=api_key,
-        base_url=model_config['base_url']
-    )
+    client = get_model_client(model_config, api_key)
 
     model_name = model_config['model']
     enable_search = model_config.get('enable_search', True)
+    limiter = get_rate_limiter(model_config['name'])
 
     try:
         search_status = "开启" if enable_search else "关闭"
         print(f"  -> Calling {model_config['name']} ({model_name}) [联网搜索: {search_status}]...")
 
-        messages = [
-            {"role": "system", "content": "你是一个专业的市场分析师，请根据用户的问题提供详细、客观的分析和回答。"},
-            {"role": "user", "content": question['prompt']}
-        ]
+        messages = build_messages(question)
 
         if enable_search:
             # 使用 responses.create() 端点进行联网搜索
             tools = [{"type": "web_search"}]
 
-            response = client.responses.create(
-                model=model_name,
-                input=messages,
-                tools=tools,
+            response = limiter.call(
+                lambda: client.responses.create(
+                    model=model_name,
+                    input=messages,
+                    tools=tools,
+                ),
+                estimated_tokens=estimate_tokens(messages, DEFAULT_MAX_TOKENS)
             )
 
             # 解析响应
@@ -186,11 +242,14 @@ def call_doubao_api(model_config, question):
                 print(f"     -> 获取到 {len(references)} 条搜索引用")
         else:
             # 不使用联网搜索，使用标准 chat.completions
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=2048,
+            response = limiter.call(
+                lambda: client.chat.completions.create(
+                    model=model_name,
+                    messages=messages,
+                    temperature=DEFAULT_TEMPERATURE,
+                    max_tokens=DEFAULT_MAX_TOKENS,
+                ),
+                estimated_tokens=estimate_tokens(messages, DEFAULT_MAX_TOKENS)
             )
             answer = response.choices[0].message.content
             references = []
@@ -224,22 +283,17 @@ def call_zhinao_api(model_config, question):
         print(f"  -> Error: API Key for {model_config['name']} not found. Skipping.")
         return None
 
-    client = OpenAI(
-        api_key=api_key,
-        base_url=model_config['base_url']
-    )
+    client = get_model_client(model_config, api_key)
 
     model_name = model_config['model']
     enable_search = model_config.get('enable_search', True)
+    limiter = get_rate_limiter(model_config['name'])
 
     try:
         search_status = "开启" if enable_search else "关闭"
         print(f"  -> Calling {model_config['name']} ({model_name}) [联网搜索: {search_status}]...")
 
-        messages = [
-            {"role": "system", "content": "你是一个专业的市场分析师，请根据用户的问题提供详细、客观的分析和回答。"},
-            {"role": "user", "content": question['prompt']}
-        ]
+        messages = build_messages(question)
 
         # 360智脑通过 extra_body 参数启用联网搜索
         extra_params = {}
@@ -248,12 +302,15 @@ def call_zhinao_api(model_config, question):
                 "enable_web_search": True
             }
 
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=2048,
-            **extra_params
+        response = limiter.call(
+            lambda: client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+                **extra_params
+            ),
+            estimated_tokens=estimate_tokens(messages, DEFAULT_MAX_TOKENS)
         )
 
         answer = response.choices[0].message.content
@@ -299,22 +356,17 @@ def call_hunyuan_api(model_config, question):
         print(f"  -> Error: API Key for {model_config['name']} not found. Skipping.")
         return None
 
-    client = OpenAI(
-        api_key=api_key,
-        base_url=model_config['base_url']
-    )
+    client = get_model_client(model_config, api_key)
 
     model_name = model_config['model']
     enable_search = model_config.get('enable_search', True)
+    limiter = get_rate_limiter(model_config['name'])
 
     try:
         search_status = "开启" if enable_search else "关闭"
         print(f"  -> Calling {model_config['name']} ({model_name}) [联网搜索: {search_status}]...")
 
-        messages = [
-            {"role": "system", "content": "你是一个专业的市场分析师，请根据用户的问题提供详细、客观的分析和回答。"},
-            {"role": "user", "content": question['prompt']}
-        ]
+        messages = build_messages(question)
 
         # 腾讯混元通过 extra_body 参数启用联网搜索
         extra_params = {}
@@ -323,12 +375,15 @@ def call_hunyuan_api(model_config, question):
                 "enable_enhancement": True
             }
 
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=2048,
-            **extra_params
+        response = limiter.call(
+            lambda: client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+                **extra_params
+            ),
+            estimated_tokens=estimate_tokens(messages, DEFAULT_MAX_TOKENS)
         )
 
         answer = response.choices[0].message.content
@@ -364,14 +419,6 @@ def call_hunyuan_api(model_config, question):
 # ============================================================
 # 5. 通用 OpenAI 兼容接口调用（无联网搜索）
 # ============================================================
-@retry(
-    retry=retry_if_exception_type(RateLimitError),
-    stop=stop_after_attempt(5),
-    wait=wait_exponential(multiplier=1, min=2, max=60),
-    before_sleep=lambda retry_state: print(
-        f"  -> Rate limit hit. Retrying in {retry_state.next_action.sleep} seconds..."),
-    reraise=True
-)
 def call_openai_compatible_api(model_config, question):
     """
     通用 OpenAI 兼容接口调用（不支持联网搜索的模型）
@@ -382,26 +429,24 @@ def call_openai_compatible_api(model_config, question):
         print(f"  -> Error: API Key for {model_config['name']} not found. Skipping.")
         return None
 
-    client = OpenAI(
-        api_key=api_key,
-        base_url=model_config['base_url']
-    )
+    client = get_model_client(model_config, api_key)
 
     model_name = model_config['model']
 
-    messages = [
-        {"role": "system", "content": "你是一个专业的市场分析师，请根据用户的问题提供详细、客观的分析和回答。"},
-        {"role": "user", "content": question['prompt']}
-    ]
+    messages = build_messages(question)
 
     try:
         print(f"  -> Calling {model_config['name']} ({model_name})...")
 
-        response = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=2048,
+        # 429 由共享限流器统一退避重试（替代原来的 tenacity 装饰器）
+        response = get_rate_limiter(model_config['name']).call(
+            lambda: client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+            ),
+            estimated_tokens=estimate_tokens(messages, DEFAULT_MAX_TOKENS)
         )
 
         answer = response.choices[0].message.content
@@ -417,19 +462,6 @@ def call_openai_compatible_api(model_config, question):
         }
         return result
 
-    except RateLimitError as e:
-        raise
-
-    except APIError as e:
-        if hasattr(e, 'status_code') and e.status_code == 429:
-            raise RateLimitError(
-                message=f"Rate limit hit for {model_config['name']}",
-                response=e.response,
-                body=e.response.text if hasattr(e, 'response') else None
-            )
-        print(f"  -> API Error for {model_config['name']}: {e}")
-        return None
-
     except Exception as e:
         print(f"  -> Error for {model_config['name']}: {e}")
         return None
@@ -440,7 +472,9 @@ def call_openai_compatible_api(model_config, question):
 # ============================================================
 def call_spark_api(model_config, question):
     """
-    调用科大讯飞星火 API (使用封装后的同步客户端)
+    调用科大讯飞星火 API
+    默认使用共享的异步客户端（同一模型的多个问题同时在途，连接数不超过 concurrency）；
+    未安装 websockets 时退回逐次建连的同步客户端
     """
     try:
         api_key = os.getenv(model_config['api_key_env'])
@@ -452,19 +486,40 @@ def call_spark_api(model_config, question):
             print(f"  -> Error: Key/Secret/AppID/URL for {model_config['name']} not found.")
             return None
 
-        client = SparkSyncClient()
         domain = model_config['model']
+        client = get_spark_client(app_id, api_key, api_secret, spark_url, domain,
+                                  max_connections=model_config.get('concurrency', DEFAULT_CONCURRENCY),
+                                  timeout=get_request_timeout())
 
         print(f"  -> Calling {model_config['name']} ({domain})...")
 
-        answer = client.chat(
-            appid=app_id,
-            api_key=api_key,
-            api_secret=api_secret,
-            Spark_url=spark_url,
-            domain=domain,
-            question=question['prompt']
-        )
+        limiter = get_rate_limiter(model_config['name'])
+        # 星火的请求只带用户问题（不含系统提示），按实际发送的消息预估
+        messages = [{"role": "user", "content": question['prompt']}]
+        estimated = estimate_tokens(messages, DEFAULT_MAX_TOKENS)
+
+        if client is not None:
+            def request():
+                reply = client.chat(question['prompt'])
+                if reply['first_token_at'] is not None:
+                    mark_first_token(at=reply['first_token_at'])
+                return reply
+
+            # reply 中带有 usage，限流器据此记录遥测并归还多预扣的 token
+            answer = limiter.call(request, estimated_tokens=estimated)['answer']
+        else:
+            answer = limiter.call(
+                lambda: SparkSyncClient().chat(
+                    appid=app_id,
+                    api_key=api_key,
+                    api_secret=api_secret,
+                    Spark_url=spark_url,
+                    domain=domain,
+                    question=question['prompt']
+                ),
+                estimated_tokens=estimated,
+                usage_getter=None
+            )
 
         result = {
             "category": question['category'],
@@ -496,37 +551,45 @@ def call_zhipu_api(model_config, question):
         print(f"  -> Error: API Key for {model_config['name']} not found. Skipping.")
         return None
 
-    # 使用阿里云百炼的 OpenAI 兼容接口
-    client = OpenAI(
-        api_key=api_key,
-        base_url="https://dashscope.aliyuncs.com/compatible-mode/v1"
-    )
+    # 使用阿里云百炼的 OpenAI 兼容接口（配置了 base_url 时以配置为准，例如压测时指向本地模拟服务）
+    client = get_model_client(model_config, api_key,
+                              base_url=model_config.get('base_url') or "https://dashscope.aliyuncs.com/compatible-mode/v1")
 
     model_name = model_config['model']
 
-    messages = [
-        {"role": "system", "content": "你是一个专业的市场分析师，请根据用户的问题提供详细、客观的分析和回答。"},
-        {"role": "user", "content": question['prompt']}
-    ]
+    messages = build_messages(question)
 
     try:
         print(f"  -> Calling {model_config['name']} ({model_name}) [模式: 流式]...")
 
-        # 智谱模型强制使用流式调用
-        response_stream = client.chat.completions.create(
-            model=model_name,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=2048,
-            stream=True
-        )
+        def request():
+            # 智谱模型强制使用流式调用
+            response_stream = client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=DEFAULT_MAX_TOKENS,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
 
-        # 聚合流式结果
-        answer_parts = []
-        for chunk in response_stream:
-            if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
-                answer_parts.append(chunk.choices[0].delta.content)
-        answer = "".join(answer_parts)
+            # 聚合流式结果（整个流读取完毕才算一次调用结束，期间占用一个并发名额）
+            answer_parts = []
+            for chunk in response_stream:
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    if not answer_parts:
+                        mark_first_token()
+                    answer_parts.append(chunk.choices[0].delta.content)
+                if getattr(chunk, 'usage', None):
+                    # include_usage 时最后一个增量块携带整次调用的 usage
+                    record_usage(chunk)
+            return "".join(answer_parts)
+
+        answer = get_rate_limiter(model_config['name']).call(
+            request,
+            estimated_tokens=estimate_tokens(messages, DEFAULT_MAX_TOKENS),
+            usage_getter=None
+        )
 
         result = {
             "category": question['category'],
@@ -547,35 +610,338 @@ def call_zhipu_api(model_config, question):
 # ============================================================
 # 8. 模型调用分派器
 # ============================================================
-def call_model(model_key, model_config, question):
+def resolve_api_type(model_config):
+    """确定模型实际使用的调用方式（智谱模型无论 api_type 如何配置都走专用的流式调用）"""
+    api_type = model_config.get('api_type', 'openai')
+    if api_type == 'zhipu' or '智谱' in model_config.get('name', '') or 'glm' in model_config.get('model', '').lower():
+        return 'zhipu'
+    return api_type
+
+
+def build_request_signature(model_config, question):
+    """
+    描述一次 API 请求的全部生成参数，作为回答缓存的键
+    相同的提示词在不同品类的问题文件中重复出现时，会命中同一条缓存
+    """
+    api_type = resolve_api_type(model_config)
+    if api_type == 'spark':
+        # 星火只发送用户消息，生成参数在 SparkApi.gen_params 中固定
+        messages = [{"role": "user", "content": question['prompt']}]
+        temperature = 0.8
+    else:
+        messages = build_messages(question)
+        temperature = DEFAULT_TEMPERATURE
+
+    return {
+        "provider": api_type,
+        "base_url": model_config.get('base_url', ''),
+        "model": model_config['model'],
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": DEFAULT_MAX_TOKENS,
+        "enable_search": api_type in SEARCH_API_TYPES and model_config.get('enable_search', True),
+    }
+
+
+def dispatch_model_call(model_config, question):
     """
     根据模型配置分派到不同的 API 调用函数
     """
+    api_type = resolve_api_type(model_config)
+
+    # 智谱模型使用专用调用函数（需要流式调用）
+    if api_type == 'zhipu':
+        return call_zhipu_api(model_config, question)
+    elif api_type == 'dashscope':
+        return call_dashscope_api(model_config, question)
+    elif api_type == 'doubao':
+        return call_doubao_api(model_config, question)
+    elif api_type == 'zhinao':
+        return call_zhinao_api(model_config, question)
+    elif api_type == 'hunyuan':
+        return call_hunyuan_api(model_config, question)
+    elif api_type == 'spark':
+        return call_spark_api(model_config, question)
+    else:
+        # 默认使用通用 OpenAI 兼容接口
+        return call_openai_compatible_api(model_config, question)
+
+
+def call_model(model_key, model_config, question):
+    """
+    调用模型回答一个问题（回答缓存前置：命中缓存时不调用 API；replay 模式下未命中直接跳过）
+    该模型熔断期间不调用 API，返回 None，问题留待下次运行补采
+    每次调用记录一条遥测（耗时、首 token 时间、token 用量、重试次数、估算费用）
+    """
     try:
-        api_type = model_config.get('api_type', 'openai')
-
-        # 智谱模型使用专用调用函数（需要流式调用）
-        if api_type == 'zhipu' or '智谱' in model_config.get('name', '') or 'glm' in model_config.get('model',
-                                                                                                      '').lower():
-            return call_zhipu_api(model_config, question)
-        elif api_type == 'dashscope':
-            return call_dashscope_api(model_config, question)
-        elif api_type == 'doubao':
-            return call_doubao_api(model_config, question)
-        elif api_type == 'zhinao':
-            return call_zhinao_api(model_config, question)
-        elif api_type == 'hunyuan':
-            return call_hunyuan_api(model_config, question)
-        elif api_type == 'spark':
-            return call_spark_api(model_config, question)
-        else:
-            # 默认使用通用 OpenAI 兼容接口
-            return call_openai_compatible_api(model_config, question)
+        with track_call(model_config['name'], model_config['model'], question['id']) as record:
+            called = []
+
+            def call():
+                called.append(True)
+                result = dispatch_model_call(model_config, question)
+                return result['response'] if result else None
+
+            try:
+                # 缓存未命中时才经过熔断器：该模型熔断期间直接跳过，不再等待超时
+                response = cached_call(
+                    build_request_signature(model_config, question),
+                    lambda: guarded_call(model_config['name'], call, is_success=lambda r: bool(r and r.get('answer'))),
+                    should_cache=lambda r: bool(r.get('answer'))
+                )
+            except CircuitOpenError:
+                record['status'] = 'circuit_open'
+                return None
+            record['cached'] = response is not None and not called
+            if response is None:
+                record['status'] = 'skipped' if is_replay_mode() else 'error'
+                return None
+            if not response.get('answer'):
+                record['status'] = 'empty'
+
+        return {
+            "category": question['category'],
+            "question_id": question['id'],
+            "model": model_config['name'],
+            "response": response
+        }
     except Exception as e:
         print(f"  -> FATAL ERROR for {model_config['name']} on QID {question['id']}: {e}")
         return None
 
 
+# ============================================================
+# 9. 并发采集引擎
+# ============================================================
+def resolve_concurrency(model_config, collection_config):
+    """读取单个模型的并发上限：模型级 concurrency 优先，其次为全局 default_concurrency"""
+    concurrency = model_config.get('concurrency',
+                                   collection_config.get('default_concurrency', DEFAULT_CONCURRENCY))
+    return max(1, int(concurrency))
+
+
+def configure_rate_limiters(models, collection_config):
+    """
+    为每个模型创建共享限流器：collection.rate_limit 为全局默认值，模型级 rate_limit 覆盖
+    AIMD 并发上限与该模型的 concurrency 保持一致
+    """
+    default_limits = collection_config.get('rate_limit') or {}
+    for model_config in models.values():
+        options = {**default_limits, **(model_config.get('rate_limit') or {})}
+        configure_rate_limiter(
+            model_config['name'],
+            max_concurrency=resolve_concurrency(model_config, collection_config),
+            **options
+        )
+
+
+def configure_circuit_breakers(models, collection_config):
+    """为每个模型创建熔断器：collection.circuit_breaker 为全局默认值，模型级 circuit_breaker 覆盖"""
+    default_options = collection_config.get('circuit_breaker') or {}
+    for model_config in models.values():
+        options = {**default_options, **(model_config.get('circuit_breaker') or {})}
+        configure_circuit_breaker(model_config['name'], **options)
+
+
+def configure_collection_cache(cache_config, args, current_date=None):
+    """
+    初始化回答缓存
+    - --no-cache 或 cache.enabled: false 时关闭（--replay 除外）
+    - 正常采集只命中 current_date 当天写入的缓存，回答不会跨天复用（--replay 除外）
+    - --refresh 有意重新采样时只写不读
+    """
+    cache_path = cache_config.get('path', 'cache/llm_responses.sqlite')
+    if not os.path.isabs(cache_path):
+        cache_path = os.path.join(BASE_DIR, cache_path)
+
+    cache = configure_response_cache(
+        cache_path,
+        enabled=cache_config.get('enabled', True) and not args.no_cache,
+        ttl_hours=cache_config.get('ttl_hours'),
+        max_entries=cache_config.get('max_entries'),
+        replay=args.replay,
+        read=not args.refresh,
+        collection_date=current_date
+    )
+    if cache is not None:
+        mode = "replay (cache only, no API calls)" if args.replay else f"ttl={cache_config.get('ttl_hours')}h"
+        print(f"-> Response cache enabled: {cache_path} [{mode}]")
+
+
+def collect_model_results(model_key, model_config, questions, concurrency, on_result=None):
+    """
+    对单个模型采集所有问题，同时在途的请求数不超过 concurrency
+    on_result: 每拿到一条结果立即回调（在工作线程中调用），用于写断点日志
+    返回值按问题顺序排列，调用失败的问题不包含在内
+    """
+    print(f"\n{'=' * 60}")
+    print(f"Starting data collection for Model: {model_config['name']}")
+    print(f"  -> Concurrency: {concurrency}")
+    print(f"{'=' * 60}")
+
+    def ask(question):
+        print(f"  -> Question ID: {question['id']} ({question['category']})")
+        result = call_model(model_key, model_config, question)
+        if result and on_result:
+            on_result(result)
+        return result
+
+    if concurrency <= 1:
+        results = [ask(question) for question in questions]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"collect-{model_key}") as executor:
+            # executor.map 按提交顺序返回结果，保证输出顺序与问题顺序一致
+            results = list(executor.map(ask, questions))
+
+    return [result for result in results if result]
+
+
+def save_model_results(model_results, model_output_path):
+    """保存 results_{model_key}.json（先写临时文件再原子替换）"""
+    JsonlCheckpoint.compact(model_results, model_output_path, indent=4)
+
+
+def run_model_collection(model_key, model_config, questions, results_dir, concurrency, current_date,
+                         refresh=False):
+    """
+    采集单个模型并追加保存到 results_{model_key}.json
+    - 默认（断点续传）：以 (question_id, model, collection_date) 为键，只调用当天还没有结果的问题
+    - refresh=True：忽略已有结果，重新采集全部问题并追加（用于有意重新采样）
+    每条新结果先追加到 checkpoints/results_{model_key}.jsonl，进程中断也不会丢失已付费的回答；
+    返回当天该模型在本次问题集上的全部结果（refresh 模式下只返回本次新采集的结果）
+    """
+    model_output_path = os.path.join(results_dir, f"results_{model_key}.json")
+    model_results = []
+
+    if os.path.exists(model_output_path):
+        try:
+            with open(model_output_path, 'r', encoding='utf-8') as f:
+                model_results = json.load(f)
+            print(f"  -> Found {len(model_results)} existing results for {model_config['name']}.")
+        except json.JSONDecodeError:
+            print(f"  -> Warning: Could not read existing results file {model_output_path}. Starting fresh.")
+            model_results = []
+
+    # 上次运行中断时，断点日志里的结果还没有写入 results_{model_key}.json，先合并回来
+    checkpoint = JsonlCheckpoint(os.path.join(results_dir, "checkpoints", f"results_{model_key}.jsonl"))
+    if checkpoint.exists():
+        recovered_results = checkpoint.replay()
+        if recovered_results:
+            model_results.extend(recovered_results)
+            save_model_results(model_results, model_output_path)
+            print(f"  -> Recovered {len(recovered_results)} results for {model_config['name']} "
+                  f"from interrupted run checkpoint {checkpoint.path}")
+        os.remove(checkpoint.path)
+
+    # 上次运行因熔断 / 调用失败没有拿到结果的问题，本次会被重新调用（断点续传逻辑自动补采）
+    pending_path = os.path.join(results_dir, "checkpoints", f"pending_{model_key}.json")
+    if os.path.exists(pending_path):
+        with open(pending_path, 'r', encoding='utf-8') as f:
+            previous_pending = json.load(f)
+        print(f"  -> {len(previous_pending.get('question_ids', []))} questions left pending for "
+              f"{model_config['name']} by the last run ({previous_pending.get('collection_date')}) will be retried.")
+
+    model_name = model_config['name']
+    if refresh:
+        pending_questions = questions
+        print(f"  -> Refresh mode: re-running all {len(questions)} questions for {model_name} and appending.")
+    else:
+        collected_keys = {
+            (item.get('question_id'), item.get('model'), item.get('collection_date'))
+            for item in model_results
+        }
+        pending_questions = [
+            question for question in questions
+            if (question['id'], model_name, current_date) not in collected_keys
+        ]
+        skipped = len(questions) - len(pending_questions)
+        if skipped:
+            print(f"  -> {skipped} questions already collected for {model_name} on {current_date}. "
+                  f"Only {len(pending_questions)} missing questions will be called.")
+
+    def on_result(result):
+        result['collection_date'] = current_date
+        checkpoint.append(result)
+
+    try:
+        newly_collected_results = collect_model_results(model_key, model_config, pending_questions, concurrency,
+                                                        on_result=on_result)
+    finally:
+        checkpoint.close()
+
+    if newly_collected_results:
+        model_results.extend(newly_collected_results)
+        save_model_results(model_results, model_output_path)
+        print(
+            f"--- Saved {len(newly_collected_results)} new results for {model_config['name']} to {model_output_path} ---")
+    else:
+        print(f"--- No new results collected for {model_config['name']}. ---")
+
+    # 结果已完整写入 results_{model_key}.json，断点日志可以删除
+    if checkpoint.exists():
+        os.remove(checkpoint.path)
+
+    # 记录本次仍未拿到结果的问题（熔断跳过 + 调用失败），下次运行时断点续传会补采
+    answered_ids = {result['question_id'] for result in newly_collected_results}
+    unanswered_ids = [question['id'] for question in pending_questions if question['id'] not in answered_ids]
+    breaker = get_circuit_breaker(model_name)
+    if unanswered_ids:
+        os.makedirs(os.path.dirname(pending_path), exist_ok=True)
+        JsonlCheckpoint.compact({
+            "model": model_name,
+            "collection_date": current_date,
+            "circuit_state": breaker.state,
+            "skipped_by_circuit_breaker": breaker.skipped,
+            "question_ids": unanswered_ids,
+        }, pending_path)
+        print(f"--- {len(unanswered_ids)} questions pending for {model_name} "
+              f"({breaker.skipped} skipped by circuit breaker). Re-run the same command to resume: {pending_path} ---")
+    elif os.path.exists(pending_path):
+        os.remove(pending_path)
+
+    if refresh:
+        return newly_collected_results
+
+    # 当天该模型在本次问题集上的全部结果（同一问题有多条时取最新一条），按问题顺序排列
+    todays_results = {}
+    for item in model_results:
+        if item.get('model') == model_name and item.get('collection_date') == current_date:
+            todays_results[item.get('question_id')] = item
+    return [todays_results[question['id']] for question in questions if question['id'] in todays_results]
+
+
+def collect_all_models(models, questions, results_dir, collection_config, current_date, concurrent=True,
+                       refresh=False):
+    """
+    采集所有模型
+    - 并发模式：所有模型同时采集，每个模型内部按各自的 concurrency 并发提问
+    - 串行模式：与旧版一致，逐个模型、逐个问题采集
+    返回 {model_key: 当天结果}，顺序与配置文件中的模型顺序一致
+    """
+    if not concurrent:
+        return {
+            model_key: run_model_collection(model_key, model_config, questions, results_dir, 1, current_date,
+                                            refresh=refresh)
+            for model_key, model_config in models.items()
+        }
+
+    with ThreadPoolExecutor(max_workers=max(1, len(models)), thread_name_prefix="collect-model") as executor:
+        futures = {
+            model_key: executor.submit(
+                run_model_collection,
+                model_key,
+                model_config,
+                questions,
+                results_dir,
+                resolve_concurrency(model_config, collection_config),
+                current_date,
+                refresh=refresh
+            )
+            for model_key, model_config in models.items()
+        }
+        return {model_key: future.result() for model_key, future in futures.items()}
+
+
 # ============================================================
 # 主函数
 # ============================================================
@@ -583,6 +949,13 @@ def main():
     parser = argparse.ArgumentParser(description="Run domestic brand analysis data collection.")
     parser.add_argument('--config', type=str, default='config_domestic.yaml', help='Path to the configuration file.')
     parser.add_argument('--task', type=str, help='Specify the task/category to run (e.g., snack, phone).')
+    parser.add_argument('--serial', action='store_true',
+                        help='Disable concurrent collection and query models/questions one at a time.')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Re-ask every question even if it was already collected today (intentional re-sampling).')
+    parser.add_argument('--replay', action='store_true',
+                        help='Serve answers only from the local response cache and never call any API.')
+    parser.add_argument('--no-cache', action='store_true', help='Disable the local response cache.')
     args = parser.parse_args()
 
     config_path = os.path.join(BASE_DIR, args.config)
@@ -595,6 +968,7 @@ def main():
     load_dotenv(os.path.join(os.path.dirname(BASE_DIR), '.env'))
 
     config = load_config(config_path)
+    collection_config = config.get('collection') or {}
 
     # 获取当前日期
     current_date = time.strftime("%Y%m%d")
@@ -622,47 +996,43 @@ def main():
         return
     questions = load_questions(questions_path)
 
-    all_results = []
+    concurrent = collection_config.get('concurrent', True) and not args.serial
+    print(f"-> Collection mode: {'concurrent' if concurrent else 'serial'}")
+
+    configure_rate_limiters(config['models'], collection_config)
+    configure_circuit_breakers(config['models'], collection_config)
+    configure_http_defaults(**(collection_config.get('http_client') or {}))
+    configure_collection_cache(collection_config.get('cache') or {}, args, current_date)
+    telemetry = configure_telemetry(
+        os.path.join(results_dir, f"metrics_{args.task or 'all'}_{current_date}.jsonl"),
+        pricing={m['name']: m['pricing'] for m in config['models'].values() if m.get('pricing')}
+    )
 
-    for model_key, model_config in config['models'].items():
-        print(f"\n{'=' * 60}")
-        print(f"Starting data collection for Model: {model_config['name']}")
-        print(f"{'=' * 60}")
+    try:
+        collected_by_model = collect_all_models(
+            config['models'],
+            questions,
+            results_dir,
+            collection_config,
+            current_date,
+            concurrent=concurrent,
+            refresh=args.refresh
+        )
+    finally:
+        close_all_clients()
+        close_spark_clients()
+        telemetry.close()
 
-        model_output_path = os.path.join(results_dir, f"results_{model_key}.json")
-        model_results = []
+    telemetry.print_summary()
 
-        if os.path.exists(model_output_path):
-            try:
-                with open(model_output_path, 'r', encoding='utf-8') as f:
-                    model_results = json.load(f)
-                print(f"  -> Found {len(model_results)} existing results. Will re-run all questions and append.")
-            except json.JSONDecodeError:
-                print(f"  -> Warning: Could not read existing results file {model_output_path}. Starting fresh.")
-                model_results = []
-
-        newly_collected_results = []
-
-        for question in questions:
-            q_id = question['id']
-            print(f"  -> Question ID: {q_id} ({question['category']})")
-
-            result = call_model(model_key, model_config, question)
-
-            if result:
-                model_results.append(result)
-                newly_collected_results.append(result)
-
-        if newly_collected_results:
-            with open(model_output_path, 'w', encoding='utf-8') as f:
-                json.dump(model_results, f, ensure_ascii=False, indent=4)
-            print(
-                f"--- Saved {len(newly_collected_results)} new results for {model_config['name']} to {model_output_path} ---")
-        else:
-            print(f"--- No new results collected for {model_config['name']}. ---")
+    cache = get_response_cache()
+    if cache is not None:
+        print(f"-> Response cache: {cache.hits} hits, {cache.misses} misses, {len(cache)} entries ({cache.path})")
 
-        # 只将本次采集的结果加入 all_results（不包含历史数据）
-        all_results.extend(newly_collected_results)
+    # 只将当天的结果加入 all_results（不包含往日历史数据；--refresh 时只包含本次新采集的结果）
+    all_results = []
+    for model_results in collected_by_model.values():
+        all_results.extend(model_results)
 
     # 按品类分开保存合并结果
     results_by_category = defaultdict(list)
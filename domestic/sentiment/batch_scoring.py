@@ -0,0 +1,50 @@
+# domestic/sentiment/batch_scoring.py
+"""
+全局去重的批量情感打分
+旧逻辑在 calculate_scores 中对每个品牌单独调用 analyzer.predict(品牌句子[:50])：
+同时提到五个品牌的句子要过五次 BERT，每个品牌又是一个很小的 padding 批次。
+这里先收集所有品牌要分析的句子，去重后只调用一次 predict（批处理由 analyzer 负责），
+再把每个句子的得分按品牌汇总回去，每个品牌的平均分与逐品牌调用时相同。
+
+国内 (analyze_results_domestic.py) 与海外 (analyze_results_oversea.py) 分析引擎共用本模块。
+本模块不依赖 torch，可在未安装模型依赖时导入。
+"""
+
+# 每个品牌最多分析的句子数（与原有逻辑一致）
+MAX_SENTENCES_PER_BRAND = 50
+
+
+def score_brand_sentences(analyzer, brand_sentences: dict, max_per_brand: int = MAX_SENTENCES_PER_BRAND,
+                          verbose: bool = True) -> dict:
+    """
+    brand_sentences: {品牌: [句子, ...]}
+    返回 {品牌: 平均情感得分}；没有句子的品牌不出现在结果中
+    """
+    selected = {brand: sentences[:max_per_brand] for brand, sentences in brand_sentences.items() if sentences}
+    if not selected:
+        return {}
+
+    # 去重并保持首次出现的顺序
+    unique_sentences = list(dict.fromkeys(s for sentences in selected.values() for s in sentences))
+    # 本地 analyzer 的模型与缓存在第一次 predict() 时才加载，先加载以便统计本次的缓存命中
+    load = getattr(analyzer, "load", None)
+    if load is not None:
+        load()
+    cache = getattr(analyzer, "score_cache", None)
+    hits_before, misses_before = (cache.hits, cache.misses) if cache is not None else (0, 0)
+    results = analyzer.predict(unique_sentences)
+    score_of = {sentence: result["score"] for sentence, result in zip(unique_sentences, results)}
+
+    brand_scores = {}
+    for brand, sentences in selected.items():
+        scores = [score_of[s] for s in sentences if s in score_of]
+        brand_scores[brand] = sum(scores) / len(scores) if scores else 50.0
+
+    if verbose:
+        total = sum(len(sentences) for sentences in selected.values())
+        saved = total - len(unique_sentences)
+        print(f"🧮 情感分析: {len(selected)} 个品牌共 {total} 个句子，去重后 {len(unique_sentences)} 个，"
+              f"一次批量推理（省去 {saved} 次句子推理、{len(selected) - 1} 次单独调用）")
+        if cache is not None:
+            print(f"   缓存命中 {cache.hits - hits_before} 个，模型实际推理 {cache.misses - misses_before} 个")
+    return brand_scores
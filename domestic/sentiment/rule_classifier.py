@@ -0,0 +1,68 @@
+# domestic/sentiment/rule_classifier.py
+"""
+规则匹配的强推荐判定（BERT 情感分析不可用时的备用方式，也用于统计"强推荐次数"）
+旧逻辑对每个 句子 × 品牌 都把 strong_patterns 逐条 re.search 一遍、把 negation_keywords 逐个做子串查找，
+且每次调用都从字符串重新编译正则。这里每种语言只构建一次分类器：
+- 所有强推荐正则合并为一个预编译的多选正则（任意一条命中即命中，与逐条 re.search 等价）
+- 否定关键词构建成一个 Aho-Corasick 自动机（复用 matching/brand_matcher.py），一遍扫描
+调用方每个句子只判定一次，结果供句子中的所有品牌共用。
+
+国内 (analyze_results_domestic.py) 使用 get_rule_classifier("zh")，
+海外 (analyze_results_oversea.py) 使用 get_rule_classifier("zh", "en")。
+本模块不依赖 torch / transformers。
+"""
+import re
+
+from matching.brand_matcher import BrandMatcher
+
+STRONG_PATTERNS = {
+    "zh": [
+        r"(强烈)?推荐", r"首选", r"最佳", r"值得.*?(尝试|购买|选择)",
+        r"性价比.*?(高|很高)", r"(是|属)?(top|best)[^。]*?(品牌|选择|之一)",
+        r"(我|我们)?(最|很)?常买", r"(个人|我)?觉得.*?(最好|最推荐)",
+    ],
+    "en": [
+        r"highly\s+recommend", r"best\s+choice", r"top\s+pick", r"must\s+have",
+        r"excellent", r"outstanding", r"superior", r"first\s+choice",
+        r"strongly\s+recommend", r"worth\s+(buying|trying|considering)",
+    ],
+}
+
+NEGATION_KEYWORDS = {
+    "zh": ["不推荐", "不太", "不喜欢", "不值得", "踩雷", "避坑", "最差", "不合适", "不如"],
+    "en": ["not recommend", "don't recommend", "wouldn't recommend", "avoid",
+           "worst", "disappointing", "poor quality"],
+}
+
+
+class RuleClassifier:
+    def __init__(self, strong_patterns: list, negation_keywords: list):
+        self.strong_patterns = list(strong_patterns)
+        self.negation_keywords = list(negation_keywords)
+        self._strong_regex = re.compile("|".join(f"(?:{p})" for p in self.strong_patterns))
+        self._negations = BrandMatcher({keyword: [keyword] for keyword in self.negation_keywords})
+
+    def is_strong(self, sentence: str) -> bool:
+        """句子是否为强推荐：命中任一强推荐正则，且不含任何否定关键词"""
+        sentence_lower = sentence.lower()
+        return (self._strong_regex.search(sentence_lower) is not None
+                and not self._negations.contains_any(sentence_lower))
+
+
+_CLASSIFIERS = {}
+
+
+def get_rule_classifier(*locales: str) -> RuleClassifier:
+    """按语言获取（并缓存）分类器，多个语言时合并各自的规则，例如 get_rule_classifier("zh", "en")"""
+    locales = locales or ("zh",)
+    classifier = _CLASSIFIERS.get(locales)
+    if classifier is None:
+        unknown = [locale for locale in locales if locale not in STRONG_PATTERNS]
+        if unknown:
+            raise ValueError(f"Unknown locale(s) {unknown}, expected one of: {', '.join(STRONG_PATTERNS)}")
+        classifier = RuleClassifier(
+            [p for locale in locales for p in STRONG_PATTERNS[locale]],
+            [k for locale in locales for k in NEGATION_KEYWORDS[locale]],
+        )
+        _CLASSIFIERS[locales] = classifier
+    return classifier
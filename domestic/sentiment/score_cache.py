@@ -0,0 +1,146 @@
+# domestic/sentiment/score_cache.py
+"""
+情感分析结果的本地缓存（SQLite 存储）
+同一批周度结果会被反复打分（调整权重、重跑报告、分析脚本之后再跑 scoring_pipeline），
+每次都对相同的句子重新跑 BERT。这里把每个句子的预测结果持久化：
+- 键：SHA-256(模型指纹, 规范化后的句子)；模型指纹由 base model、LoRA adapter 文件内容、MAX_LENGTH 与推理后端计算，
+  更换 adapter、修改 MAX_LENGTH 或切换后端后旧结果自动失效
+- 值：{"label", "confidence", "score", "probs"}
+- max_entries：超过上限时按最近访问时间淘汰最旧的条目
+- 环境变量：GEO_SENTIMENT_CACHE=路径（设为 0/off/false 关闭缓存），GEO_SENTIMENT_CACHE_MAX_ENTRIES=条目上限
+
+由 sentiment_analyzer.SentimentAnalyzer.predict() 使用；本模块不依赖 torch。
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / "cache" / "sentiment_scores.sqlite"
+DEFAULT_MAX_ENTRIES = 500000
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sentence(sentence: str) -> str:
+    """去掉首尾空白并把连续空白合并为一个空格（不影响分词结果的差异不应导致缓存未命中）"""
+    return _WHITESPACE.sub(" ", sentence).strip()
+
+
+def model_fingerprint(base_model_name: str, adapter_path, max_length: int, backend: str = "torch") -> str:
+    """由 base model 名称、adapter 目录下的配置与权重文件内容、MAX_LENGTH 与推理后端计算模型指纹"""
+    digest = hashlib.sha256(f"{base_model_name}:{max_length}:{backend}".encode("utf-8"))
+    adapter_path = Path(adapter_path)
+    for name in ("adapter_config.json", "adapter_model.safetensors", "adapter_model.bin"):
+        file_path = adapter_path / name
+        if not file_path.is_file():
+            continue
+        digest.update(name.encode("utf-8"))
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SentimentScoreCache:
+    def __init__(self, path, model_key: str, max_entries: Optional[int] = DEFAULT_MAX_ENTRIES):
+        self.path = str(path)
+        self.model_key = model_key
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sentiment_scores ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_sentiment_scores_last_access ON sentiment_scores(last_access)"
+        )
+        self._conn.commit()
+
+    def make_key(self, sentence: str) -> str:
+        return hashlib.sha256(f"{self.model_key}\n{normalize_sentence(sentence)}".encode("utf-8")).hexdigest()
+
+    def get_many(self, sentences: List[str]) -> Dict[str, dict]:
+        """返回 {句子: 缓存的预测结果}，只包含命中的句子"""
+        sentences = list(dict.fromkeys(sentences))
+        keys = {}
+        for sentence in sentences:
+            keys.setdefault(self.make_key(sentence), []).append(sentence)
+
+        found = {}
+        now = time.time()
+        key_list = list(keys)
+        with self._lock:
+            # SQLite 单条语句的参数个数有上限，分段查询
+            for i in range(0, len(key_list), 500):
+                chunk = key_list[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM sentiment_scores WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, value in rows:
+                    result = json.loads(value)
+                    for sentence in keys[key]:
+                        found[sentence] = result
+                if rows:
+                    self._conn.executemany("UPDATE sentiment_scores SET last_access = ? WHERE key = ?",
+                                           [(now, key) for key, _ in rows])
+            self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(sentences) - len(found)
+        return found
+
+    def put_many(self, results: Dict[str, dict]):
+        if not results:
+            return
+        now = time.time()
+        rows = [(self.make_key(sentence), json.dumps(result, ensure_ascii=False), now)
+                for sentence, result in results.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO sentiment_scores (key, value, last_access) VALUES (?, ?, ?)", rows
+            )
+            if self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM sentiment_scores WHERE key IN ("
+                    "SELECT key FROM sentiment_scores ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0, "entries": len(self)}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sentiment_scores").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_score_cache(model_key: str) -> Optional[SentimentScoreCache]:
+    """按环境变量打开缓存；关闭或无法打开时返回 None（不影响推理）"""
+    path = os.environ.get("GEO_SENTIMENT_CACHE", str(DEFAULT_CACHE_PATH))
+    if path.strip().lower() in ("", "0", "off", "false", "no"):
+        return None
+    max_entries = int(os.environ.get("GEO_SENTIMENT_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)) or None
+    try:
+        return SentimentScoreCache(path, model_key, max_entries)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  情感分析缓存不可用，将直接推理: {e}")
+        return None
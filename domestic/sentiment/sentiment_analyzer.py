@@ -2,10 +2,14 @@
 """
 BERT情感分析模块
 用于对品牌相关句子进行五级情感分析
+
+torch / transformers / peft 在第一次 predict()（或 load()）时才导入并加载模型，
+只导入本模块（--help、纯规则匹配、使用常驻服务时）不付出这部分开销。
 """
 import os
 import sys
-import torch
+import contextlib
+import threading
 import numpy as np
 from typing import List, Dict
 from pathlib import Path
@@ -18,16 +22,16 @@ warnings.filterwarnings('ignore')
 BASE_DIR = Path(__file__).resolve().parent.parent
 sys.path.insert(0, str(BASE_DIR))
 
+from sentiment.score_cache import model_fingerprint, open_score_cache
+from sentiment.sentiment_client import connect_sentiment_server
+
 # 设置环境变量，避免某些库的兼容性问题
 os.environ['TRANSFORMERS_NO_ADVISORY_WARNINGS'] = '1'
 
-try:
-    from transformers import AutoTokenizer, AutoModelForSequenceClassification
-    from peft import PeftModel
-except ImportError as e:
-    print(f"❌ 依赖库导入失败: {e}")
-    print("请运行: pip install transformers peft torch")
-    raise
+# ml/ 目录（合并 LoRA 权重的 merged_model.py、离线模型快照 snapshot_model.py）
+ML_DIR = Path(__file__).resolve().parents[2] / "ml"
+if str(ML_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_DIR))
 
 # ======================================================
 # 配置
@@ -36,7 +40,19 @@ BASE_MODEL_NAME = "bert-base-uncased"
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 LORA_ADAPTER_PATH = PROJECT_ROOT / "ml" / "artifacts" / "lora_adapter_v1"
 MAX_LENGTH = 256
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# 微批推理：按 token 长度排序分桶，每批最多 BATCH_SIZE 条、padding 后不超过 MAX_BATCH_TOKENS 个 token
+BATCH_SIZE = int(os.environ.get("GEO_SENTIMENT_BATCH_SIZE", 32))
+MAX_BATCH_TOKENS = int(os.environ.get("GEO_SENTIMENT_MAX_BATCH_TOKENS", 4096))
+# 推理后端：torch（默认，PyTorch + LoRA）
+#           onnx（onnxruntime CPU，先运行 python ml/export_onnx.py 导出）
+#           onnx_int8（INT8 动态量化，再运行 python ml/quantize.py --report，报告见模型目录）
+ONNX_MODEL_DIRS = {
+    "onnx": PROJECT_ROOT / "ml" / "artifacts" / "onnx_v1",
+    "onnx_int8": PROJECT_ROOT / "ml" / "artifacts" / "onnx_v1_int8",
+}
+SENTIMENT_BACKENDS = ("torch",) + tuple(ONNX_MODEL_DIRS)
+SENTIMENT_BACKEND = os.environ.get("GEO_SENTIMENT_BACKEND", "torch").lower()
+ONNX_MODEL_DIR = Path(os.environ.get("GEO_SENTIMENT_ONNX_DIR") or ONNX_MODEL_DIRS.get(SENTIMENT_BACKEND, ONNX_MODEL_DIRS["onnx"]))
 
 # 情感标签映射
 ID2LABEL = {
@@ -72,57 +88,194 @@ class SentimentAnalyzer:
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(SentimentAnalyzer, cls).__new__(cls)
-            cls._instance._load_model()
+            # 模型在第一次 predict() 时才加载
+            cls._instance._loaded = False
+            cls._instance._load_lock = threading.Lock()
+            cls._instance.score_cache = None
         return cls._instance
 
+    def load(self):
+        """加载模型（只加载一次，多线程安全）；predict() 会自动调用，常驻服务启动时可提前调用预热"""
+        if self._loaded:
+            return
+        with self._load_lock:
+            if not self._loaded:
+                self._load_model()
+                self._loaded = True
+
     def _load_model(self):
+        if SENTIMENT_BACKEND not in SENTIMENT_BACKENDS:
+            raise ValueError(f"Unknown GEO_SENTIMENT_BACKEND '{SENTIMENT_BACKEND}', "
+                             f"expected one of: {', '.join(SENTIMENT_BACKENDS)}")
         print(f"🔄 正在加载BERT情感分析模型...")
-        print(f"   设备: {DEVICE}")
+        print(f"   后端: {SENTIMENT_BACKEND}")
         print(f"   Base model: {BASE_MODEL_NAME}")
-        print(f"   Adapter路径: {LORA_ADAPTER_PATH}")
+        print(f"   Adapter路径: {LORA_ADAPTER_PATH}（加载时合并进基础权重）")
 
         try:
-            # 1️⃣ tokenizer 一定来自 base model
-            self._tokenizer = AutoTokenizer.from_pretrained(
-                BASE_MODEL_NAME,
-                local_files_only=False
-            )
-
-            # 2️⃣ 加载 base model
-            base_model = AutoModelForSequenceClassification.from_pretrained(
-                BASE_MODEL_NAME,
-                num_labels=len(ID2LABEL),
-                torch_dtype=torch.float32
-            )
-
-            # 3️⃣ 加载 LoRA adapter（本地路径是完全 OK 的）
-            self._model = PeftModel.from_pretrained(
-                base_model,
-                str(LORA_ADAPTER_PATH),
-                torch_dtype=torch.float32
-            )
-
-            self._model.to(DEVICE)
-            self._model.eval()
+            self._onnx_session = None
+            self._device = "cpu"
+            if SENTIMENT_BACKEND in ONNX_MODEL_DIRS:
+                self._load_onnx_model()
+            else:
+                self._load_torch_model()
 
             print("✅ BERT模型加载成功\n")
 
+            # 4️⃣ 句子级结果缓存（键包含 adapter 指纹、MAX_LENGTH 与后端，换模型后自动失效）
+            self.score_cache = open_score_cache(
+                model_fingerprint(BASE_MODEL_NAME, LORA_ADAPTER_PATH, MAX_LENGTH, SENTIMENT_BACKEND))
+            if self.score_cache is not None:
+                print(f"🗄️  情感分析缓存: {self.score_cache.path} ({len(self.score_cache)} 条)\n")
+
+        except ImportError as e:
+            # 缺少依赖库属于环境问题，只提示一行，不打印堆栈
+            requirements = "onnxruntime transformers" if SENTIMENT_BACKEND in ONNX_MODEL_DIRS else "transformers peft torch"
+            print(f"❌ 依赖库导入失败: {e}（请运行: pip install {requirements}）")
+            raise
         except Exception as e:
             print(f"❌ 模型加载失败: {e}")
             import traceback
             traceback.print_exc()
             raise
 
+    def _load_torch_model(self):
+        # 已生成本地快照（python ml/snapshot_model.py）时只从快照离线加载，不访问 Hugging Face Hub；
+        # 需在导入 transformers 之前开启离线模式
+        from snapshot_model import resolve_snapshot
+        snapshot = resolve_snapshot()
+
+        import torch
+        from transformers import AutoTokenizer
+        from merged_model import load_merged_model
+
+        self._device = "cuda" if torch.cuda.is_available() else "cpu"
+        print(f"   设备: {self._device}")
+
+        if snapshot is not None:
+            base_model_path, adapter_path = snapshot
+            print(f"   模型快照: {base_model_path.parent}（离线加载）")
+        else:
+            base_model_path, adapter_path = None, LORA_ADAPTER_PATH
+            print("   ⚠️  未找到模型快照，从 Hugging Face Hub 解析 base model（python ml/snapshot_model.py 可生成快照）")
+        local_files_only = snapshot is not None
+
+        # 1️⃣ tokenizer 一定来自 base model
+        self._tokenizer = AutoTokenizer.from_pretrained(
+            str(base_model_path or BASE_MODEL_NAME),
+            local_files_only=local_files_only
+        )
+
+        # 2️⃣ 加载 LoRA 已合并进基础权重的模型（不再经过 PeftModel 包装）
+        #    首次运行时合并一次并缓存到 ml/artifacts/merged_v1，之后直接加载，adapter 变化后自动重新合并
+        self._model = load_merged_model(
+            BASE_MODEL_NAME,
+            adapter_path,
+            num_labels=len(ID2LABEL),
+            torch_dtype=torch.float32,
+            base_model_path=base_model_path,
+            local_files_only=local_files_only
+        )
+
+        self._model.to(self._device)
+        self._model.eval()
+
+    def _load_onnx_model(self):
+        """加载 ml/export_onnx.py 导出（或 ml/quantize.py 量化）的 ONNX 模型（LoRA 已合并）与同目录下的 tokenizer"""
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        onnx_path = ONNX_MODEL_DIR / "model.onnx"
+        if not onnx_path.exists():
+            raise FileNotFoundError(f"ONNX 模型不存在: {onnx_path}（请先运行 python ml/export_onnx.py）")
+        print(f"   ONNX模型: {onnx_path}")
+
+        self._tokenizer = AutoTokenizer.from_pretrained(str(ONNX_MODEL_DIR), local_files_only=True)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._onnx_session = ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+        self._onnx_input_names = [i.name for i in self._onnx_session.get_inputs()]
+        self._model = None
+
     @staticmethod
     def _softmax(logits: np.ndarray) -> np.ndarray:
         """计算softmax概率"""
         exp = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
         return exp / exp.sum(axis=-1, keepdims=True)
 
-    @torch.no_grad()
+    @staticmethod
+    def _length_buckets(lengths: List[int], batch_size: int, max_batch_tokens: int) -> List[List[int]]:
+        """
+        按 token 长度升序分批，返回每批的原始下标
+        每批不超过 batch_size 条，且 (条数 × 批内最长长度) 不超过 max_batch_tokens（单条超长时单独成批）
+        """
+        order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+        batches, batch = [], []
+        for i in order:
+            # 升序排列，当前句子就是加入后批内最长的
+            if batch and (len(batch) >= batch_size or (len(batch) + 1) * lengths[i] > max_batch_tokens):
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _no_grad(self):
+        """torch 后端关闭梯度计算；ONNX 后端不需要 torch"""
+        if self._onnx_session is not None:
+            return contextlib.nullcontext()
+        import torch
+        return torch.no_grad()
+
+    def _forward(self, features: List[Dict]) -> np.ndarray:
+        """对一批已分词的样本做 padding 并前向计算，返回 logits"""
+        if self._onnx_session is not None:
+            inputs = self._tokenizer.pad(features, padding=True, return_tensors="np")
+            feed = {name: inputs[name].astype(np.int64) for name in self._onnx_input_names}
+            return self._onnx_session.run(["logits"], feed)[0]
+
+        inputs = self._tokenizer.pad(features, padding=True, return_tensors="pt").to(self._device)
+        return self._model(**inputs).logits.float().cpu().numpy()
+
+    def _infer(self, texts: List[str]) -> List[Dict]:
+        """
+        对文本列表跑模型，返回包含完整概率分布的结果（顺序与输入一致）
+        先不做 padding 地分词得到每条的长度，按长度分桶后逐批 padding、推理，
+        峰值显存/内存受 BATCH_SIZE 与 MAX_BATCH_TOKENS 限制，短句也不会被 padding 到整批最长的长度
+        """
+        # Tokenize（不 padding，只截断）
+        encodings = self._tokenizer(texts, truncation=True, max_length=MAX_LENGTH)
+        lengths = [len(ids) for ids in encodings["input_ids"]]
+
+        # 分批推理，logits 按原始下标写回
+        logits = np.zeros((len(texts), len(ID2LABEL)), dtype=np.float32)
+        with self._no_grad():
+            for batch in self._length_buckets(lengths, BATCH_SIZE, MAX_BATCH_TOKENS):
+                features = [{key: encodings[key][i] for key in encodings.keys()} for i in batch]
+                logits[batch] = self._forward(features)
+
+        probs = self._softmax(logits)
+        preds = probs.argmax(axis=1)
+
+        # 构建结果
+        results = []
+        for i, idx in enumerate(preds):
+            label = ID2LABEL[int(idx)]
+            results.append({
+                "label": label,
+                "confidence": float(probs[i][idx]),
+                "score": SENTIMENT_SCORES[label],  # 0-100分制
+                "probs": {
+                    ID2LABEL[j]: float(probs[i][j])
+                    for j in range(len(ID2LABEL))
+                }
+            })
+        return results
+
     def predict(self, texts: List[str], return_probs: bool = False) -> List[Dict]:
         """
-        对文本列表进行情感分析
+        对文本列表进行情感分析（先查句子级缓存，只对未命中的句子跑模型）
 
         Args:
             texts: 待分析的文本列表
@@ -134,43 +287,29 @@ class SentimentAnalyzer:
         if not texts:
             return []
 
+        # 模型加载失败时抛出异常（由调用方回退到规则匹配），推理出错时才返回默认结果
+        self.load()
         try:
-            # Tokenize
-            inputs = self._tokenizer(
-                texts,
-                truncation=True,
-                padding=True,
-                max_length=MAX_LENGTH,
-                return_tensors="pt"
-            ).to(DEVICE)
-
-            # 推理
-            outputs = self._model(**inputs)
-            logits = outputs.logits.cpu().numpy()
-            probs = self._softmax(logits)
-            preds = probs.argmax(axis=1)
-
-            # 构建结果
+            cache = self.score_cache
+            known = cache.get_many(texts) if cache is not None else {}
+            missing = list(dict.fromkeys(t for t in texts if t not in known))
+            if missing:
+                inferred = dict(zip(missing, self._infer(missing)))
+                if cache is not None:
+                    cache.put_many(inferred)
+                known.update(inferred)
+
             results = []
-            for i, idx in enumerate(preds):
-                label = ID2LABEL[int(idx)]
-                result = {
-                    "label": label,
-                    "confidence": float(probs[i][idx]),
-                    "score": SENTIMENT_SCORES[label]  # 0-100分制
-                }
-                if return_probs:
-                    result["probs"] = {
-                        ID2LABEL[j]: float(probs[i][j])
-                        for j in range(len(ID2LABEL))
-                    }
+            for text in texts:
+                result = dict(known[text])
+                if not return_probs:
+                    result.pop("probs", None)
                 results.append(result)
-
             return results
 
         except Exception as e:
             print(f"⚠️  推理过程出错: {e}")
-            # 返回默认中性结果
+            # 返回默认中性结果（不写入缓存）
             return [{
                 "label": "neutral",
                 "confidence": 0.0,
@@ -202,10 +341,18 @@ _analyzer = None
 
 
 def get_sentiment_analyzer():
-    """获取情感分析器单例"""
+    """
+    获取情感分析器单例
+    常驻服务（sentiment/sentiment_server.py）已启动时返回其客户端，本进程不加载模型；否则本地加载
+    """
     global _analyzer
     if _analyzer is None:
-        _analyzer = SentimentAnalyzer()
+        client = connect_sentiment_server()
+        if client is not None:
+            print(f"🔌 使用常驻情感分析服务: {client.base_url} (后端: {client.backend})")
+            _analyzer = client
+        else:
+            _analyzer = SentimentAnalyzer()
     return _analyzer
 
 
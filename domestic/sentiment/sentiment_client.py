@@ -0,0 +1,81 @@
+# domestic/sentiment/sentiment_client.py
+"""
+常驻情感分析服务（sentiment_server.py）的客户端
+接口与 SentimentAnalyzer 相同（predict / analyze_sentence），只依赖标准库，不需要 torch。
+get_sentiment_analyzer() 在服务可用时返回它，否则回退到本地加载模型。
+
+环境变量 GEO_SENTIMENT_SERVER：服务地址（默认 http://127.0.0.1:8765），设为 off/0/false 时不使用服务。
+"""
+import json
+import os
+import urllib.request
+from typing import Dict, List, Optional
+
+DEFAULT_SERVER_URL = "http://127.0.0.1:8765"
+HEALTH_TIMEOUT = 0.3
+
+# 服务只监听本机，不走 HTTP(S)_PROXY
+_OPENER = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+def server_url() -> Optional[str]:
+    url = os.environ.get("GEO_SENTIMENT_SERVER", DEFAULT_SERVER_URL).strip()
+    if url.lower() in ("", "0", "off", "false", "no"):
+        return None
+    return url.rstrip("/")
+
+
+class SentimentClient:
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.backend = None
+
+    def _request(self, path: str, payload: dict = None, timeout: float = None) -> dict:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data,
+                                         headers={"Content-Type": "application/json"})
+        with _OPENER.open(request, timeout=timeout or self.timeout) as response:
+            return json.loads(response.read())
+
+    def health(self) -> Optional[dict]:
+        """服务可用时返回 /health 的内容，否则返回 None"""
+        try:
+            info = self._request("/health", timeout=HEALTH_TIMEOUT)
+        except (OSError, ValueError):
+            return None
+        if info.get("status") != "ok":
+            return None
+        self.backend = info.get("backend")
+        return info
+
+    def predict(self, texts: List[str], return_probs: bool = False) -> List[Dict]:
+        if not texts:
+            return []
+        try:
+            return self._request("/predict", {"texts": list(texts), "return_probs": return_probs})["results"]
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  情感分析服务调用失败: {e}")
+            # 返回默认中性结果（与本地推理出错时一致）
+            return [{
+                "label": "neutral",
+                "confidence": 0.0,
+                "score": 60
+            } for _ in texts]
+
+    def analyze_sentence(self, sentence: str) -> Dict:
+        results = self.predict([sentence])
+        return results[0] if results else {
+            "label": "neutral",
+            "confidence": 0.0,
+            "score": 60
+        }
+
+
+def connect_sentiment_server() -> Optional[SentimentClient]:
+    """服务已启动时返回客户端，未启动（或已关闭该功能）时返回 None"""
+    url = server_url()
+    if url is None:
+        return None
+    client = SentimentClient(url)
+    return client if client.health() is not None else None
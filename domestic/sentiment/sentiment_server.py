@@ -0,0 +1,195 @@
+# domestic/sentiment/sentiment_server.py
+"""
+常驻的本地情感分析服务（模型只加载一次，常驻内存）
+每次运行 analyze_results_domestic.py / analyze_results_oversea.py 都要冷加载 bert-base、tokenizer 与 adapter，
+每个品类、每周的报告都重复付出几秒到几十秒。启动本服务后，get_sentiment_analyzer() 会自动改用
+sentiment_client.SentimentClient 通过本地 HTTP 调用它，分析脚本不再加载模型。
+
+接口（仅监听本机）：
+- GET  /health   {"status": "ok", "backend": ..., "pid": ...}
+- POST /predict  {"texts": [...], "return_probs": false} -> {"results": [...]}（与 SentimentAnalyzer.predict 相同）
+
+并发合并：各客户端的请求先进入队列，批处理线程最多等待 --max-wait-ms 毫秒，
+把同时到达的请求去重合并为一次 predict（之后再由 predict 按长度分桶微批推理），结果按请求拆分返回。
+
+用法（在 domestic 目录下运行）：
+python sentiment/sentiment_server.py
+python sentiment/sentiment_server.py --port 8765 --max-wait-ms 10 --max-batch-texts 512
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+if str(BASE_DIR) not in sys.path:
+    sys.path.insert(0, str(BASE_DIR))
+
+from sentiment.sentiment_client import DEFAULT_SERVER_URL
+
+
+class _PendingRequest:
+    def __init__(self, texts: list, return_probs: bool):
+        self.texts = texts
+        self.return_probs = return_probs
+        self.results = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class PredictBatcher:
+    """把并发到达的 predict 请求合并为一次推理"""
+
+    def __init__(self, analyzer, max_wait_ms: float = 10.0, max_batch_texts: int = 512):
+        self.analyzer = analyzer
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_texts = max_batch_texts
+        self.stats = {"requests": 0, "batches": 0, "texts": 0, "unique_texts": 0}
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sentiment-batcher", daemon=True)
+        self._thread.start()
+
+    def predict(self, texts: list, return_probs: bool = False) -> list:
+        request = _PendingRequest(texts, return_probs)
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.results
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_texts:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+            self._process(batch)
+
+    def _process(self, batch: list):
+        unique_texts = list(dict.fromkeys(t for request in batch for t in request.texts))
+        return_probs = any(request.return_probs for request in batch)
+        try:
+            result_of = dict(zip(unique_texts, self.analyzer.predict(unique_texts, return_probs=return_probs)))
+            for request in batch:
+                results = []
+                for text in request.texts:
+                    result = dict(result_of[text])
+                    if not request.return_probs:
+                        result.pop("probs", None)
+                    results.append(result)
+                request.results = results
+        except Exception as e:
+            for request in batch:
+                request.error = e
+        finally:
+            self.stats["requests"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["texts"] += sum(len(request.texts) for request in batch)
+            self.stats["unique_texts"] += len(unique_texts)
+            for request in batch:
+                request.done.set()
+
+
+class SentimentRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "GeoSentiment/1.0"
+
+    def log_message(self, format, *args):
+        pass  # 不打印访问日志
+
+    def _send_json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/health":
+            self._send_json(200, {"status": "ok", "backend": self.server.backend, "pid": os.getpid(),
+                                  "stats": dict(self.server.batcher.stats)})
+        else:
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/predict":
+            self._send_json(404, {"error": f"unknown path {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) if length else b"{}")
+            texts = request.get("texts") or []
+            if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+                self._send_json(400, {"error": "texts must be a list of strings"})
+                return
+        except ValueError as e:
+            self._send_json(400, {"error": f"invalid JSON: {e}"})
+            return
+
+        try:
+            results = self.server.batcher.predict(texts, bool(request.get("return_probs", False)))
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"results": results})
+
+
+class SentimentServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, analyzer, host: str = "127.0.0.1", port: int = 8765, backend: str = "torch",
+                 max_wait_ms: float = 10.0, max_batch_texts: int = 512):
+        super().__init__((host, port), SentimentRequestHandler)
+        self.backend = backend
+        self.batcher = PredictBatcher(analyzer, max_wait_ms, max_batch_texts)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def main():
+    default_host, default_port = DEFAULT_SERVER_URL.rsplit("//", 1)[-1].split(":")
+    parser = argparse.ArgumentParser(description="常驻的本地情感分析服务")
+    parser.add_argument("--host", default=default_host)
+    parser.add_argument("--port", type=int, default=int(default_port))
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="合并并发请求时最多等待的毫秒数")
+    parser.add_argument("--max-batch-texts", type=int, default=512, help="一次合并推理的句子数上限")
+    args = parser.parse_args()
+
+    # 服务端自己必须加载本地模型，不能再连到服务上
+    os.environ["GEO_SENTIMENT_SERVER"] = "off"
+    from sentiment.sentiment_analyzer import SENTIMENT_BACKEND, SentimentAnalyzer
+
+    analyzer = SentimentAnalyzer.get_instance()
+    analyzer.load()  # 启动时就加载模型，第一个请求不用等
+    server = SentimentServer(analyzer, args.host, args.port, SENTIMENT_BACKEND, args.max_wait_ms,
+                             args.max_batch_texts)
+    print(f"🧠 Sentiment server listening on {server.base_url} (backend: {SENTIMENT_BACKEND}, pid {os.getpid()})")
+    print(f"   分析脚本会自动使用本服务；设置 GEO_SENTIMENT_SERVER=off 可让脚本改为本地加载模型")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
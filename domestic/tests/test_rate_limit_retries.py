@@ -0,0 +1,53 @@
+# domestic/tests/test_rate_limit_retries.py
+"""
+429 只由 ProviderRateLimiter 重试：在本地模拟服务（collection/mock_server.py）上让所有请求返回 429，
+断言服务端收到的请求数 == 限流器的尝试次数（OpenAI SDK 自带的重试已关闭，见 collection/client_registry.py）
+
+运行（在 domestic 目录下）：
+python -m unittest tests.test_rate_limit_retries
+"""
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from collection.client_registry import close_all_clients, get_openai_client
+from collection.mock_server import MockProviderServer, MockSettings
+from collection.rate_limiter import ProviderRateLimiter, is_rate_limit_error
+
+
+class RateLimitRetryAccountingTest(unittest.TestCase):
+    def setUp(self):
+        settings = MockSettings(latency_ms=0, jitter_ms=0, rate_limit_rate=1.0, seed=0)
+        self.server = MockProviderServer(settings=settings).start_in_background()
+
+    def tearDown(self):
+        close_all_clients()
+        self.server.stop()
+
+    def test_server_hits_equal_limiter_attempts(self):
+        max_retries = 2
+        limiter = ProviderRateLimiter("mock-openrouter", max_retries=max_retries, base_backoff=0.01, max_backoff=0.05)
+        client = get_openai_client("mock-openrouter", "mock-key", f"{self.server.base_url}/openrouter/api/v1")
+        attempts = []
+
+        def request():
+            attempts.append(1)
+            return client.chat.completions.create(model="mock", messages=[{"role": "user", "content": "hi"}])
+
+        with contextlib.redirect_stdout(io.StringIO()), self.assertRaises(Exception) as raised:
+            limiter.call(request, estimated_tokens=10)
+
+        self.assertTrue(is_rate_limit_error(raised.exception))
+        self.assertEqual(len(attempts), max_retries + 1)
+        server_hits = self.server.snapshot_stats().get("openrouter", {}).get("rate_limited", 0)
+        self.assertEqual(server_hits, len(attempts))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+# ml/export_onnx.py
+"""
+把 LoRA 情感模型导出为 ONNX（供无 GPU 的打分机用 onnxruntime CPU 推理）
+1. 加载 LoRA 已合并进基础权重的模型（ml/merged_model.py，合并结果缓存在 ml/artifacts/merged_v1）
+2. torch.onnx.export 导出 logits 图（batch、序列长度均为动态维度），tokenizer 一并保存
+3. 用同一批句子对比 PyTorch 与 onnxruntime 的输出概率，超过容差时以非零状态退出
+
+使用示例（在项目根目录下运行）：
+python ml/export_onnx.py
+python ml/export_onnx.py --output ml/artifacts/onnx_v1 --atol 1e-4
+
+导出后设置 GEO_SENTIMENT_BACKEND=onnx 即可让 domestic/sentiment/sentiment_analyzer.py 使用该模型。
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+
+from merged_model import BASE_MODEL_NAME, LORA_ADAPTER_PATH, NUM_LABELS, load_merged_model
+from snapshot_model import resolve_snapshot
+
+# ======================================================
+# 配置
+# ======================================================
+BASE_DIR = Path(__file__).resolve().parent
+ONNX_OUTPUT_DIR = BASE_DIR / "artifacts" / "onnx_v1"
+ONNX_FILE_NAME = "model.onnx"
+MAX_LENGTH = 256
+OPSET_VERSION = 17
+INPUT_NAMES = ["input_ids", "attention_mask", "token_type_ids"]
+
+PARITY_SAMPLES = [
+    "The food was absolutely terrible and the service was even worse.",
+    "It was okay, nothing special but not bad either.",
+    "Amazing experience! I would definitely come back again.",
+    "强烈推荐这个品牌，性价比很高。",
+    "Not worth the price.",
+    "I have been coming here for years and the quality has never dropped, highly recommend the tasting menu "
+    "and the staff are always friendly and attentive.",
+]
+
+
+# ======================================================
+# 模型
+# ======================================================
+class LogitsOnly(torch.nn.Module):
+    """只输出 logits，避免导出 HF 的 ModelOutput 结构"""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask, token_type_ids=token_type_ids).logits
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - np.max(logits, axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+# ======================================================
+# 导出
+# ======================================================
+def export(output_dir: Path, model=None, tokenizer=None) -> Path:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    model = model if model is not None else load_merged_model()
+    tokenizer = tokenizer if tokenizer is not None else AutoTokenizer.from_pretrained(BASE_MODEL_NAME)
+
+    dummy = tokenizer(PARITY_SAMPLES[:2], truncation=True, padding=True, max_length=MAX_LENGTH, return_tensors="pt")
+    onnx_path = output_dir / ONNX_FILE_NAME
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in INPUT_NAMES}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    print(f"Exporting ONNX graph to {onnx_path} (opset {OPSET_VERSION})...")
+    with torch.no_grad():
+        torch.onnx.export(
+            LogitsOnly(model),
+            tuple(dummy[name] for name in INPUT_NAMES),
+            str(onnx_path),
+            input_names=INPUT_NAMES,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET_VERSION,
+            do_constant_folding=True,
+        )
+
+    tokenizer.save_pretrained(str(output_dir))
+    with open(output_dir / "export_info.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "base_model": BASE_MODEL_NAME,
+            "adapter": str(LORA_ADAPTER_PATH.relative_to(BASE_DIR.parent)),
+            "max_length": MAX_LENGTH,
+            "opset": OPSET_VERSION,
+            "num_labels": NUM_LABELS,
+        }, f, ensure_ascii=False, indent=2)
+    return onnx_path
+
+
+# ======================================================
+# 一致性检查
+# ======================================================
+def check_parity(onnx_path: Path, model, tokenizer, texts=None, atol: float = 1e-4) -> dict:
+    """对比 PyTorch 与 onnxruntime 的 softmax 概率，返回最大绝对误差与标签一致率"""
+    import onnxruntime as ort
+
+    texts = texts or PARITY_SAMPLES
+    inputs = tokenizer(texts, truncation=True, padding=True, max_length=MAX_LENGTH, return_tensors="pt")
+    with torch.no_grad():
+        torch_probs = _softmax(model(**inputs).logits.cpu().numpy())
+
+    session = ort.InferenceSession(str(onnx_path), providers=["CPUExecutionProvider"])
+    feed = {name: inputs[name].cpu().numpy().astype(np.int64) for name in INPUT_NAMES}
+    onnx_probs = _softmax(session.run(["logits"], feed)[0])
+
+    max_abs_diff = float(np.abs(torch_probs - onnx_probs).max())
+    label_agreement = float((torch_probs.argmax(axis=1) == onnx_probs.argmax(axis=1)).mean())
+    return {
+        "samples": len(texts),
+        "max_abs_prob_diff": max_abs_diff,
+        "label_agreement": label_agreement,
+        "atol": atol,
+        "passed": max_abs_diff <= atol and label_agreement == 1.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the merged LoRA sentiment model to ONNX")
+    parser.add_argument("--output", type=str, default=str(ONNX_OUTPUT_DIR), help="输出目录")
+    parser.add_argument("--atol", type=float, default=1e-4, help="PyTorch / ONNX 概率的最大允许绝对误差")
+    parser.add_argument("--skip-check", action="store_true", help="跳过一致性检查")
+    args = parser.parse_args()
+
+    output_dir = Path(args.output)
+    # 已生成本地快照（ml/snapshot_model.py）时 tokenizer 与模型都只从快照离线加载
+    snapshot = resolve_snapshot()
+    if snapshot is not None:
+        base_path, adapter_path = snapshot
+        tokenizer = AutoTokenizer.from_pretrained(str(base_path), local_files_only=True)
+        model = load_merged_model(adapter_path=adapter_path, base_model_path=base_path, local_files_only=True)
+    else:
+        tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME)
+        model = load_merged_model()
+    onnx_path = export(output_dir, model, tokenizer)
+    print(f"✅ ONNX model saved: {onnx_path}")
+
+    if args.skip_check:
+        return
+    report = check_parity(onnx_path, model, tokenizer, atol=args.atol)
+    with open(output_dir / "parity_report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Parity: max |Δprob| = {report['max_abs_prob_diff']:.2e} (atol {args.atol:.0e}), "
+          f"label agreement = {report['label_agreement']:.2%}")
+    if not report["passed"]:
+        print("❌ ONNX output differs from PyTorch beyond tolerance")
+        sys.exit(1)
+    print("✅ Parity check passed")
+
+
+if __name__ == "__main__":
+    main()
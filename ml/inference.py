@@ -1,17 +1,15 @@
 # ml/inference.py
+# torch / transformers / peft (via merged_model) are imported on first use,
+# so importing this module stays cheap.
+# When a local snapshot exists (python ml/snapshot_model.py), models load offline from it only.
 import os
-import torch
 import numpy as np
 from typing import List, Union
 
-from transformers import (
-    AutoTokenizer,
-    AutoModelForSequenceClassification
-)
-from peft import PeftModel
-
 from pathlib import Path
 
+from snapshot_model import resolve_snapshot
+
 # ======================================================
 # 1. Config
 # ======================================================
@@ -23,7 +21,6 @@ LORA_ADAPTER_PATH = BASE_DIR / "artifacts" / "lora_adapter_v1"
 BASE_MODEL_NAME = "bert-base-uncased"
 
 MAX_LENGTH = 256
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
 
 # Sentiment label mapping (index -> human-readable)
 ID2LABEL = {
@@ -38,40 +35,69 @@ ID2LABEL = {
 # ======================================================
 # 2. Load Model & Tokenizer
 # ======================================================
+def get_device() -> str:
+    import torch
+
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
 def load_model():
     """
-    Load base model and attach LoRA adapter.
+    Load the base model with the LoRA adapter merged into its weights.
+    The merged checkpoint is cached under ml/artifacts/merged_v1 (see merged_model.py),
+    so only the first run pays for merging.
+    With a snapshot, the base model, adapter and tokenizer come from it (local_files_only, safetensors).
     """
-    tokenizer = AutoTokenizer.from_pretrained(LORA_ADAPTER_PATH)
+    # Must run before transformers is imported so offline mode takes effect
+    snapshot = resolve_snapshot()
+    base_model_path, adapter_path = snapshot if snapshot is not None else (None, LORA_ADAPTER_PATH)
 
-    base_model = AutoModelForSequenceClassification.from_pretrained(
-        BASE_MODEL_NAME,
-        num_labels=len(ID2LABEL)
-    )
+    from transformers import AutoTokenizer
+    from merged_model import load_merged_model
 
-    model = PeftModel.from_pretrained(
-        base_model,
-        LORA_ADAPTER_PATH
+    tokenizer = AutoTokenizer.from_pretrained(adapter_path, local_files_only=snapshot is not None)
+
+    model = load_merged_model(
+        BASE_MODEL_NAME,
+        adapter_path,
+        num_labels=len(ID2LABEL),
+        base_model_path=base_model_path,
+        local_files_only=snapshot is not None
     )
 
-    model.to(DEVICE)
+    model.to(get_device())
     model.eval()
 
     return model, tokenizer
 
 
-MODEL, TOKENIZER = load_model()
+# Loaded on first use (get_model), so importing this module does not load the weights
+MODEL, TOKENIZER = None, None
+
+
+def get_model():
+    global MODEL, TOKENIZER
+    if MODEL is None:
+        MODEL, TOKENIZER = load_model()
+    return MODEL, TOKENIZER
 
 
 def load_baseline_model():
-    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME)
+    snapshot = resolve_snapshot()
+    base_model = str(snapshot[0]) if snapshot is not None else BASE_MODEL_NAME
+
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    tokenizer = AutoTokenizer.from_pretrained(base_model, local_files_only=snapshot is not None)
 
     model = AutoModelForSequenceClassification.from_pretrained(
-        BASE_MODEL_NAME,
-        num_labels=len(ID2LABEL)
+        base_model,
+        num_labels=len(ID2LABEL),
+        local_files_only=snapshot is not None,
+        use_safetensors=True if snapshot is not None else None
     )
 
-    model.to(DEVICE)
+    model.to(get_device())
     model.eval()
     return model, tokenizer
 
@@ -87,22 +113,24 @@ def _softmax(logits: np.ndarray) -> np.ndarray:
 # ======================================================
 # 4. Public Prediction API
 # ======================================================
-@torch.no_grad()
 def _predict_with_model(
         model,
         tokenizer,
         texts: List[str],
         return_probs: bool = False
 ):
+    import torch
+
     inputs = tokenizer(
         texts,
         truncation=True,
         padding=True,
         max_length=MAX_LENGTH,
         return_tensors="pt"
-    ).to(DEVICE)
+    ).to(model.device)
 
-    outputs = model(**inputs)
+    with torch.no_grad():
+        outputs = model(**inputs)
     logits = outputs.logits.cpu().numpy()
     probs = _softmax(logits)
     preds = probs.argmax(axis=1)
@@ -128,7 +156,7 @@ def _predict_with_model(
 # ======================================================
 
 def compare_with_baseline(texts: List[str]):
-    lora_model, lora_tokenizer = MODEL, TOKENIZER
+    lora_model, lora_tokenizer = get_model()
     base_model, base_tokenizer = load_baseline_model()
 
     lora_preds = _predict_with_model(lora_model, lora_tokenizer, texts, return_probs=True)
@@ -0,0 +1,186 @@
+# ml/merged_model.py
+"""
+合并 LoRA 权重后的模型（merge-and-unload + 磁盘缓存）
+PeftModel 推理时每个 query/value 线性层都要额外经过 LoRA 的 A/B 分支；
+这里把 LoRA 增量一次性合并进基础权重（W + B·A·scale），得到普通的 transformers 模型，
+并以 safetensors 保存到 ml/artifacts/merged_v1。之后的进程直接加载这一个模型：
+不再加载 base model + adapter 两份权重，也没有 PEFT 的包装开销。
+
+缓存目录中的 merge_info.json 记录 base model 名称与 adapter 文件内容的 SHA-256，
+adapter 重新训练（文件内容变化）后自动重新合并。
+base_model_path / local_files_only 用于从 ml/snapshot_model.py 生成的本地快照离线加载 base model
+（base_model_name 仍是模型标识，用于缓存指纹）。
+
+使用示例（在项目根目录下运行）：
+python ml/merged_model.py            # 预先生成合并后的模型
+python ml/merged_model.py --verify   # 对比合并模型与 PeftModel 的输出
+
+domestic/sentiment/sentiment_analyzer.py、ml/inference.py、ml/export_onnx.py 共用本模块。
+"""
+import argparse
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import torch
+from transformers import AutoModelForSequenceClassification
+from peft import PeftModel
+
+from snapshot_model import resolve_snapshot
+
+# ======================================================
+# 配置
+# ======================================================
+BASE_DIR = Path(__file__).resolve().parent
+BASE_MODEL_NAME = "bert-base-uncased"
+LORA_ADAPTER_PATH = BASE_DIR / "artifacts" / "lora_adapter_v1"
+MERGED_MODEL_DIR = BASE_DIR / "artifacts" / "merged_v1"
+NUM_LABELS = 5
+MERGE_INFO_FILE = "merge_info.json"
+
+
+def adapter_fingerprint(base_model_name: str = BASE_MODEL_NAME, adapter_path=LORA_ADAPTER_PATH) -> str:
+    """base model 名称 + adapter 配置与权重文件内容的 SHA-256"""
+    digest = hashlib.sha256(base_model_name.encode("utf-8"))
+    adapter_path = Path(adapter_path)
+    for name in ("adapter_config.json", "adapter_model.safetensors", "adapter_model.bin"):
+        file_path = adapter_path / name
+        if not file_path.is_file():
+            continue
+        digest.update(name.encode("utf-8"))
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_peft_model(base_model_name: str = BASE_MODEL_NAME, adapter_path=LORA_ADAPTER_PATH,
+                    num_labels: int = NUM_LABELS, torch_dtype=torch.float32, base_model_path=None,
+                    local_files_only: bool = False):
+    """未合并的 base model + LoRA adapter（合并与一致性检查时使用）"""
+    base_model = AutoModelForSequenceClassification.from_pretrained(
+        str(base_model_path or base_model_name), num_labels=num_labels, torch_dtype=torch_dtype,
+        local_files_only=local_files_only, use_safetensors=True if local_files_only else None)
+    return PeftModel.from_pretrained(base_model, str(adapter_path), torch_dtype=torch_dtype,
+                                     local_files_only=local_files_only)
+
+
+def _read_merge_info(merged_dir: Path):
+    try:
+        return json.loads((merged_dir / MERGE_INFO_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def build_merged_model(base_model_name: str = BASE_MODEL_NAME, adapter_path=LORA_ADAPTER_PATH,
+                       merged_dir=MERGED_MODEL_DIR, num_labels: int = NUM_LABELS, base_model_path=None,
+                       local_files_only: bool = False):
+    """合并 LoRA 权重并保存到 merged_dir（先写临时目录再替换，中断不会留下半个模型）"""
+    merged_dir = Path(merged_dir)
+    model = load_peft_model(base_model_name, adapter_path, num_labels, base_model_path=base_model_path,
+                            local_files_only=local_files_only).merge_and_unload()
+    model.eval()
+
+    tmp_dir = merged_dir.with_name(merged_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    model.save_pretrained(str(tmp_dir), safe_serialization=True)
+    (tmp_dir / MERGE_INFO_FILE).write_text(json.dumps({
+        "base_model": base_model_name,
+        "adapter": str(adapter_path),
+        "adapter_sha256": adapter_fingerprint(base_model_name, adapter_path),
+        "num_labels": num_labels,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    shutil.rmtree(merged_dir, ignore_errors=True)
+    tmp_dir.rename(merged_dir)
+    return model
+
+
+def load_merged_model(base_model_name: str = BASE_MODEL_NAME, adapter_path=LORA_ADAPTER_PATH,
+                      merged_dir=MERGED_MODEL_DIR, num_labels: int = NUM_LABELS, torch_dtype=torch.float32,
+                      base_model_path=None, local_files_only: bool = False):
+    """
+    加载合并后的模型：缓存有效时直接 from_pretrained(merged_dir)（本地 safetensors，内存映射读取），
+    否则合并一次并写入缓存（写入失败时仍返回内存中的合并模型）；
+    缓存目录损坏（权重文件缺失或不完整）时同样重新合并并覆盖缓存
+    """
+    merged_dir = Path(merged_dir)
+    info = _read_merge_info(merged_dir)
+    if info and info.get("adapter_sha256") == adapter_fingerprint(base_model_name, adapter_path) \
+            and info.get("num_labels") == num_labels:
+        try:
+            model = AutoModelForSequenceClassification.from_pretrained(
+                str(merged_dir), torch_dtype=torch_dtype, local_files_only=True, use_safetensors=True)
+            model.eval()
+            return model
+        except Exception as e:
+            print(f"⚠️  合并模型缓存无法加载，重新合并: {e}")
+
+    print(f"Merging LoRA adapter {adapter_path} into {base_model_name} (cached at {merged_dir})...")
+    try:
+        model = build_merged_model(base_model_name, adapter_path, merged_dir, num_labels, base_model_path,
+                                   local_files_only)
+    except OSError as e:
+        print(f"⚠️  合并模型缓存写入失败，本次使用内存中的合并模型: {e}")
+        model = load_peft_model(base_model_name, adapter_path, num_labels, base_model_path=base_model_path,
+                                local_files_only=local_files_only).merge_and_unload()
+        model.eval()
+    return model.to(torch_dtype)
+
+
+# ======================================================
+# 一致性检查
+# ======================================================
+@torch.no_grad()
+def verify(texts, merged_dir=MERGED_MODEL_DIR) -> dict:
+    """对比合并模型与 PeftModel 的 logits 与预测标签"""
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL_NAME)
+    inputs = tokenizer(texts, truncation=True, padding=True, max_length=256, return_tensors="pt")
+    peft_model = load_peft_model()
+    peft_model.eval()
+    merged_model = load_merged_model(merged_dir=merged_dir)
+
+    peft_logits = peft_model(**inputs).logits
+    merged_logits = merged_model(**inputs).logits
+    return {
+        "samples": len(texts),
+        "max_abs_logit_diff": float((peft_logits - merged_logits).abs().max()),
+        "label_agreement": float((peft_logits.argmax(-1) == merged_logits.argmax(-1)).float().mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the LoRA adapter into the base model and cache it")
+    parser.add_argument("--output", type=str, default=str(MERGED_MODEL_DIR), help="合并模型的缓存目录")
+    parser.add_argument("--force", action="store_true", help="忽略已有缓存，重新合并")
+    parser.add_argument("--verify", action="store_true", help="对比合并模型与 PeftModel 的输出")
+    args = parser.parse_args()
+
+    # 已生成本地快照（ml/snapshot_model.py）时只从快照离线加载 base model 与 adapter
+    snapshot = resolve_snapshot()
+    sources = {}
+    if snapshot is not None:
+        base_path, adapter_path = snapshot
+        print(f"Using local model snapshot: {base_path.parent}")
+        sources = {"adapter_path": adapter_path, "base_model_path": base_path, "local_files_only": True}
+
+    if args.force:
+        build_merged_model(merged_dir=args.output, **sources)
+    else:
+        load_merged_model(merged_dir=args.output, **sources)
+    print(f"✅ Merged model ready: {args.output}")
+
+    if args.verify:
+        samples = [
+            "The food was absolutely terrible and the service was even worse.",
+            "It was okay, nothing special but not bad either.",
+            "Amazing experience! I would definitely come back again.",
+        ]
+        report = verify(samples, args.output)
+        print(f"max |Δlogit| = {report['max_abs_logit_diff']:.2e}, label agreement = {report['label_agreement']:.2%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# ml/quantize.py
+"""
+情感模型的 INT8 动态量化（CPU 打分用）
+在 ml/export_onnx.py 导出的 fp32 ONNX 模型基础上，用 onnxruntime 的 quantize_dynamic
+把线性层（MatMul）权重量化为 INT8、激活在运行时动态量化，结果作为单独的产物保存到 ml/artifacts/onnx_v1_int8。
+
+--report 在 ml/compare_with_baseline.py 使用的 Yelp 测试集上对比 fp32 与 INT8：
+准确率、Macro-F1、两者标签一致率、吞吐（句/秒）、模型大小，写入 quantization_report.md / .json，
+用于判断吞吐提升是否值得 Macro-F1 的损失。
+
+使用示例（在项目根目录下运行）：
+python ml/export_onnx.py            # 先导出 fp32 ONNX
+python ml/quantize.py --report      # 量化并生成对比报告
+
+设置 GEO_SENTIMENT_BACKEND=onnx_int8 即可让 domestic/sentiment/sentiment_analyzer.py 使用量化模型。
+"""
+import argparse
+import json
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+
+from export_onnx import MAX_LENGTH, ONNX_FILE_NAME, ONNX_OUTPUT_DIR
+
+# ======================================================
+# 配置
+# ======================================================
+BASE_DIR = Path(__file__).resolve().parent
+INT8_OUTPUT_DIR = BASE_DIR / "artifacts" / "onnx_v1_int8"
+EVAL_BATCH_SIZE = 32
+
+
+# ======================================================
+# 量化
+# ======================================================
+def quantize(src_dir: Path = ONNX_OUTPUT_DIR, dst_dir: Path = INT8_OUTPUT_DIR) -> Path:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    src_path = src_dir / ONNX_FILE_NAME
+    if not src_path.exists():
+        raise FileNotFoundError(f"fp32 ONNX model not found: {src_path} (run python ml/export_onnx.py first)")
+
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    dst_path = dst_dir / ONNX_FILE_NAME
+    print(f"Quantizing {src_path} -> {dst_path} (dynamic INT8, per-channel weights)...")
+    quantize_dynamic(str(src_path), str(dst_path), weight_type=QuantType.QInt8, per_channel=True,
+                     op_types_to_quantize=["MatMul"])
+
+    # tokenizer 等文件原样复制，量化模型目录可以独立加载
+    for file_path in src_dir.iterdir():
+        if file_path.is_file() and file_path.suffix != ".onnx" and file_path.name != "parity_report.json":
+            shutil.copy2(file_path, dst_dir / file_path.name)
+    info_path = dst_dir / "export_info.json"
+    info = json.loads(info_path.read_text(encoding="utf-8")) if info_path.exists() else {}
+    info["quantization"] = {"method": "onnxruntime.quantize_dynamic", "weight_type": "QInt8", "per_channel": True,
+                            "source": str(src_path)}
+    info_path.write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8")
+    return dst_path
+
+
+# ======================================================
+# 评估
+# ======================================================
+def evaluate_onnx(onnx_path: Path, tokenizer, texts, threads: int = 0) -> dict:
+    """在给定文本上推理，返回预测标签与吞吐"""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    session = ort.InferenceSession(str(onnx_path), options, providers=["CPUExecutionProvider"])
+    input_names = [i.name for i in session.get_inputs()]
+
+    # 预热，避免首个批次的初始化开销计入吞吐
+    warmup = tokenizer(texts[:2], truncation=True, padding=True, max_length=MAX_LENGTH, return_tensors="np")
+    session.run(["logits"], {name: warmup[name].astype(np.int64) for name in input_names})
+
+    preds = []
+    start = time.perf_counter()
+    for i in range(0, len(texts), EVAL_BATCH_SIZE):
+        inputs = tokenizer(texts[i:i + EVAL_BATCH_SIZE], truncation=True, padding=True,
+                           max_length=MAX_LENGTH, return_tensors="np")
+        logits = session.run(["logits"], {name: inputs[name].astype(np.int64) for name in input_names})[0]
+        preds.extend(int(p) for p in logits.argmax(axis=1))
+    elapsed = time.perf_counter() - start
+    return {
+        "preds": preds,
+        "seconds": round(elapsed, 3),
+        "sentences_per_second": round(len(texts) / elapsed, 2) if elapsed else 0.0,
+        "model_size_mb": round(onnx_path.stat().st_size / 1024 / 1024, 1),
+    }
+
+
+def build_report(fp32_path: Path, int8_path: Path, num_samples: int, seed: int, threads: int = 0) -> dict:
+    from sklearn.metrics import accuracy_score, f1_score
+    from transformers import AutoTokenizer
+
+    from compare_with_baseline import load_test_samples
+
+    dataset = load_test_samples(num_samples, seed)
+    texts = [item["text"] for item in dataset]
+    y_true = [int(item["label"]) for item in dataset]
+    tokenizer = AutoTokenizer.from_pretrained(str(fp32_path.parent))  # export_onnx.py 与模型一起保存的 tokenizer
+
+    report = {"dataset": "yelp_review_full/test", "samples": len(texts), "seed": seed,
+              "batch_size": EVAL_BATCH_SIZE, "max_length": MAX_LENGTH, "models": {}}
+    preds_by_model = {}
+    for name, path in (("fp32", fp32_path), ("int8", int8_path)):
+        print(f"Evaluating {name} model on {len(texts)} Yelp test samples...")
+        result = evaluate_onnx(path, tokenizer, texts, threads)
+        preds = preds_by_model[name] = result.pop("preds")
+        result["accuracy"] = round(accuracy_score(y_true, preds), 4)
+        result["macro_f1"] = round(f1_score(y_true, preds, average="macro"), 4)
+        report["models"][name] = result
+
+    fp32, int8 = report["models"]["fp32"], report["models"]["int8"]
+    report["label_agreement"] = round(float(np.mean(np.array(preds_by_model["fp32"]) == np.array(preds_by_model["int8"]))), 4)
+    report["speedup"] = round(int8["sentences_per_second"] / fp32["sentences_per_second"], 2) \
+        if fp32["sentences_per_second"] else None
+    report["macro_f1_delta"] = round(int8["macro_f1"] - fp32["macro_f1"], 4)
+    report["accuracy_delta"] = round(int8["accuracy"] - fp32["accuracy"], 4)
+    return report
+
+
+def write_report(report: dict, output_dir: Path):
+    with open(output_dir / "quantization_report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    fp32, int8 = report["models"]["fp32"], report["models"]["int8"]
+    lines = [
+        "# INT8 动态量化评估报告",
+        "",
+        f"- 数据集: {report['dataset']}（{report['samples']} 条，seed={report['seed']}，"
+        f"batch={report['batch_size']}，max_length={report['max_length']}）",
+        "- 后端: onnxruntime CPUExecutionProvider",
+        "",
+        "| 模型 | Accuracy | Macro-F1 | 吞吐 (句/秒) | 耗时 (秒) | 模型大小 (MB) |",
+        "|------|----------|----------|--------------|-----------|---------------|",
+    ]
+    for name, row in (("fp32", fp32), ("int8", int8)):
+        lines.append(f"| {name} | {row['accuracy']:.4f} | {row['macro_f1']:.4f} | {row['sentences_per_second']} | "
+                     f"{row['seconds']} | {row['model_size_mb']} |")
+    lines += [
+        "",
+        f"- 吞吐提升: {report['speedup']}x",
+        f"- Accuracy 变化: {report['accuracy_delta']:+.4f}",
+        f"- Macro-F1 变化: {report['macro_f1_delta']:+.4f}",
+        f"- fp32 / int8 标签一致率: {report['label_agreement']:.2%}",
+        "",
+    ]
+    (output_dir / "quantization_report.md").write_text("\n".join(lines), encoding="utf-8")
+    print("\n".join(lines))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dynamic INT8 quantization of the ONNX sentiment model")
+    parser.add_argument("--source", type=str, default=str(ONNX_OUTPUT_DIR), help="fp32 ONNX 模型目录")
+    parser.add_argument("--output", type=str, default=str(INT8_OUTPUT_DIR), help="量化模型输出目录")
+    parser.add_argument("--report", action="store_true", help="在 Yelp 测试集上生成 fp32 / INT8 对比报告")
+    parser.add_argument("--samples", type=int, default=500, help="报告使用的测试样本数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime intra-op 线程数（0 为默认）")
+    args = parser.parse_args()
+
+    src_dir, dst_dir = Path(args.source), Path(args.output)
+    int8_path = quantize(src_dir, dst_dir)
+    print(f"✅ INT8 model saved: {int8_path}")
+
+    if args.report:
+        report = build_report(src_dir / ONNX_FILE_NAME, int8_path, args.samples, args.seed, args.threads)
+        write_report(report, dst_dir)
+        print(f"✅ Report saved: {dst_dir / 'quantization_report.md'}")
+
+
+if __name__ == "__main__":
+    main()
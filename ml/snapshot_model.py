@@ -0,0 +1,168 @@
+# ml/snapshot_model.py
+"""
+固定版本的本地模型快照（离线加载）
+from_pretrained("bert-base-uncased") 每次冷启动都会向 Hugging Face Hub 查询元数据，
+在无法联网的打分机上会卡住或直接失败。这里把 base model（safetensors 权重 + config + tokenizer）
+按固定的 commit 下载到 ml/artifacts/snapshot_v1/base，LoRA adapter 复制到 snapshot_v1/adapter，
+snapshot_info.json 记录 base model 名称、解析后的 commit 与每个文件的 SHA-256。
+
+快照存在时 domestic/sentiment/sentiment_analyzer.py 与 ml/merged_model.py 只从快照加载：
+设置 HF_HUB_OFFLINE / TRANSFORMERS_OFFLINE，from_pretrained 一律 local_files_only=True、use_safetensors=True
+（safetensors 权重以内存映射方式读取，不会回退到 pickle 格式的 .bin）。
+
+环境变量 GEO_SENTIMENT_SNAPSHOT：快照目录（默认 ml/artifacts/snapshot_v1），设为 off 时不使用快照。
+
+使用示例（在项目根目录下、能联网的机器上运行，再把快照目录拷到打分机）：
+python ml/snapshot_model.py
+python ml/snapshot_model.py --revision 86b5e0934494bd15c9632b12f734a8a67f723594
+python ml/snapshot_model.py --verify   # 校验已有快照的文件哈希
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+# ======================================================
+# 配置
+# ======================================================
+BASE_DIR = Path(__file__).resolve().parent
+BASE_MODEL_NAME = "bert-base-uncased"
+BASE_MODEL_REVISION = "main"
+LORA_ADAPTER_PATH = BASE_DIR / "artifacts" / "lora_adapter_v1"
+SNAPSHOT_DIR = BASE_DIR / "artifacts" / "snapshot_v1"
+SNAPSHOT_INFO_FILE = "snapshot_info.json"
+
+# 只下载推理需要的文件：safetensors 权重 + config + tokenizer
+BASE_MODEL_FILES = ["config.json", "model.safetensors", "tokenizer.json", "tokenizer_config.json", "vocab.txt",
+                    "special_tokens_map.json"]
+ADAPTER_FILES = ["adapter_config.json", "adapter_model.safetensors", "tokenizer.json", "tokenizer_config.json",
+                 "vocab.txt", "special_tokens_map.json"]
+
+
+def _sha256(file_path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# ======================================================
+# 生成快照（需要联网）
+# ======================================================
+def create_snapshot(base_model_name: str = BASE_MODEL_NAME, revision: str = BASE_MODEL_REVISION,
+                    adapter_path=LORA_ADAPTER_PATH, snapshot_dir=SNAPSHOT_DIR) -> dict:
+    """下载 base model、复制 adapter 并写入 snapshot_info.json（先写临时目录再替换，中断不会留下半个快照）"""
+    from huggingface_hub import HfApi, snapshot_download
+
+    snapshot_dir, adapter_path = Path(snapshot_dir), Path(adapter_path)
+    if not (adapter_path / "adapter_model.safetensors").is_file():
+        raise FileNotFoundError(f"adapter_model.safetensors not found in {adapter_path}")
+
+    # 把分支名 / tag 解析为 commit，快照固定在这一版本上
+    commit = HfApi().model_info(base_model_name, revision=revision).sha
+    print(f"Downloading {base_model_name}@{commit} ...")
+
+    tmp_dir = snapshot_dir.with_name(snapshot_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    snapshot_download(base_model_name, revision=commit, allow_patterns=BASE_MODEL_FILES,
+                      local_dir=str(tmp_dir / "base"))
+    shutil.rmtree(tmp_dir / "base" / ".cache", ignore_errors=True)  # huggingface_hub 的下载元数据
+
+    (tmp_dir / "adapter").mkdir(parents=True)
+    for name in ADAPTER_FILES:
+        if (adapter_path / name).is_file():
+            shutil.copy2(adapter_path / name, tmp_dir / "adapter" / name)
+
+    info = {
+        "base_model": base_model_name,
+        "revision": revision,
+        "commit": commit,
+        "adapter_source": str(adapter_path),
+        "files": {path.relative_to(tmp_dir).as_posix(): _sha256(path)
+                  for path in sorted(tmp_dir.rglob("*")) if path.is_file()},
+    }
+    (tmp_dir / SNAPSHOT_INFO_FILE).write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8")
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    tmp_dir.rename(snapshot_dir)
+    return info
+
+
+# ======================================================
+# 离线加载
+# ======================================================
+def snapshot_dir_from_env() -> Optional[Path]:
+    value = os.environ.get("GEO_SENTIMENT_SNAPSHOT", "").strip()
+    if value.lower() in ("0", "off", "false", "no"):
+        return None
+    return Path(value) if value else SNAPSHOT_DIR
+
+
+def load_snapshot_info(snapshot_dir=SNAPSHOT_DIR) -> Optional[dict]:
+    try:
+        return json.loads((Path(snapshot_dir) / SNAPSHOT_INFO_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def enable_offline_mode():
+    """禁止 huggingface_hub / transformers 访问网络（在导入 transformers 之前调用才对其全局常量生效）"""
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+
+
+def resolve_snapshot(snapshot_dir=None) -> Optional[Tuple[Path, Path]]:
+    """
+    快照完整时返回 (base model 目录, adapter 目录) 并开启离线模式；
+    未生成快照（或 GEO_SENTIMENT_SNAPSHOT=off）时返回 None，由调用方按原方式从 Hub 加载
+    """
+    snapshot_dir = Path(snapshot_dir) if snapshot_dir is not None else snapshot_dir_from_env()
+    if snapshot_dir is None:
+        return None
+    info = load_snapshot_info(snapshot_dir)
+    if info is None:
+        return None
+    missing = [name for name in info.get("files", {}) if not (snapshot_dir / name).is_file()]
+    if missing:
+        raise FileNotFoundError(f"模型快照不完整 {snapshot_dir}: 缺少 {', '.join(missing)}"
+                                f"（请重新运行 python ml/snapshot_model.py）")
+    enable_offline_mode()
+    return snapshot_dir / "base", snapshot_dir / "adapter"
+
+
+def verify_snapshot(snapshot_dir=SNAPSHOT_DIR) -> List[str]:
+    """返回哈希与 snapshot_info.json 不一致（或缺失）的文件"""
+    snapshot_dir = Path(snapshot_dir)
+    info = load_snapshot_info(snapshot_dir)
+    if info is None:
+        raise FileNotFoundError(f"{SNAPSHOT_INFO_FILE} not found in {snapshot_dir}")
+    return [name for name, sha in info.get("files", {}).items()
+            if not (snapshot_dir / name).is_file() or _sha256(snapshot_dir / name) != sha]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vendor the base model, tokenizer and LoRA adapter for offline loading")
+    parser.add_argument("--model", type=str, default=BASE_MODEL_NAME, help="Hugging Face Hub 上的 base model")
+    parser.add_argument("--revision", type=str, default=BASE_MODEL_REVISION, help="分支、tag 或 commit")
+    parser.add_argument("--adapter", type=str, default=str(LORA_ADAPTER_PATH), help="LoRA adapter 目录")
+    parser.add_argument("--output", type=str, default=str(SNAPSHOT_DIR), help="快照目录")
+    parser.add_argument("--verify", action="store_true", help="只校验已有快照的文件哈希，不下载")
+    args = parser.parse_args()
+
+    if args.verify:
+        mismatched = verify_snapshot(args.output)
+        if mismatched:
+            print(f"❌ Snapshot files changed or missing: {', '.join(mismatched)}")
+            raise SystemExit(1)
+        print(f"✅ Snapshot verified: {args.output}")
+        return
+
+    info = create_snapshot(args.model, args.revision, args.adapter, args.output)
+    print(f"✅ Snapshot saved: {args.output} ({info['base_model']}@{info['commit']}, {len(info['files'])} files)")
+
+
+if __name__ == "__main__":
+    main()
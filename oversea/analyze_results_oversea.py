@@ -1,6 +1,4 @@
 import json
-import re
-import yaml
 import argparse
 import time
 import math
@@ -22,18 +20,20 @@ DOMESTIC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__f
 if os.path.exists(DOMESTIC_PATH):
     sys.path.insert(0, DOMESTIC_PATH)
 
-# 导入BERT情感分析模块
-try:
-    from sentiment.sentiment_analyzer import get_sentiment_analyzer
+from matching.brand_index import load_brand_index
+from matching.brand_matcher import MATCH_MODES, BrandMatcher, resolve_match_options
+from matching.sentence_index import (context_windows_by_brand, resolve_context_window, sentences_by_brand,
+                                     split_sentences)
+from sentiment.batch_scoring import score_brand_sentences
+from sentiment.rule_classifier import get_rule_classifier
 
-    USE_BERT_SENTIMENT = True
-    print("✅ BERT情感分析模块已启用")
-except ImportError as e:
-    USE_BERT_SENTIMENT = False
-    print(f"⚠️  BERT情感分析模块未找到，将使用规则匹配方式: {e}")
+# BERT情感分析模块（sentiment/sentiment_analyzer.py）在 calculate_scores 中第一次需要时才导入，
+# torch / transformers 在第一次 predict() 时才加载：--help 与纯规则匹配的运行不付出这部分开销
+USE_BERT_SENTIMENT = True
 
 
-def analyze_single_answer(answer_text: str, references: list, brand_map: dict):
+def analyze_single_answer(answer_text: str, references: list, brand_map: dict, matcher: BrandMatcher = None,
+                          context_window: int = 0):
     """分析单个回答，提取品牌相关指标"""
     raw_metrics = defaultdict(
         lambda: {
@@ -50,22 +50,21 @@ def analyze_single_answer(answer_text: str, references: list, brand_map: dict):
 
     # --- 1. 检测品牌提及并计算 first_pos ---
     brand_mentions_with_pos = []
-    for std_brand, aliases in brand_map.items():
-        for alias in aliases:
-            alias_lower = alias.lower()
-            # Find all occurrences of the alias
-            for match in re.finditer(re.escape(alias_lower), answer_lower):
-                raw_metrics[std_brand]["mentioned"] = 1
-                raw_metrics[std_brand]["mention_count"] += 1
-
-                pos = match.start()
-                if pos < raw_metrics[std_brand]["first_pos"]:
-                    raw_metrics[std_brand]["first_pos"] = pos
-
-                brand_mentions_with_pos.append({
-                    "brand": std_brand,
-                    "pos": pos
-                })
+    if matcher is None:
+        matcher = BrandMatcher(brand_map)
+    # 自动机一遍扫描回答，得到与逐别名 re.finditer 相同的 (品牌, 位置) 序列
+    mentions = matcher.find_mentions(answer_lower)
+    for std_brand, pos in mentions:
+        raw_metrics[std_brand]["mentioned"] = 1
+        raw_metrics[std_brand]["mention_count"] += 1
+
+        if pos < raw_metrics[std_brand]["first_pos"]:
+            raw_metrics[std_brand]["first_pos"] = pos
+
+        brand_mentions_with_pos.append({
+            "brand": std_brand,
+            "pos": pos
+        })
 
     # --- 2. 计算 Top 10 积分 (前10可见度) ---
     first_mention_positions = {}
@@ -86,56 +85,33 @@ def analyze_single_answer(answer_text: str, references: list, brand_map: dict):
             break
 
     # --- 3. 提取包含品牌的句子（用于BERT情感分析）---
-    # 适配中英文句子分割
-    sentences = re.split(r'[。\n.!?！？]', answer_text)
-
-    for sentence in sentences:
-        sentence_lower = sentence.lower().strip()
-        if not sentence_lower:
-            continue
-
-        for brand, metrics in raw_metrics.items():
-            if not metrics["mentioned"]:
-                continue
-            # 检查句子中是否包含该品牌（检查所有别名）
-            brand_aliases = brand_map.get(brand, [brand])
-            for alias in brand_aliases:
-                if alias.lower() in sentence_lower:
-                    raw_metrics[brand]["sentiment_sentences"].append(sentence)
-                    break  # 避免同一句子重复添加
+    # 适配中英文句子分割；句子起始位置只算一次，每个提及按位置二分查找所在的句子
+    sentences, sentence_starts = split_sentences(answer_text, r'[。\n.!?！？]')
+    brand_sentence_ids = sentences_by_brand(mentions, sentence_starts)
+
+    if context_window > 0:
+        # 情感分析只取每个提及前后 context_window 个 token 的窗口（同一句中重叠的窗口合并）
+        for brand, windows in context_windows_by_brand(mentions, sentences, sentence_starts, context_window).items():
+            raw_metrics[brand]["sentiment_sentences"].extend(w for w in windows if w.strip())
+    else:
+        for brand, sentence_ids in brand_sentence_ids.items():
+            for sentence_id in sentence_ids:  # 已去重，同一句子不会重复添加
+                if sentences[sentence_id].strip():
+                    raw_metrics[brand]["sentiment_sentences"].append(sentences[sentence_id])
 
     # --- 4. 检测强推荐 (is_strong) ---
-    # 中英文强推荐关键词
-    strong_patterns = [
-        # 中文
-        r"(强烈)?推荐", r"首选", r"最佳", r"值得.*?(尝试|购买|选择)",
-        r"性价比.*?(高|很高)", r"(是|属)?(top|best)[^。]*?(品牌|选择|之一)",
-        r"(我|我们)?(最|很)?常买", r"(个人|我)?觉得.*?(最好|最推荐)",
-        # 英文
-        r"highly\s+recommend", r"best\s+choice", r"top\s+pick", r"must\s+have",
-        r"excellent", r"outstanding", r"superior", r"first\s+choice",
-        r"strongly\s+recommend", r"worth\s+(buying|trying|considering)"
-    ]
-    negation_keywords = [
-        # 中文
-        "不推荐", "不太", "不喜欢", "不值得", "踩雷", "避坑", "最差", "不合适", "不如",
-        # 英文
-        "not recommend", "don't recommend", "wouldn't recommend", "avoid",
-        "worst", "disappointing", "poor quality"
-    ]
-
-    for sentence in sentences:
-        sentence_lower = sentence.lower()
-        for brand, metrics in raw_metrics.items():
-            if not metrics["mentioned"]:
-                continue
-            # 检查品牌是否在句子中
-            brand_aliases = brand_map.get(brand, [brand])
-            brand_in_sentence = any(alias.lower() in sentence_lower for alias in brand_aliases)
-            if brand_in_sentence:
-                if any(re.search(p, sentence_lower) for p in strong_patterns):
-                    if not any(neg in sentence_lower for neg in negation_keywords):
-                        raw_metrics[brand]["is_strong"] = 1
+    # 规则分类器每种语言只构建一次（合并正则 + 否定关键词自动机），见 sentiment/rule_classifier.py
+    classifier = get_rule_classifier("zh", "en")
+
+    # 每个句子最多判断一次，多个品牌共用结果
+    strong_sentences = {}
+    for brand, sentence_ids in brand_sentence_ids.items():
+        for sentence_id in sentence_ids:
+            if sentence_id not in strong_sentences:
+                strong_sentences[sentence_id] = classifier.is_strong(sentences[sentence_id])
+            if strong_sentences[sentence_id]:
+                raw_metrics[brand]["is_strong"] = 1
+                break
 
     return raw_metrics
 
@@ -144,9 +120,16 @@ def calculate_scores(data_list: list,
                      brand_dictionary: dict,
                      whitelist: set,
                      weights: dict,
-                     analyzer=None) -> dict:
+                     analyzer=None,
+                     match_mode: str = "legacy",
+                     word_boundary: bool = False,
+                     brand_index=None,
+                     context_window: int = 0) -> dict:
     """
     计算所有品牌的得分（集成BERT情感分析）
+    match_mode / word_boundary: 品牌别名的匹配方式，见 matching/brand_matcher.py
+    brand_index: 可选，load_brand_index() 加载的已编译品牌索引（见 matching/brand_index.py）
+    context_window: 大于 0 时情感分析只取每个提及前后这么多 token 的窗口（见 matching/sentence_index.py）
 
     返回: final_scores - 品牌得分字典
     """
@@ -163,6 +146,15 @@ def calculate_scores(data_list: list,
     )
     total_brand_mentions_across_all = 0
 
+    # 品牌词典只编译一次自动机，所有回答共用
+    # 传入 brand_index（matching/brand_index.py）时直接复用缓存中已编译的自动机与白名单位图
+    if brand_index is not None:
+        matcher = brand_index.get_matcher(match_mode, word_boundary)
+        in_whitelist = brand_index.is_whitelisted
+    else:
+        matcher = BrandMatcher(brand_dictionary, mode=match_mode, word_boundary=word_boundary)
+        in_whitelist = whitelist.__contains__
+
     # 收集所有原始指标
     for item in data_list:
         answer = item.get("response", {}).get("answer", "")
@@ -171,10 +163,10 @@ def calculate_scores(data_list: list,
         if not answer:
             continue
 
-        answer_metrics = analyze_single_answer(answer, references, brand_dictionary)
+        answer_metrics = analyze_single_answer(answer, references, brand_dictionary, matcher, context_window)
 
         for brand, metrics in answer_metrics.items():
-            if brand in whitelist:
+            if in_whitelist(brand):
                 brand_global_metrics = all_brands_raw_metrics[brand]
                 brand_global_metrics["total_mentions"] += metrics["mention_count"]
                 if metrics["first_pos"] != float('inf'):
@@ -195,12 +187,25 @@ def calculate_scores(data_list: list,
     sentiment_analyzer = analyzer
     if sentiment_analyzer is None and USE_BERT_SENTIMENT:
         try:
+            from sentiment.sentiment_analyzer import get_sentiment_analyzer
+
             sentiment_analyzer = get_sentiment_analyzer()
             print("🤖 使用BERT模型进行情感分析...")
         except Exception as e:
             print(f"⚠️  BERT模型加载失败，回退到规则匹配: {e}")
             sentiment_analyzer = None
 
+    # 所有品牌的句子去重后一次批量推理，再按品牌汇总
+    brand_sentiment_scores = {}
+    if sentiment_analyzer:
+        try:
+            brand_sentiment_scores = score_brand_sentences(
+                sentiment_analyzer, {brand: m["sentiment_sentences"] for brand, m in all_brands_raw_metrics.items()})
+        except Exception as e:
+            # 模型在第一次 predict() 时才加载，加载失败（如未安装 torch）在这里回退
+            print(f"⚠️  BERT模型加载失败，回退到规则匹配: {e}")
+            brand_sentiment_scores = {}
+
     # 计算归一化参数
     max_mentions = max((m["total_mentions"] for m in all_brands_raw_metrics.values()), default=1)
     max_strong = max((m["strong_recommend_count"] for m in all_brands_raw_metrics.values()), default=1)
@@ -238,11 +243,8 @@ def calculate_scores(data_list: list,
         competitiveness = (metrics["total_mentions"] / max_mentions) * 100 if max_mentions > 0 else 0
 
         # 5. 情感分析 (Sentiment Analysis)
-        if sentiment_analyzer and metrics["sentiment_sentences"]:
-            sentences_to_analyze = metrics["sentiment_sentences"][:50]
-            results = sentiment_analyzer.predict(sentences_to_analyze)
-            sentiment_scores = [r["score"] for r in results]
-            sentiment_analysis = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 50.0
+        if brand in brand_sentiment_scores:
+            sentiment_analysis = brand_sentiment_scores[brand]
         else:
             normalized_strong = (metrics["strong_recommend_count"] + 1) / (max_strong + 1)
             sentiment_analysis = math.sqrt(normalized_strong) * 100
@@ -376,17 +378,27 @@ def write_ranking_report(output_file: str, title: str, total_scores: dict, task_
 def main():
     parser = argparse.ArgumentParser(description="海外榜单分析引擎")
     parser.add_argument("--config", required=True, help="配置文件路径 (例如: config_home_appliance.yaml)")
+    parser.add_argument("--match-mode", choices=MATCH_MODES, default=None,
+                        help="品牌别名匹配方式，覆盖配置文件中的 matching.mode (默认: legacy)")
+    parser.add_argument("--word-boundary", action="store_true", default=None,
+                        help="英文别名要求单词边界，覆盖配置文件中的 matching.word_boundary")
+    parser.add_argument("--context-window", type=int, default=None,
+                        help="情感分析只取每个品牌提及前后 N 个 token 的窗口，覆盖配置中的 sentiment.context_window"
+                             "（默认 0：整句，推荐 64）")
+    parser.add_argument("--no-index-cache", action="store_true",
+                        help="不读写编译后的品牌索引缓存（cache/brand_index/），每次重新解析配置文件")
     args = parser.parse_args()
 
     print(f"\n{'=' * 60}")
     print(f"海外榜单分析引擎")
     print(f"{'=' * 60}\n")
 
-    # 加载配置文件
+    # 加载配置文件（连同品牌词典一起编译为品牌索引，配置文件未修改时直接读取缓存）
     print(f"📋 加载配置文件: {args.config}")
     try:
-        with open(args.config, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+        brand_index = load_brand_index(args.config, os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache", "brand_index"),
+                                       use_cache=not args.no_index_cache)
+        config = brand_index.config
     except FileNotFoundError:
         print(f"❌ 错误: 配置文件 '{args.config}' 未找到。")
         return
@@ -406,14 +418,19 @@ def main():
         "competitiveness": 20,
         "sentiment_analysis": 20
     })
-    brand_dictionary = config.get("brand_dictionary", {})
-    brands_whitelist = set(config.get("brands_whitelist", []))
+    brand_dictionary = brand_index.brand_dictionary
+    brands_whitelist = brand_index.whitelist
+    match_options = resolve_match_options(config.get("matching"), args.match_mode, args.word_boundary)
+    match_options["context_window"] = resolve_context_window(config.get("sentiment"), args.context_window)
 
     print(f"📁 任务名称: {task_name}")
     print(f"📁 结果文件: {results_file}")
     print(f"📄 输出报告: {output_file}")
     print(f"📖 品牌词典: {len(brand_dictionary)} 个品牌")
-    print(f"📋 白名单: {len(brands_whitelist)} 个品牌\n")
+    print(f"📋 白名单: {len(brands_whitelist)} 个品牌")
+    print(f"🔎 别名匹配: {match_options['match_mode']} (单词边界: {'开启' if match_options['word_boundary'] else '关闭'})")
+    context_window = match_options["context_window"]
+    print(f"💬 情感分析输入: {f'品牌提及前后 {context_window} 个 token 的窗口' if context_window else '整句'}\n")
 
     # 加载结果数据
     print("正在加载结果数据...")
@@ -442,7 +459,7 @@ def main():
 
     # ==================== 计算总榜单 ====================
     print("正在计算总榜单...")
-    total_scores = calculate_scores(data_list, brand_dictionary, brands_whitelist, weights)
+    total_scores = calculate_scores(data_list, brand_dictionary, brands_whitelist, weights, brand_index=brand_index, **match_options)
     print(f"✅ 总榜单: 成功计算 {len(total_scores)} 个品牌的得分\n")
 
     # ==================== 计算子品类榜单 ====================
@@ -451,7 +468,7 @@ def main():
         print("正在计算子品类榜单...")
         for subcategory, sub_data in sorted(subcategory_data.items()):
             print(f"  - 正在处理子品类: {subcategory} ({len(sub_data)} 条记录)")
-            scores = calculate_scores(sub_data, brand_dictionary, brands_whitelist, weights)
+            scores = calculate_scores(sub_data, brand_dictionary, brands_whitelist, weights, brand_index=brand_index, **match_options)
             subcategory_scores[subcategory] = scores
             print(f"    ✅ 计算了 {len(scores)} 个品牌的得分")
         print()
@@ -1,10 +1,10 @@
-import openai
 import json
 import os
 import time
 import argparse
 import yaml
 import re
+import sys
 from dotenv import load_dotenv
 
 # ==============================================================================
@@ -22,6 +22,17 @@ BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 root_dir = os.path.dirname(BASE_DIR)  # 获取父目录（根目录）
 load_dotenv(os.path.join(root_dir, '.env'))
 
+# 添加 domestic 目录到 sys.path，以便复用国内采集引擎的公共模块（限流器等）
+DOMESTIC_PATH = os.path.join(root_dir, 'domestic')
+if os.path.exists(DOMESTIC_PATH):
+    sys.path.insert(0, DOMESTIC_PATH)
+
+from collection.checkpoint import JsonlCheckpoint
+from collection.circuit_breaker import CircuitOpenError, configure_circuit_breaker, guarded_call
+from collection.client_registry import close_all_clients, configure_http_defaults, get_openai_client
+from collection.rate_limiter import configure_rate_limiter, estimate_tokens, get_rate_limiter, is_rate_limit_error
+from collection.response_cache import cached_call, configure_response_cache, get_response_cache, is_replay_mode
+from collection.telemetry import configure_telemetry, track_call
 
 
 def load_config(config_path):
@@ -37,9 +48,10 @@ def load_questions(questions_path):
 
 
 # ------------ GPT / Gemini 联网搜索调用（通过 OpenRouter :online 后缀） ---------------- #
-def get_online_response(client, question: str, model: str, model_key: str, retries=3, delay=10):
+def get_online_response(client, question: str, model: str, model_key: str):
     """
     通过 OpenRouter 调用 GPT / Gemini 模型（使用 :online 后缀启用联网搜索）
+    429 的退避重试全部由共享限流器负责；调用失败时返回 None，问题留待断点续传补采
     """
     URL_PATTERN = r'https?://[^\s )>\]]+'
 
@@ -47,124 +59,173 @@ def get_online_response(client, question: str, model: str, model_key: str, retri
     if not model.endswith(':online'):
         model = f"{model}:online"
 
-    for attempt in range(retries):
-        try:
-            print(f"      正在调用 {model_key.upper()} 模型 '{model}' (尝试 {attempt + 1}/{retries})...")
+    messages = [{"role": "user", "content": question}]
+    limiter = get_rate_limiter(model_key)
 
-            completion = client.chat.completions.create(
+    try:
+        print(f"      正在调用 {model_key.upper()} 模型 '{model}'...")
+        completion = limiter.call(
+            lambda: client.chat.completions.create(
                 model=model,
-                messages=[{"role": "user", "content": question}],
+                messages=messages,
                 temperature=0.1,
-            )
-
-            answer = completion.choices[0].message.content or ""
-
-            # 提取 URL 作为引用
-            references = []
-            urls = re.findall(URL_PATTERN, answer)
-            seen_urls = set()
-
-            for url in urls:
-                clean_url = url.strip().rstrip(".,;:)]")
-                if clean_url and clean_url not in seen_urls:
-                    seen_urls.add(clean_url)
-                    references.append({
-                        "url": clean_url,
-                        "title": "",
-                        "publisher": "",
-                        "snippet": "",
-                    })
-
-            return {"answer": answer, "references": references}
-
-        except Exception as e:
-            error_msg = str(e)
-            print(f"      {model_key.upper()} 调用错误: {error_msg}")
-
-            if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                wait_time = delay * (attempt + 1)
-                print(f"      配额限制，等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-            elif attempt < retries - 1:
-                print(f"      等待 {delay} 秒后重试...")
-                time.sleep(delay)
-            else:
-                print("      所有重试均失败。")
-                return {"answer": "", "references": []}
+            ),
+            estimated_tokens=estimate_tokens(messages)
+        )
+    except Exception as e:
+        print(f"      {model_key.upper()} 调用错误: {e}")
+        if is_rate_limit_error(e):
+            print("      配额限制重试次数已用尽，跳过该问题（留待断点续传补采）。")
+        return None
+
+    answer = completion.choices[0].message.content or ""
+
+    # 提取 URL 作为引用
+    references = []
+    urls = re.findall(URL_PATTERN, answer)
+    seen_urls = set()
+
+    for url in urls:
+        clean_url = url.strip().rstrip(".,;:)]")
+        if clean_url and clean_url not in seen_urls:
+            seen_urls.add(clean_url)
+            references.append({
+                "url": clean_url,
+                "title": "",
+                "publisher": "",
+                "snippet": "",
+            })
 
-    return {"answer": "", "references": []}
+    return {"answer": answer, "references": references}
 
 
 # ------------ Perplexity 原生联网搜索调用（不需要 :online 后缀） ---------------- #
-def get_perplexity_response(client, question: str, model: str, retries=3, delay=5):
+def get_perplexity_response(client, question: str, model: str, model_key: str = "perplexity"):
     """
     调用 Perplexity 模型（原生支持联网搜索，不需要 :online 后缀）
+    429 的退避重试全部由共享限流器负责；调用失败时返回 None，问题留待断点续传补采
     """
     URL_PATTERN = r'https?://[^\s)>\]]+'
 
-    for attempt in range(retries):
-        try:
-            print(f"      正在调用 PERPLEXITY 模型 '{model}' (尝试 {attempt + 1}/{retries})...")
-            completion = client.chat.completions.create(
+    messages = [{"role": "user", "content": question}]
+    limiter = get_rate_limiter(model_key)
+
+    try:
+        print(f"      正在调用 PERPLEXITY 模型 '{model}'...")
+        completion = limiter.call(
+            lambda: client.chat.completions.create(
                 model=model,
-                messages=[{"role": "user", "content": question}],
+                messages=messages,
                 temperature=0.1,
-            )
-
-            response_content = completion.choices[0].message.content or ""
-
-            # 正则 URL 抓取
-            urls = re.findall(URL_PATTERN, response_content)
-            seen_urls = set()
-            references = []
-
-            for url in urls:
-                clean_url = url.strip().rstrip(".,;:)]")
-                if clean_url and clean_url not in seen_urls:
-                    seen_urls.add(clean_url)
-                    references.append({
-                        "url": clean_url,
-                        "title": "",
-                        "publisher": "",
-                        "snippet": "",
-                    })
-
-            return {"answer": response_content, "references": references}
-
-        except Exception as e:
-            error_msg = str(e)
-            print(f"      PERPLEXITY 调用错误: {error_msg}")
-
-            if "429" in error_msg:
-                wait_time = delay * (attempt + 1)
-                print(f"      速率限制，等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-            elif attempt < retries - 1:
-                print(f"      等待 {delay} 秒后重试...")
-                time.sleep(delay)
-            else:
-                print("      所有重试均失败。")
-                return {"answer": "", "references": []}
-
-    return {"answer": "", "references": []}
+            ),
+            estimated_tokens=estimate_tokens(messages)
+        )
+    except Exception as e:
+        print(f"      PERPLEXITY 调用错误: {e}")
+        if is_rate_limit_error(e):
+            print("      速率限制重试次数已用尽，跳过该问题（留待断点续传补采）。")
+        return None
 
+    response_content = completion.choices[0].message.content or ""
 
-def call_model(client, model_key: str, model_name: str, question: str):
+    # 正则 URL 抓取
+    urls = re.findall(URL_PATTERN, response_content)
+    seen_urls = set()
+    references = []
+
+    for url in urls:
+        clean_url = url.strip().rstrip(".,;:)]")
+        if clean_url and clean_url not in seen_urls:
+            seen_urls.add(clean_url)
+            references.append({
+                "url": clean_url,
+                "title": "",
+                "publisher": "",
+                "snippet": "",
+            })
+
+    return {"answer": response_content, "references": references}
+
+
+def build_request_signature(model_key: str, model_name: str, question: str) -> dict:
+    """描述一次 OpenRouter 请求的全部生成参数，作为回答缓存的键"""
+    native_search = "perplexity" in model_key.lower()
+    model = model_name if native_search or model_name.endswith(':online') else f"{model_name}:online"
+    return {
+        "provider": "openrouter",
+        "model": model,
+        "messages": [{"role": "user", "content": question}],
+        "temperature": 0.1,
+        "max_tokens": None,
+        "search": "native" if native_search else "online",
+    }
+
+
+def dispatch_model_call(client, model_key: str, model_name: str, question: str):
     """
     根据模型 key 分派到不同的 API 调用函数
     - GPT / Gemini: 使用 :online 后缀启用联网搜索
     - Perplexity: 原生联网搜索，不需要后缀
     """
+    if "perplexity" in model_key.lower():
+        # Perplexity 原生联网搜索
+        return get_perplexity_response(client, question, model_name, model_key)
+    else:
+        # GPT / Gemini 使用 :online 后缀
+        return get_online_response(client, question, model_name, model_key)
+
+
+def call_model(client, model_key: str, model_name: str, question: str, question_id=None):
+    """
+    调用模型回答一个问题（回答缓存前置），并记录一条遥测
+    replay 模式下缓存未命中、该模型熔断期间、或调用失败（429 重试用尽 / 所有重试失败）时返回 None，
+    调用方应跳过该问题，不写入断点（留待断点续传）
+    """
     try:
-        if "perplexity" in model_key.lower():
-            # Perplexity 原生联网搜索
-            return get_perplexity_response(client, question, model_name)
-        else:
-            # GPT / Gemini 使用 :online 后缀
-            return get_online_response(client, question, model_name, model_key)
+        with track_call(model_key, model_name, question_id) as record:
+            called = []
+
+            def call():
+                called.append(True)
+                return dispatch_model_call(client, model_key, model_name, question)
+
+            try:
+                response = cached_call(
+                    build_request_signature(model_key, model_name, question),
+                    lambda: guarded_call(model_key, call, is_success=lambda r: bool(r and r.get("answer"))),
+                    should_cache=lambda r: bool(r.get("answer"))
+                )
+            except CircuitOpenError:
+                record["status"] = "circuit_open"
+                return None
+            record["cached"] = response is not None and not called
+            if response is None:
+                record["status"] = "skipped" if is_replay_mode() else "error"
+            elif not response.get("answer"):
+                record["status"] = "empty"
+        return response
     except Exception as e:
         print(f"      FATAL ERROR for {model_key}: {e}")
-        return {"answer": "", "references": []}
+        return None
+
+
+def configure_rate_limiters(models_to_run: dict, rate_limits: dict):
+    """
+    为每个模型创建共享限流器：rate_limits.default 为默认值，rate_limits.{model_key} 覆盖
+    海外采集为串行调用，并发上限固定为 1，限流器主要负责 RPM/TPM 节流与 429 退避
+    """
+    default_limits = rate_limits.get("default") or {}
+    for model_key in models_to_run:
+        options = {**default_limits, **(rate_limits.get(model_key) or {})}
+        options.setdefault("max_concurrency", 1)
+        configure_rate_limiter(model_key, **options)
+
+
+def configure_circuit_breakers(models_to_run: dict, breaker_config: dict):
+    """为每个模型创建熔断器：circuit_breaker.default 为默认值，circuit_breaker.{model_key} 覆盖"""
+    default_options = breaker_config.get("default") or {}
+    for model_key in models_to_run:
+        configure_circuit_breaker(model_key, **{**default_options, **(breaker_config.get(model_key) or {})})
 
 
 def main():
@@ -172,6 +233,8 @@ def main():
     parser.add_argument("--task", required=True, help="任务/品类名称 (如: ha, sh)")
     parser.add_argument("--model", default=None, help="指定单个模型 (如: gemini, gpt, perplexity)，不指定则运行所有模型")
     parser.add_argument("--config", default="config_oversea.yaml", help="配置文件路径")
+    parser.add_argument("--replay", action="store_true", help="只从本地回答缓存读取，不调用任何 API")
+    parser.add_argument("--no-cache", action="store_true", help="关闭本地回答缓存")
     args = parser.parse_args()
 
     print(f"\n{'=' * 60}")
@@ -220,13 +283,34 @@ def main():
     print(f"   - GPT/Gemini: 使用 :online 后缀启用联网搜索")
     print(f"   - Perplexity: 原生联网搜索\n")
 
-    # 初始化 OpenRouter 客户端
+    # 初始化回答缓存（正常采集只命中当天写入的缓存，--replay 不受影响）
+    current_date = time.strftime("%Y%m%d")
+    cache_cfg = config.get("cache") or {}
+    cache_path = cache_cfg.get("path", "cache/llm_responses.sqlite")
+    if not os.path.isabs(cache_path):
+        cache_path = os.path.join(BASE_DIR, cache_path)
+    cache = configure_response_cache(
+        cache_path,
+        enabled=cache_cfg.get("enabled", True) and not args.no_cache,
+        ttl_hours=cache_cfg.get("ttl_hours"),
+        max_entries=cache_cfg.get("max_entries"),
+        replay=args.replay,
+        collection_date=current_date
+    )
+    if cache is not None:
+        print(f"🗄️  回答缓存: {cache_path} ({'replay 模式，只读缓存' if args.replay else '已启用'})\n")
+
+    # 初始化 OpenRouter 客户端（replay 模式不调用 API，不需要 Key）
     api_key = os.environ.get("OPENROUTER_API_KEY")
-    if not api_key:
+    if not api_key and not args.replay:
         print("❌ 错误: 请先设置 OPENROUTER_API_KEY 环境变量")
         return
 
-    client = openai.OpenAI(api_key=api_key, base_url="https://openrouter.ai/api/v1")
+    # 所有模型共用同一个 OpenRouter 长连接客户端
+    configure_http_defaults(**(config.get("http_client") or {}))
+    client = None if args.replay else get_openai_client("openrouter", api_key, "https://openrouter.ai/api/v1")
+    configure_rate_limiters(models_to_run, config.get("rate_limits") or {})
+    configure_circuit_breakers(models_to_run, config.get("circuit_breaker") or {})
 
     # 加载问题文件
     questions_path = os.path.join(BASE_DIR, questions_file)
@@ -249,80 +333,114 @@ def main():
         return
 
     # 准备输出文件（带日期戳，保存到 results 目录）
-    current_date = time.strftime("%Y%m%d")
     results_dir = os.path.join(BASE_DIR, "results")
     os.makedirs(results_dir, exist_ok=True)
     output_file = os.path.join(results_dir, f"results_merged_{args.task}_{current_date}.json")
+    # 采集过程中只追加写 JSONL 断点日志，结束时再压缩成 output_file（JSON 数组）
+    checkpoint = JsonlCheckpoint(os.path.join(results_dir, f"results_merged_{args.task}_{current_date}.jsonl"))
+    # 每次调用的耗时 / token 用量 / 重试次数 / 估算费用
+    telemetry = configure_telemetry(
+        os.path.join(results_dir, f"metrics_{args.task}_{current_date}.jsonl"),
+        pricing=config.get("pricing") or {}
+    )
 
     # 加载已有结果（支持断点续传）
     all_results = []
     processed_keys = set()  # 用于跟踪已处理的 (question_id, model) 组合
 
-    if os.path.exists(output_file):
+    if checkpoint.exists():
+        all_results = checkpoint.replay()
+        print(f"📂 已从断点日志重放 {len(all_results)} 条历史记录（断点续传模式）\n")
+    elif os.path.exists(output_file):
+        # 兼容旧版本：只有 JSON 数组文件时，导入断点日志后继续
         try:
             with open(output_file, 'r', encoding='utf-8') as f:
                 all_results = json.load(f)
-                for item in all_results:
-                    key = (item.get("id"), item.get("ai_model"))
-                    processed_keys.add(key)
-                print(f"📂 已加载 {len(all_results)} 条历史记录（断点续传模式）\n")
+            checkpoint.extend(all_results)
+            print(f"📂 已加载 {len(all_results)} 条历史记录（断点续传模式）\n")
         except json.JSONDecodeError:
             print("⚠️ 输出文件损坏，将重新生成\n")
             all_results = []
 
+    for item in all_results:
+        processed_keys.add((item.get("id"), item.get("ai_model")))
+
+    # 上次运行因熔断 / replay 未命中而跳过的问题，本次会按断点续传逻辑重新调用
+    pending_file = os.path.join(results_dir, f"pending_{args.task}_{current_date}.json")
+    if os.path.exists(pending_file):
+        with open(pending_file, 'r', encoding='utf-8') as f:
+            print(f"⏳ 上次运行有 {len(json.load(f))} 个问题待补采，本次将重新调用\n")
+    pending = []
+
     # 开始采集
     total_questions = len(questions_to_run)
     total_models = len(models_to_run)
     total_tasks = total_questions * total_models
     completed = 0
 
-    for model_key, model_name in models_to_run.items():
-        print(f"\n{'─' * 50}")
-        print(f"🤖 开始采集模型: {model_key} ({model_name})")
-        if "perplexity" in model_key.lower():
-            print(f"   📡 模式: 原生联网搜索")
-        else:
-            print(f"   📡 模式: :online 后缀联网搜索")
-        print(f"{'─' * 50}")
-
-        for idx, question in enumerate(questions_to_run):
-            q_id = question.get("id")
-            q_text = question.get("question", question.get("prompt", ""))
-            q_category = question.get("category", "")
-
-            completed += 1
-            progress = f"[{completed}/{total_tasks}]"
-
-            # 检查是否已处理
-            if (q_id, model_name) in processed_keys:
-                print(f"  {progress} Q{q_id}: 已存在，跳过")
-                continue
-
-            print(f"  {progress} Q{q_id} ({q_category}): {q_text[:50]}...")
-
-            # 调用模型
-            response = call_model(client, model_key, model_name, q_text)
-
-            # 构造结果
-            result = {
-                "id": q_id,
-                "category": q_category,
-                "question": q_text,
-                "ai_model": model_name,
-                "model_key": model_key,
-                "task": args.task,
-                "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
-                "response": response
-            }
-
-            all_results.append(result)
-            processed_keys.add((q_id, model_name))
-
-            # 实时保存
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(all_results, f, ensure_ascii=False, indent=2)
-
-            print(f"      ✅ 已保存")
+    try:
+        for model_key, model_name in models_to_run.items():
+            print(f"\n{'─' * 50}")
+            print(f"🤖 开始采集模型: {model_key} ({model_name})")
+            if "perplexity" in model_key.lower():
+                print(f"   📡 模式: 原生联网搜索")
+            else:
+                print(f"   📡 模式: :online 后缀联网搜索")
+            print(f"{'─' * 50}")
+
+            for idx, question in enumerate(questions_to_run):
+                q_id = question.get("id")
+                q_text = question.get("question", question.get("prompt", ""))
+                q_category = question.get("category", "")
+
+                completed += 1
+                progress = f"[{completed}/{total_tasks}]"
+
+                # 检查是否已处理
+                if (q_id, model_name) in processed_keys:
+                    print(f"  {progress} Q{q_id}: 已存在，跳过")
+                    continue
+
+                print(f"  {progress} Q{q_id} ({q_category}): {q_text[:50]}...")
+
+                # 调用模型
+                response = call_model(client, model_key, model_name, q_text, question_id=q_id)
+                if response is None:
+                    # replay 模式缓存未命中 / 熔断跳过 / 调用失败：不记录结果，留待之后补采
+                    pending.append({"id": q_id, "model_key": model_key, "ai_model": model_name})
+                    continue
+
+                # 构造结果
+                result = {
+                    "id": q_id,
+                    "category": q_category,
+                    "question": q_text,
+                    "ai_model": model_name,
+                    "model_key": model_key,
+                    "task": args.task,
+                    "timestamp": time.strftime('%Y-%m-%d %H:%M:%S'),
+                    "response": response
+                }
+
+                all_results.append(result)
+                processed_keys.add((q_id, model_name))
+
+                # 实时保存（追加一行到断点日志）
+                checkpoint.append(result)
+
+                print(f"      ✅ 已保存")
+    finally:
+        # 无论正常结束还是中断，都把已采集的记录压缩成下游工具使用的 JSON 数组
+        checkpoint.close()
+        JsonlCheckpoint.compact(all_results, output_file)
+        telemetry.close()
+        if pending:
+            JsonlCheckpoint.compact(pending, pending_file)
+        elif os.path.exists(pending_file):
+            os.remove(pending_file)
+
+    close_all_clients()
+    telemetry.print_summary()
 
     # 汇总引用
     print(f"\n{'=' * 60}")
@@ -349,6 +467,11 @@ def main():
     print(f"   - 总结果数: {len(all_results)}")
     print(f"   - 总引用数: {len(all_refs)}")
     print(f"   - 结果文件: {output_file}")
+    print(f"   - 断点日志: {checkpoint.path}")
+    if pending:
+        print(f"   - 待补采: {len(pending)} 个（熔断跳过 / 缓存未命中），重新运行同一命令即可补采: {pending_file}")
+    if cache is not None:
+        print(f"   - 回答缓存: 命中 {cache.hits} / 未命中 {cache.misses}")
     print(f"   - 引用文件: {refs_file}")
 
     print(f"\n{'=' * 60}")